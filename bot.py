@@ -1,14 +1,28 @@
 import os
-import logging
+import time
 import asyncio
+import functools
 from datetime import datetime
-import shutil
-from telethon import TelegramClient, events, Button
-from telethon.tl.types import InputMessagesFilterPhotos
+from telethon import TelegramClient, events, Button, errors
+from telethon.tl.types import InputMessagesFilterPhotos, InputPhoto, InputMediaUploadedPhoto
+from telethon.tl.functions.messages import UploadMediaRequest
 from dotenv import load_dotenv
 import tempfile
 from pathlib import Path
-from utils import logger, WITH_TEXT_DIR, WITHOUT_TEXT_DIR
+from utils import (
+    STORE_DIR, PREVIEW_DIR, store_path, _temp_path, get_image_hash, get_perceptual_hash, sync_catalog,
+    remove_meme_files, purge_batch, file_metadata, telegram_jpeg, preview_for, generate_missing_previews,
+    enforce_quotas, CATEGORY_QUOTAS, QUOTA_CHECK_INTERVAL
+)
+from catalog import catalog
+from collection import collection
+from telegram_cache import telegram_cache
+from logging_setup import get_logger
+from metrics import (
+    instrumented, queue_depth, collection_size, start_metrics_server, METRICS_PORT
+)
+from profiling import handler_profiler, PROFILE_DIR
+from loop_monitor import loop_monitor
 import io
 from PIL import Image, ImageDraw, ImageFont
 import textwrap
@@ -20,6 +34,8 @@ from enum import Enum, auto
 import subprocess
 import sys
 
+logger = get_logger("bot")
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -77,6 +93,30 @@ TEMPLATE_THEMES = [
 # Базовый размер шрифта для мемов (в процентах от высоты изображения)
 DEFAULT_FONT_SIZE_PERCENT = 10  # 1/10 от высоты изображения
 
+# Как часто обновлять сообщение о ходе фонового удаления файлов (секунды)
+PURGE_PROGRESS_INTERVAL = 2
+# Фоновая задача удаления файлов после очистки коллекции (одна на весь бот)
+purge_task = None
+# Сверка каталога с диском в потоке-исполнителе (одна на весь бот)
+sync_task = None
+
+# Сколько соседних мемов в каждую сторону загружать в Telegram заранее, пока
+# пользователь смотрит текущий (0 - не загружать)
+PREFETCH_NEIGHBOURS = int(os.getenv('PREFETCH_NEIGHBOURS', 2))
+# Фоновая задача предзагрузки соседей текущего мема
+prefetch_task = None
+
+# Ошибки Telegram, означающие, что ссылка на загруженное фото больше не действует
+# (FILE_REFERENCE_EXPIRED, FILE_REFERENCE_INVALID и т.п.): фото загружается заново
+STALE_PHOTO_ERRORS = ('FILE_REFERENCE_', 'MEDIA_EMPTY')
+
+# Как часто проверять журнал изменений каталога (секунды)
+CATALOG_WATCH_INTERVAL = float(os.getenv('CATALOG_WATCH_INTERVAL', 0.5))
+
+# Сколько вызовов обработчиков профилирует /profile без аргумента (и максимум)
+PROFILE_DEFAULT_CALLS = 5
+PROFILE_MAX_CALLS = 100
+
 # Эмодзи для тем
 THEME_EMOJI = {
     "программирование": "💻",
@@ -105,11 +145,10 @@ user_data = {}
 # Словарь для хранения авторизованных пользователей
 authenticated_users = set()  # Множество ID пользователей, прошедших аутентификацию
 
-# Состояние пользователя
+# Состояние пользователя (списки мемов - в collection)
 user_state = {
     'current_category': None,  # 'with_text' или 'without_text'
-    'current_index': 0,
-    'images': []
+    'cursor': None,  # курсор просмотра текущей категории (collection.Cursor)
 }
 
 # Список тем для случайной генерации мемов
@@ -356,18 +395,116 @@ def get_fallback_meme_text(theme):
     
     return random.choice(templates[random_category])
 
-async def load_images():
-    """Загружает список изображений из обоих директорий"""
-    with_text_images = list(WITH_TEXT_DIR.glob('*.jpg'))
-    without_text_images = list(WITHOUT_TEXT_DIR.glob('*.jpg'))
+def select_category(category):
+    """Выбирает категорию для просмотра, курсор встает на первый мем"""
+    user_state['current_category'] = category
+    user_state['cursor'] = collection.cursor(category)
+
+def current_meme():
+    """Текущий мем выбранной категории или None"""
+    cursor = user_state['cursor']
+    return cursor.current() if cursor else None
+
+def photo_variant(upload_path):
+    """Вариант файла для кеша ссылок: превью отдельно, JPEG из кеша и сам мем - одно изображение"""
+    return 'preview' if PREVIEW_DIR in Path(upload_path).parents else 'full'
+
+async def send_cached_photo(image_path, upload_path, send):
+    """
+    Отправляет изображение, по возможности без повторной загрузки в Telegram
     
-    logger.info(f"Загружено изображений с текстом: {len(with_text_images)}")
-    logger.info(f"Загружено изображений без текста: {len(without_text_images)}")
+    Если этот файл уже отправлялся, передается ссылка на загруженное фото
+    из telegram_cache, иначе файл загружается и ссылка запоминается.
     
-    return {
-        'with_text': with_text_images,
-        'without_text': without_text_images
-    }
+    Args:
+        image_path: путь к мему в хранилище (ключ кеша)
+        upload_path: файл для отправки (превью, JPEG или сам мем)
+        send: асинхронная функция, получает file (ссылку или путь) и возвращает сообщение
+    """
+    variant = photo_variant(upload_path)
+    reference = telegram_cache.get(image_path, variant)
+    if reference is not None:
+        try:
+            return await send(InputPhoto(*reference))
+        except errors.BadRequestError as e:
+            # Остальные ошибки (MESSAGE_EDIT_TIME_EXPIRED, MESSAGE_NOT_MODIFIED и т.п.)
+            # к ссылке отношения не имеют - их обрабатывает вызывающий код
+            if not getattr(e, 'message', '').startswith(STALE_PHOTO_ERRORS):
+                raise
+            # Ссылка устарела - загружаем заново
+            logger.info(f"Ссылка на фото {image_path} недействительна ({e}), загружаю файл заново")
+            telegram_cache.forget([image_path])
+    
+    message = await send(str(upload_path))
+    photo = getattr(message, 'photo', None)
+    if photo is not None:
+        telegram_cache.put(image_path, variant, photo.id, photo.access_hash, photo.file_reference)
+    return message
+
+async def send_photo(entity, image_path, upload_path, **kwargs):
+    """
+    Отправляет изображение новым сообщением (см. send_cached_photo)
+    
+    Args:
+        entity: чат или канал
+        image_path: путь к мему в хранилище
+        upload_path: файл для отправки
+        **kwargs: параметры bot.send_file (caption, buttons)
+    """
+    return await send_cached_photo(
+        image_path, upload_path, lambda file: bot.send_file(entity, file=file, **kwargs)
+    )
+
+async def edit_photo(event, image_path, upload_path, caption, buttons):
+    """Заменяет фото, подпись и кнопки в сообщении, к которому относится событие (см. send_cached_photo)"""
+    return await send_cached_photo(
+        image_path, upload_path, lambda file: event.edit(caption, file=file, buttons=buttons)
+    )
+
+async def upload_photo(peer, image_path, upload_path):
+    """
+    Загружает фото в Telegram без отправки сообщения и запоминает ссылку на него
+    
+    Returns:
+        bool: True, если фото загружено (False - ссылка уже была)
+    """
+    variant = photo_variant(upload_path)
+    if telegram_cache.get(image_path, variant) is not None:
+        return False
+    
+    uploaded = await bot.upload_file(str(upload_path))
+    media = await bot(UploadMediaRequest(peer=peer, media=InputMediaUploadedPhoto(file=uploaded)))
+    photo = media.photo
+    telegram_cache.put(image_path, variant, photo.id, photo.access_hash, photo.file_reference)
+    return True
+
+async def prefetch_neighbours(chat_id, neighbours):
+    """
+    Заранее загружает в Telegram превью соседних мемов (сначала следующие, затем предыдущие),
+    чтобы нажатие ⬅️/➡️ обходилось без загрузки файла
+    """
+    loop = asyncio.get_running_loop()
+    uploaded = 0
+    for path in neighbours:
+        try:
+            upload_path = await loop.run_in_executor(None, preview_for, path)
+            if await upload_photo(chat_id, path, upload_path):
+                uploaded += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Не удалось заранее загрузить {path}: {e}")
+    if uploaded:
+        logger.debug(f"Заранее загружено соседних мемов: {uploaded}")
+
+def start_prefetch(chat_id, cursor):
+    """Перезапускает предзагрузку соседей для нового текущего мема"""
+    global prefetch_task
+    if PREFETCH_NEIGHBOURS <= 0:
+        return
+    if prefetch_task is not None and not prefetch_task.done():
+        prefetch_task.cancel()
+    prefetch_task = asyncio.create_task(prefetch_neighbours(chat_id, cursor.neighbours(PREFETCH_NEIGHBOURS)))
 
 async def send_current_image(event, new_message=False):
     """
@@ -377,23 +514,24 @@ async def send_current_image(event, new_message=False):
         event: Telegram event
         new_message: Если True, то отправляет новое сообщение вместо редактирования текущего
     """
-    # Получаем текущую категорию и индекс
+    # Получаем текущую категорию и курсор
     category = user_state['current_category']
-    index = user_state['current_index']
+    cursor = user_state['cursor']
     
     # Проверяем наличие изображений в выбранной категории
-    if not user_state['images'][category]:
+    if not cursor.total():
         if new_message:
             await event.respond("В этой категории нет изображений.")
         else:
             await event.edit("В этой категории нет изображений.")
         return
     
-    # Получаем текущее изображение
-    current_image = user_state['images'][category][index]
+    # Получаем текущее изображение и его номер
+    current_image = cursor.current()
+    index = cursor.index()
     
     # Общее количество изображений в категории
-    total_images = len(user_state['images'][category])
+    total_images = cursor.total()
     
     # Создаем хэш для публикации текущего изображения
     file_hash = get_path_hash(current_image)
@@ -430,29 +568,60 @@ async def send_current_image(event, new_message=False):
     # Создаем подпись
     caption = f"📁 Категория: {category}\n🔢 {index + 1} из {total_images}\n🆔 {file_hash}"
     
+    # Источник мема из каталога
+    entry = catalog.get(current_image)
+    if entry and entry['source_channel']:
+        caption += f"\n📢 @{entry['source_channel']}"
+    
     try:
         # Используем непосредственно клиент для отправки файла
         user_id = event.sender_id
         chat_id = event.chat_id
         
-        # При редактировании нужно сначала удалить старое сообщение
-        if not new_message:
+        if user_id not in user_data:
+            user_data[user_id] = {}
+        
+        # При листании отправляем превью (не больше 1280px), а не исходный файл
+        upload_path = await asyncio.get_running_loop().run_in_executor(None, preview_for, current_image)
+        
+        # Кнопка нажата под сообщением с мемом - меняем фото прямо в нем:
+        # один запрос и никаких новых сообщений
+        edited = False
+        if not new_message and event.message_id == user_data[user_id].get('photo_message_id'):
             try:
-                await event.delete()
-            except Exception as delete_error:
-                logger.error(f"Не удалось удалить сообщение: {delete_error}")
-                
-        # Отправляем файл напрямую через бота
-        sent_message = await bot.send_file(
-            chat_id,
-            file=str(current_image),  # Преобразуем Path в строку
-            caption=caption,
-            buttons=keyboard
-        )
+                await edit_photo(event, current_image, upload_path, caption, keyboard)
+                edited = True
+            except errors.MessageNotModifiedError:
+                # То же фото с той же подписью (например, единственный мем категории)
+                edited = True
+            except Exception as edit_error:
+                logger.warning(f"Не удалось заменить фото в сообщении, отправляю заново: {edit_error}")
+        
+        if not edited:
+            # Текстовое сообщение (меню) в фото не превратить - удаляем его и отправляем новое
+            if not new_message:
+                try:
+                    await event.delete()
+                except Exception as delete_error:
+                    logger.error(f"Не удалось удалить сообщение: {delete_error}")
+            
+            # Отправляем файл напрямую через бота (уже загруженное фото - без загрузки)
+            sent_message = await send_photo(
+                chat_id,
+                current_image,
+                upload_path,
+                caption=caption,
+                buttons=keyboard
+            )
+            user_data[user_id]['photo_message_id'] = sent_message.id
+        
+        # Время просмотра используется политикой вытеснения lru
+        catalog.mark_viewed(current_image)
+        
+        # Пока пользователь смотрит мем, соседние загружаются в Telegram заранее
+        start_prefetch(chat_id, cursor)
         
         # Сохраняем текущее изображение для создания мема в данных пользователя
-        if user_id not in user_data:
-            user_data[user_id] = {}
         user_data[user_id]['current_image'] = current_image
         
     except Exception as e:
@@ -464,6 +633,7 @@ async def send_current_image(event, new_message=False):
             logger.error(f"Не удалось отправить сообщение об ошибке: {msg_error}")
 
 @bot.on(events.CallbackQuery(pattern=r"create_meme$"))
+@instrumented
 async def create_meme_button_handler(event):
     """
     Обработчик нажатия кнопки "Создать мем"
@@ -476,12 +646,10 @@ async def create_meme_button_handler(event):
         return
     
     # Правильная проверка наличия изображения
-    if not user_state['current_category'] or not user_state['images'].get(user_state['current_category']):
+    current_image = current_meme()
+    if current_image is None:
         await event.respond("⚠️ Сначала выберите категорию и изображение")
         return
-
-    # Получаем текущее изображение
-    current_image = user_state['images'][user_state['current_category']][user_state['current_index']]
     
     # Сохраняем текущее изображение в данных пользователя
     if user_id not in user_data:
@@ -496,6 +664,7 @@ async def create_meme_button_handler(event):
     await event.respond("✏️ Введите текст, который будет размещен СВЕРХУ изображения (или отправьте /skip или skip, чтобы пропустить, или /cancel для отмены):")
 
 @bot.on(events.NewMessage(func=lambda e: e.is_private))
+@instrumented
 async def text_message_handler(event):
     """Обработчик текстовых сообщений для создания мема"""
     user_id = event.sender_id
@@ -823,18 +992,40 @@ async def create_meme(image_path, top_text, bottom_text, font_size_percent=None)
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
             hash_input = f"{str(image_path)}_{top_text}_{bottom_text}_{timestamp}"
             hash_value = hashlib.md5(hash_input.encode()).hexdigest()
-            filename = f"meme_{hash_value}.jpg"
-            
-            # Создаем директорию для мемов с текстом, если она не существует
-            meme_dir = WITH_TEXT_DIR  # Используем существующую директорию для мемов с текстом
-            os.makedirs(meme_dir, exist_ok=True)
             
-            # Путь для сохранения
-            output_path = os.path.join(meme_dir, filename)
+            # Сохраняем во временный файл (.tmp, его не подхватят ни сверка, ни перенос
+            # плоского хранилища), после подсчета хеша файл переносится на свое место
+            output_path = str(_temp_path(STORE_DIR / f"meme_{hash_value}.jpg"))
             
             # Сохраняем изображение
             img.save(output_path, "JPEG")
             
+            # Регистрируем мем в каталоге, чтобы парсер не сохранил его повторно;
+            # в хранилище файл лежит под хешем содержимого, как и мемы из каналов
+            meme_hash = get_image_hash(output_path)
+            if meme_hash:
+                existing = catalog.find_by_hash(meme_hash)
+                content_path = store_path(meme_hash, create=True)
+                if existing is not None and existing.exists():
+                    # Такой мем уже есть в коллекции: отдаем его, не перезаписывая
+                    # ни файл, ни запись каталога (источник, текст, просмотры)
+                    os.remove(output_path)
+                    output_path = str(existing)
+                else:
+                    if content_path.exists():
+                        # Файл с этим хешем уже лежит в хранилище без записи - не затираем его
+                        os.remove(output_path)
+                    else:
+                        os.replace(output_path, content_path)
+                    output_path = str(content_path)
+                    catalog.add(meme_hash, output_path, 'with_text', get_perceptual_hash(output_path),
+                                file_metadata(output_path))
+                    collection.invalidate()
+            else:
+                # Без хеша мему нет места в хранилище, временный файл не оставляем
+                os.remove(output_path)
+                return None
+            
             return output_path
             
     except Exception as e:
@@ -858,13 +1049,18 @@ async def publish_to_channel(image_path, caption=""):
             logger.error(f"Файл не существует: {image_path}")
             return False
             
+        # Telegram принимает фото в JPEG: для WebP/AVIF из хранилища берем JPEG из кеша
+        upload_path = await asyncio.get_running_loop().run_in_executor(None, telegram_jpeg, image_path)
+        
         # Отправляем в канал без подписи
-        await bot.send_file(
+        await send_photo(
             TARGET_CHANNEL,
-            file=str(image_path),
+            image_path,
+            upload_path,
             caption=""  # Пустая подпись
         )
         
+        catalog.mark_published(image_path)
         logger.info(f"Изображение успешно опубликовано в канале @{TARGET_CHANNEL}")
         return True
         
@@ -922,6 +1118,11 @@ def register_handlers():
         events.NewMessage(pattern='/stop')
     )
     
+    bot.add_event_handler(
+        profile_command_handler,
+        events.NewMessage(pattern=r'/profile')
+    )
+    
     bot.add_event_handler(
         stop_bot_handler,
         events.CallbackQuery(pattern=r"stop_bot")
@@ -989,6 +1190,7 @@ def register_handlers():
     )
 
 @bot.on(events.CallbackQuery(pattern=r"template_meme"))
+@instrumented
 async def template_meme_handler(event):
     """Обработчик для начала создания мема из шаблона"""
     user_id = event.sender_id
@@ -1010,14 +1212,10 @@ async def template_meme_handler(event):
         return
         
     # Проверяем наличие изображений
-    category = user_state['current_category']
-    index = user_state['current_index']
-    
-    if not user_state['images'][category] or len(user_state['images'][category]) == 0:
+    current_image = current_meme()
+    if current_image is None:
         await event.answer("⚠️ В этой категории нет изображений!")
         return
-        
-    current_image = user_state['images'][category][index]
     
     # Сохраняем изображение для мема
     if user_id not in user_data:
@@ -1047,6 +1245,7 @@ async def template_meme_handler(event):
     user_states[user_id] = AWAITING_TEMPLATE_THEME
 
 @bot.on(events.CallbackQuery(pattern=r"back_to_meme_menu"))
+@instrumented
 async def back_to_meme_menu_handler(event):
     """
     Обработчик для возврата в меню создания мема
@@ -1078,6 +1277,7 @@ async def back_to_meme_menu_handler(event):
     await send_current_image(event, new_message=True)
 
 @bot.on(events.CallbackQuery(pattern=r"template_"))
+@instrumented
 async def handle_template_selection(event):
     """
     Обработчик выбора шаблона для мема
@@ -1145,6 +1345,7 @@ async def handle_template_selection(event):
         user_states[user_id] = None
 
 @bot.on(events.CallbackQuery(pattern=r"create_meme_ai_theme"))
+@instrumented
 async def create_meme_ai_theme_handler(event):
     """
     Обработчик для создания мема с помощью ИИ по заданной теме
@@ -1167,14 +1368,10 @@ async def create_meme_ai_theme_handler(event):
         return
         
     # Получаем текущее изображение
-    category = user_state['current_category']
-    index = user_state['current_index']
-    
-    if not user_state['images'][category] or len(user_state['images'][category]) == 0:
+    current_image = current_meme()
+    if current_image is None:
         await event.answer("⚠️ В этой категории нет изображений!")
         return
-        
-    current_image = user_state['images'][category][index]
     
     # Проверяем доступность Ollama API
     try:
@@ -1234,6 +1431,7 @@ async def create_meme_ai_theme_handler(event):
     user_states[user_id] = AWAITING_AI_THEME
 
 @bot.on(events.CallbackQuery(pattern=r"create_meme_ai_auto"))
+@instrumented
 async def create_meme_ai_auto_handler(event):
     """
     Обработчик для автоматического создания мема с помощью ИИ (без ввода темы)
@@ -1256,14 +1454,10 @@ async def create_meme_ai_auto_handler(event):
         return
         
     # Получаем текущее изображение
-    category = user_state['current_category']
-    index = user_state['current_index']
-    
-    if not user_state['images'][category] or len(user_state['images'][category]) == 0:
+    current_image = current_meme()
+    if current_image is None:
         await event.answer("⚠️ В этой категории нет изображений!")
         return
-        
-    current_image = user_state['images'][category][index]
     
     # Проверяем доступность Ollama API
     try:
@@ -1335,6 +1529,7 @@ async def create_meme_ai_auto_handler(event):
         user_states[user_id] = None
 
 @bot.on(events.NewMessage(pattern='/start'))
+@instrumented
 async def start_handler(event):
     """Обработчик команды /start"""
     # Проверяем, что запрос от известного пользователя
@@ -1366,6 +1561,7 @@ async def start_handler(event):
     logger.info(f"Пользователь {user_id} запустил бота")
 
 @bot.on(events.NewMessage(pattern='/logout'))
+@instrumented
 async def logout_handler(event):
     """Обработчик для выхода из системы"""
     user_id = event.sender_id
@@ -1377,6 +1573,7 @@ async def logout_handler(event):
         await event.respond("Вы не были авторизованы")
         
 @bot.on(events.NewMessage(pattern='/help'))
+@instrumented
 async def help_handler(event):
     """Обработчик команды /help"""
     # Проверяем, что это администратор и он авторизован
@@ -1394,7 +1591,8 @@ async def help_handler(event):
         "/stop - остановить бота\n"
         "/skip - пропустить ввод текста при создании мема (можно также просто ввести 'skip')\n"
         "/parse - запустить парсер для сбора новых мемов из каналов\n"
-        "/clear - управление коллекцией мемов (очистка)\n\n"
+        "/clear - управление коллекцией мемов (очистка)\n"
+        "/profile N - профилировать следующие N вызовов обработчиков\n\n"
         "**Навигация:**\n"
         "⬅️/➡️ кнопки - переключение между мемами\n"
         "🗑️ - удаление мема\n"
@@ -1412,6 +1610,7 @@ async def help_handler(event):
     )
 
 @bot.on(events.CallbackQuery())
+@instrumented
 async def callback_handler(event):
     """Обработчик callback-запросов от кнопок"""
     user_id = event.sender_id
@@ -1449,11 +1648,13 @@ async def callback_handler(event):
         )
         
     elif data == "reload_images":
-        user_state['images'] = await load_images()
+        # Сверка каталога с диском целиком (если она уже идет с запуска - ждем ее)
+        await start_sync()
+        collection.reload()
         await event.edit(
             "🔄 Коллекция мемов обновлена!\n\n"
-            f"С текстом: {len(user_state['images']['with_text'])}\n"
-            f"Без текста: {len(user_state['images']['without_text'])}\n\n"
+            f"С текстом: {collection.count('with_text')}\n"
+            f"Без текста: {collection.count('without_text')}\n\n"
             "Выбери категорию для просмотра:",
             buttons=[
                 [Button.inline("С текстом", data="category_with_text")],
@@ -1466,66 +1667,56 @@ async def callback_handler(event):
         )
 
     elif data == "category_with_text":
-        user_state['current_category'] = 'with_text'
-        user_state['current_index'] = 0
+        select_category('with_text')
         await send_current_image(event)
         
     elif data == "category_without_text":
-        user_state['current_category'] = 'without_text'
-        user_state['current_index'] = 0
+        select_category('without_text')
         await send_current_image(event)
         
     elif data == "next":
         if user_state['current_category']:
-            user_state['current_index'] += 1
-            # Если вышли за предел, переходим к первому изображению
-            if user_state['current_index'] >= len(user_state['images'][user_state['current_category']]):
-                user_state['current_index'] = 0
+            # После последнего изображения переходим к первому
+            user_state['cursor'].step(1)
             await send_current_image(event)
         else:
             await event.answer("Сначала выберите категорию")
             
     elif data == "prev":
         if user_state['current_category']:
-            user_state['current_index'] -= 1
-            # Если вышли за предел, переходим к последнему изображению
-            if user_state['current_index'] < 0:
-                user_state['current_index'] = len(user_state['images'][user_state['current_category']]) - 1
+            # Перед первым изображением - последнее
+            user_state['cursor'].step(-1)
             await send_current_image(event)
         else:
             await event.answer("Сначала выберите категорию")
     
     elif data == "count":
         if user_state['current_category']:
-            total = len(user_state['images'][user_state['current_category']])
-            await event.answer(f"Мем {user_state['current_index'] + 1} из {total}")
+            cursor = user_state['cursor']
+            await event.answer(f"Мем {cursor.index() + 1} из {cursor.total()}")
         
     elif data == "delete":
         if not user_state['current_category']:
             await event.answer("Сначала выберите категорию")
             return
             
-        images = user_state['images'][user_state['current_category']]
-        if not images:
+        # Получаем текущее изображение
+        current_image = current_meme()
+        if current_image is None:
             await event.answer("Нет изображений для удаления")
             return
-            
-        # Получаем текущее изображение
-        current_image = images[user_state['current_index']]
         
         try:
-            # Удаляем файл
-            os.remove(current_image)
+            # Удаляем файл (и его производные в кеше)
+            remove_meme_files([current_image])
+            catalog.remove(current_image)
             await event.answer(f"Мем удален!")
             
-            # Обновляем список изображений
-            user_state['images'] = await load_images()
+            # Курсор переходит на следующий мем
+            collection.invalidate()
             
             # Показываем следующий мем (или информацию, что мемов больше нет)
-            if user_state['images'][user_state['current_category']]:
-                # Если индекс теперь за пределами списка, корректируем
-                if user_state['current_index'] >= len(user_state['images'][user_state['current_category']]):
-                    user_state['current_index'] = 0
+            if user_state['cursor'].total():
                 await send_current_image(event)
             else:
                 await event.edit(f"В категории больше нет мемов.", buttons=[
@@ -1542,41 +1733,25 @@ async def callback_handler(event):
             await event.answer("Сначала выберите категорию")
             return
             
-        images = user_state['images'][user_state['current_category']]
-        if not images:
+        # Получаем текущее изображение
+        current_image = current_meme()
+        if current_image is None:
             await event.answer("Нет изображений для перемещения")
             return
-            
-        # Получаем текущее изображение
-        current_image = images[user_state['current_index']]
         
-        # Определяем целевую директорию (противоположную текущей)
-        current_dir = WITH_TEXT_DIR if user_state['current_category'] == 'with_text' else WITHOUT_TEXT_DIR
-        target_dir = WITHOUT_TEXT_DIR if user_state['current_category'] == 'with_text' else WITH_TEXT_DIR
+        # Определяем целевую категорию (противоположную текущей)
         target_category = 'without_text' if user_state['current_category'] == 'with_text' else 'with_text'
         
         try:
-            # Создаем путь к новому файлу
-            filename = os.path.basename(current_image)
-            target_path = target_dir / filename
-            
-            # Если файл с таким именем уже существует, добавляем префикс
-            if target_path.exists():
-                base, ext = os.path.splitext(filename)
-                target_path = target_dir / f"{base}_moved{ext}"
-            
-            # Перемещаем файл
-            shutil.move(str(current_image), str(target_path))
+            # Файл остается на месте: категория - это поле записи в каталоге
+            catalog.set_category([current_image], target_category)
             await event.answer(f"Мем перемещен в категорию '{target_category}'!")
             
-            # Обновляем список изображений
-            user_state['images'] = await load_images()
+            # Курсор переходит на следующий мем категории
+            collection.invalidate()
             
             # Показываем следующий мем (или информацию, что мемов больше нет)
-            if user_state['images'][user_state['current_category']]:
-                # Если индекс теперь за пределами списка, корректируем
-                if user_state['current_index'] >= len(user_state['images'][user_state['current_category']]):
-                    user_state['current_index'] = 0
+            if user_state['cursor'].total():
                 await send_current_image(event)
             else:
                 await event.edit(f"В категории больше нет мемов.", buttons=[
@@ -1620,14 +1795,14 @@ async def callback_handler(event):
                     # Парсер успешно завершил работу
                     await event.edit("✅ Парсер успешно завершил работу! Обновляю коллекцию мемов...")
                     
-                    # Обновляем список изображений
-                    user_state['images'] = await load_images()
+                    # Новые мемы видны курсорам сразу (по журналу изменений каталога)
+                    collection.sync_changes()
                     
                     # Показываем результаты
                     await event.edit(
                         "✅ Парсинг мемов завершен!\n\n"
-                        f"С текстом: {len(user_state['images']['with_text'])}\n"
-                        f"Без текста: {len(user_state['images']['without_text'])}\n\n"
+                        f"С текстом: {collection.count('with_text')}\n"
+                        f"Без текста: {collection.count('without_text')}\n\n"
                         "Выберите категорию для просмотра:",
                         buttons=[
                             [Button.inline("С текстом", data="category_with_text")],
@@ -1691,14 +1866,11 @@ async def callback_handler(event):
         
         if clear_type == "all":
             # Очистка всех мемов
-            with_text_dir = WITH_TEXT_DIR
-            without_text_dir = WITHOUT_TEXT_DIR
-            
             # Проверяем наличие мемов
-            with_text_files = list(with_text_dir.glob("*.jpg")) + list(with_text_dir.glob("*.png"))
-            without_text_files = list(without_text_dir.glob("*.jpg")) + list(without_text_dir.glob("*.png"))
+            with_text_count = catalog.count('with_text')
+            without_text_count = catalog.count('without_text')
             
-            total_memes = len(with_text_files) + len(without_text_files)
+            total_memes = with_text_count + without_text_count
             
             if total_memes == 0:
                 await event.edit(
@@ -1712,8 +1884,8 @@ async def callback_handler(event):
             # Запрос подтверждения
             await event.edit(
                 f"⚠️ Найдено {total_memes} мемов для удаления:\n"
-                f"  - Мемов с текстом: {len(with_text_files)}\n"
-                f"  - Мемов без текста: {len(without_text_files)}\n\n"
+                f"  - Мемов с текстом: {with_text_count}\n"
+                f"  - Мемов без текста: {without_text_count}\n\n"
                 f"Вы уверены, что хотите удалить ВСЕ мемы?",
                 buttons=[
                     [Button.inline("✅ Да, удалить все", data="confirm_clear_all")],
@@ -1723,12 +1895,10 @@ async def callback_handler(event):
         
         elif clear_type == "with_text":
             # Очистка мемов с текстом
-            with_text_dir = WITH_TEXT_DIR
-            
             # Проверяем наличие мемов
-            with_text_files = list(with_text_dir.glob("*.jpg")) + list(with_text_dir.glob("*.png"))
+            with_text_count = catalog.count('with_text')
             
-            if not with_text_files:
+            if not with_text_count:
                 await event.edit(
                     "❕ Директория мемов с текстом уже пуста.",
                     buttons=[
@@ -1739,7 +1909,7 @@ async def callback_handler(event):
             
             # Запрос подтверждения
             await event.edit(
-                f"⚠️ Найдено {len(with_text_files)} мемов с текстом для удаления.\n\n"
+                f"⚠️ Найдено {with_text_count} мемов с текстом для удаления.\n\n"
                 f"Вы уверены, что хотите удалить ВСЕ мемы с текстом?",
                 buttons=[
                     [Button.inline("✅ Да, удалить", data="confirm_clear_with_text")],
@@ -1749,12 +1919,10 @@ async def callback_handler(event):
         
         elif clear_type == "without_text":
             # Очистка мемов без текста
-            without_text_dir = WITHOUT_TEXT_DIR
-            
             # Проверяем наличие мемов
-            without_text_files = list(without_text_dir.glob("*.jpg")) + list(without_text_dir.glob("*.png"))
+            without_text_count = catalog.count('without_text')
             
-            if not without_text_files:
+            if not without_text_count:
                 await event.edit(
                     "❕ Директория мемов без текста уже пуста.",
                     buttons=[
@@ -1765,7 +1933,7 @@ async def callback_handler(event):
             
             # Запрос подтверждения
             await event.edit(
-                f"⚠️ Найдено {len(without_text_files)} мемов без текста для удаления.\n\n"
+                f"⚠️ Найдено {without_text_count} мемов без текста для удаления.\n\n"
                 f"Вы уверены, что хотите удалить ВСЕ мемы без текста?",
                 buttons=[
                     [Button.inline("✅ Да, удалить", data="confirm_clear_without_text")],
@@ -1778,81 +1946,40 @@ async def callback_handler(event):
         clear_type = data.replace("confirm_clear_", "")
         
         try:
+            # Записи убираются из каталога одной транзакцией - коллекция очищается
+            # сразу, а файлы удаляются в фоне, не блокируя бота
             if clear_type == "all":
                 # Удаление всех мемов
-                with_text_dir = WITH_TEXT_DIR
-                without_text_dir = WITHOUT_TEXT_DIR
-                
-                with_text_files = list(with_text_dir.glob("*.jpg")) + list(with_text_dir.glob("*.png"))
-                without_text_files = list(without_text_dir.glob("*.jpg")) + list(without_text_dir.glob("*.png"))
-                
-                total_deleted = 0
-                
-                # Удаление файлов с текстом
-                for file in with_text_files:
-                    os.remove(file)
-                    total_deleted += 1
-                
-                # Удаление файлов без текста
-                for file in without_text_files:
-                    os.remove(file)
-                    total_deleted += 1
-                
-                # Обновляем список изображений
-                user_state['images'] = await load_images()
-                
-                await event.edit(
-                    f"✅ Успешно удалено {total_deleted} мемов.",
-                    buttons=[
-                        [Button.inline("📋 Главное меню", data="menu")]
-                    ]
-                )
+                total_deleted = catalog.detach()
+                summary = f"✅ Из коллекции удалено {total_deleted} мемов."
             
             elif clear_type == "with_text":
                 # Удаление мемов с текстом
-                with_text_dir = WITH_TEXT_DIR
-                
-                with_text_files = list(with_text_dir.glob("*.jpg")) + list(with_text_dir.glob("*.png"))
-                
-                total_deleted = 0
-                
-                # Удаление файлов
-                for file in with_text_files:
-                    os.remove(file)
-                    total_deleted += 1
-                
-                # Обновляем список изображений
-                user_state['images'] = await load_images()
-                
-                await event.edit(
-                    f"✅ Успешно удалено {total_deleted} мемов с текстом.",
-                    buttons=[
-                        [Button.inline("📋 Главное меню", data="menu")]
-                    ]
-                )
+                total_deleted = catalog.detach('with_text')
+                summary = f"✅ Из коллекции удалено {total_deleted} мемов с текстом."
             
             elif clear_type == "without_text":
                 # Удаление мемов без текста
-                without_text_dir = WITHOUT_TEXT_DIR
-                
-                without_text_files = list(without_text_dir.glob("*.jpg")) + list(without_text_dir.glob("*.png"))
-                
-                total_deleted = 0
-                
-                # Удаление файлов
-                for file in without_text_files:
-                    os.remove(file)
-                    total_deleted += 1
-                
-                # Обновляем список изображений
-                user_state['images'] = await load_images()
-                
-                await event.edit(
-                    f"✅ Успешно удалено {total_deleted} мемов без текста.",
-                    buttons=[
-                        [Button.inline("📋 Главное меню", data="menu")]
-                    ]
-                )
+                total_deleted = catalog.detach('without_text')
+                summary = f"✅ Из коллекции удалено {total_deleted} мемов без текста."
+            
+            else:
+                return
+            
+            # Ссылки на загруженные фото удаленных мемов больше не нужны
+            # (записи в каталоге удалились вместе с мемами)
+            telegram_cache.clear()
+            
+            # Курсоры и счетчики коллекции перечитаются из каталога
+            collection.invalidate()
+            
+            await event.edit(
+                f"{summary}\n🧹 Файлы удаляются в фоне...",
+                buttons=[
+                    [Button.inline("📋 Главное меню", data="menu")]
+                ]
+            )
+            start_purge(event.chat_id, event.message_id, summary)
         
         except Exception as e:
             logger.error(f"Ошибка при удалении файлов: {e}")
@@ -1864,12 +1991,12 @@ async def callback_handler(event):
             )
         
     elif data == "category_with_text":
-        user_state['current_category'] = 'with_text'
-        user_state['current_index'] = 0
+        select_category('with_text')
         await send_current_image(event)
 
 # Обработчик файлов (для получения пользовательских изображений)
 @bot.on(events.NewMessage(func=lambda e: e.is_private and (e.photo or e.document)))
+@instrumented
 async def handle_media(event):
     """Обработчик для получения изображений от пользователя"""
     user_id = event.sender_id
@@ -1945,12 +2072,143 @@ async def handle_media(event):
         # Сбрасываем состояние
         del user_states[user_id]
 
+def start_sync():
+    """Запускает сверку каталога с диском в потоке-исполнителе, если она еще не идет"""
+    global sync_task
+    if sync_task is None or sync_task.done():
+        sync_task = asyncio.get_running_loop().run_in_executor(None, sync_catalog)
+    return sync_task
+
+async def reconcile_in_background():
+    """
+    Фоновая задача при запуске: сверяет каталог с диском, затем дочищает
+    прерванное удаление файлов и создает недостающие превью
+    
+    Сверка обходит все хранилище, поэтому идет в потоке-исполнителе: бот
+    отвечает сразу, а найденные расхождения попадают в коллекцию по журналу
+    изменений каталога.
+    """
+    try:
+        await start_sync()
+    except Exception as e:
+        logger.error(f"Ошибка при сверке каталога с диском: {e}")
+    
+    # Очередь удаления дочищается после сверки: файлы из очереди сверка
+    # пропускает, а удаленный посреди обхода диска файл она вернула бы в каталог
+    if catalog.purge_pending():
+        start_purge()
+    
+    await generate_previews_in_background()
+
+async def generate_previews_in_background():
+    """Фоновая задача: создает превью для мемов, у которых его еще нет"""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, generate_missing_previews)
+    except Exception as e:
+        logger.error(f"Ошибка при фоновом создании превью: {e}")
+
+def start_purge(chat_id=None, message_id=None, summary=""):
+    """Запускает фоновое удаление файлов из очереди, если оно еще не идет"""
+    global purge_task
+    if purge_task and not purge_task.done():
+        # Уже работающая задача дойдет и до новых файлов в очереди
+        return
+    purge_task = asyncio.create_task(purge_in_background(chat_id, message_id, summary))
+
+async def purge_in_background(chat_id=None, message_id=None, summary=""):
+    """
+    Фоновая задача: удаляет файлы из очереди пакетами и показывает ход удаления
+    в сообщении chat_id/message_id (если оно указано)
+    """
+    loop = asyncio.get_running_loop()
+    total = catalog.purge_pending()
+    done = 0
+    last_update = time.monotonic()
+    
+    async def report(text, buttons=None):
+        if chat_id is None:
+            return
+        try:
+            await bot.edit_message(chat_id, message_id, text, buttons=buttons)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить сообщение о ходе удаления: {e}")
+    
+    try:
+        while True:
+            purged = await loop.run_in_executor(None, purge_batch)
+            if not purged:
+                break
+            done += purged
+            if time.monotonic() - last_update >= PURGE_PROGRESS_INTERVAL:
+                last_update = time.monotonic()
+                await report(f"{summary}\n🧹 Удаление файлов: {done} из {total}...")
+        
+        logger.info(f"Фоновое удаление завершено: {done} файлов")
+        await report(
+            f"{summary}\n✅ Файлы удалены: {done}.",
+            buttons=[[Button.inline("📋 Главное меню", data="menu")]]
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при фоновом удалении файлов: {e}")
+        await report(f"{summary}\n❌ Ошибка при удалении файлов: {str(e)[:200]}")
+
+async def watch_catalog_changes():
+    """
+    Фоновая задача: раз в CATALOG_WATCH_INTERVAL секунд применяет к коллекции
+    журнал изменений каталога - мемы, добавленные парсером в другом процессе,
+    появляются в боте без перечитывания всей коллекции
+    """
+    while True:
+        try:
+            changed = collection.sync_changes()
+            if changed:
+                logger.debug(f"Коллекция обновлена по журналу каталога: {changed} изменений")
+        except Exception as e:
+            logger.error(f"Ошибка при чтении журнала изменений каталога: {e}")
+        await asyncio.sleep(CATALOG_WATCH_INTERVAL)
+
+async def enforce_quotas_periodically():
+    """Фоновая задача: раз в QUOTA_CHECK_INTERVAL секунд удаляет мемы сверх квот категорий"""
+    while True:
+        try:
+            # Вытесненные мемы пропадут из просмотра по журналу (watch_catalog_changes)
+            await asyncio.get_running_loop().run_in_executor(None, enforce_quotas)
+        except Exception as e:
+            logger.error(f"Ошибка при проверке квот: {e}")
+        await asyncio.sleep(QUOTA_CHECK_INTERVAL)
+
 async def main():
     """Запускает бота"""
     logger.info(f"Запуск Telegram-бота для просмотра мемов с API_ID={API_ID} и API_HASH={API_HASH[:5]}...")
     
-    # Загружаем изображения при старте
-    user_state['images'] = await load_images()
+    # Коллекция читается из каталога порциями при просмотре; сверка каталога
+    # с диском идет в фоне (reconcile_in_background)
+    collection.reload()
+    
+    # Метрики бота (если задан METRICS_PORT); глубина очередей и размер
+    # коллекции считаются по каталогу при каждом чтении метрик
+    queue_depth.set_function(catalog.purge_pending, queue="purge")
+    for category in ('with_text', 'without_text'):
+        collection_size.set_function(functools.partial(catalog.count, category), category=category)
+    if METRICS_PORT:
+        if start_metrics_server(METRICS_PORT):
+            logger.info(f"Метрики бота: http://127.0.0.1:{METRICS_PORT}/metrics")
+        else:
+            logger.warning(f"Не удалось запустить сервер метрик на порту {METRICS_PORT}")
+    
+    # Задержки цикла событий: метрики и стек кода, который его блокирует
+    loop_monitor.start()
+    
+    # Сверка с диском, дочистка прерванного удаления файлов и превью для уже
+    # сохраненных мемов - в фоне
+    asyncio.create_task(reconcile_in_background())
+    
+    # Изменения каталога из других процессов (парсер, run.py) попадают в коллекцию сразу
+    asyncio.create_task(watch_catalog_changes())
+    
+    # Квоты категорий проверяются в фоне, если заданы
+    if any(max_count or max_bytes for max_count, max_bytes in CATEGORY_QUOTAS.values()):
+        asyncio.create_task(enforce_quotas_periodically())
     
     # Обработчики уже зарегистрированы через декораторы @bot.on()
     logger.info("Обработчики бота зарегистрированы через декораторы")
@@ -1970,6 +2228,7 @@ async def main():
 
 # Обработчик для публикации мема или изображения в канал
 @bot.on(events.CallbackQuery(pattern=r"publish_"))
+@instrumented
 async def publish_handler(event):
     """
     Обработчик для публикации мема или изображения в канал
@@ -2019,8 +2278,10 @@ async def publish_handler(event):
         await event.edit("❌ Файл не найден. Возможно, он был удален.")
         return
     
-    # Определяем, это мем или исходное изображение
-    is_meme = "meme_" in os.path.basename(image_path)
+    # Созданный в боте мем или изображение из коллекции: по имени файла это
+    # не определить (созданные мемы тоже лежат в хранилище под хешем), поэтому
+    # сверяем с последним созданным пользователем мемом
+    is_meme = str(user_data.get(user_id, {}).get('last_meme')) == str(image_path)
     
     # Отправляем статус
     processing_msg = await event.edit("📤 Публикация изображения в канал @" + TARGET_CHANNEL + "...")
@@ -2072,6 +2333,7 @@ def get_path_hash(file_path):
     return short_hash
 
 @bot.on(events.CallbackQuery(pattern=r"stop_bot"))
+@instrumented
 async def stop_bot_handler(event):
     """Обработчик для полной остановки бота"""
     user_id = event.sender_id
@@ -2099,7 +2361,39 @@ async def stop_bot_handler(event):
     import sys
     sys.exit(0)
 
+@bot.on(events.NewMessage(pattern=r'/profile'))
+@instrumented
+async def profile_command_handler(event):
+    """Обработчик команды /profile N - профилирование следующих N вызовов обработчиков"""
+    user_id = event.sender_id
+    
+    # Проверяем, что это администратор и он авторизован
+    if user_id != ADMIN_USER_ID:
+        await event.respond("🔒 У вас нет доступа к этому боту.")
+        return
+    
+    if user_id not in authenticated_users:
+        await event.respond("🔒 Вы не авторизованы. Отправьте /start для ввода пароля.")
+        return
+    
+    args = event.raw_text.split()[1:]
+    try:
+        count = int(args[0]) if args else PROFILE_DEFAULT_CALLS
+    except ValueError:
+        await event.respond("Использование: /profile N, где N - количество вызовов обработчиков")
+        return
+    count = max(1, min(count, PROFILE_MAX_CALLS))
+    
+    async def report(paths):
+        names = "\n".join(path.name for path in paths if path is not None)
+        await bot.send_message(user_id, f"📊 Профилирование завершено, профили в {PROFILE_DIR}:\n{names}")
+    
+    handler_profiler.start(count, on_complete=report)
+    logger.info(f"Включено профилирование следующих {count} вызовов обработчиков")
+    await event.respond(f"📊 Профилирую следующие {count} вызовов обработчиков. Когда закончу - пришлю список файлов.")
+
 @bot.on(events.NewMessage(pattern='/stop'))
+@instrumented
 async def stop_command_handler(event):
     """Обработчик команды /stop для остановки бота"""
     user_id = event.sender_id
@@ -2153,14 +2447,30 @@ async def show_font_size_selection(event, meme_path, top_text, bottom_text, font
     user_data[user_id]['font_size_percent'] = font_size_percent
     
     # Создаем мем с текущим размером шрифта
+    started_at = time.time()
     new_meme_path = await create_meme(meme_path, top_text, bottom_text, font_size_percent)
     
     if not new_meme_path:
         await event.respond("❌ Произошла ошибка при создании мема.")
         return
     
+    # Мем с прежним размером шрифта больше не нужен: каждое изменение размера
+    # создает новый файл, поэтому неподтвержденный черновик удаляем. Если же
+    # create_meme вернул мем, который уже был в коллекции, это не черновик
+    previous_draft = user_data[user_id].get('last_meme')
+    if (user_states.get(user_id) == FONT_SIZE_SELECTION and previous_draft
+            and user_data[user_id].get('last_meme_is_draft')
+            and str(previous_draft) != str(new_meme_path)):
+        remove_meme_files([previous_draft])
+        catalog.remove(previous_draft)
+        collection.invalidate()
+    
     # Сохраняем путь к созданному мему
+    record = catalog.get(new_meme_path)
     user_data[user_id]['last_meme'] = new_meme_path
+    user_data[user_id]['last_meme_is_draft'] = (
+        record is not None and (record['ingested_at'] or 0) >= started_at
+    )
     
     # Создаем хэш для пути к файлу для публикации
     file_hash = get_path_hash(new_meme_path)
@@ -2184,14 +2494,16 @@ async def show_font_size_selection(event, meme_path, top_text, bottom_text, font
         logger.error(f"Не удалось удалить сообщение: {e}")
     
     # Отправляем мем с кнопками выбора размера шрифта
-    await bot.send_file(
+    await send_photo(
         user_id,
-        file=str(new_meme_path),
+        new_meme_path,
+        new_meme_path,
         caption=f"📏 Текущий размер шрифта: {font_size_percent}% от высоты изображения.\nВыберите действие:",
         buttons=buttons
     )
 
 @bot.on(events.CallbackQuery(pattern=r"font_smaller_"))
+@instrumented
 async def font_smaller_handler(event):
     """Обработчик для уменьшения размера шрифта"""
     user_id = event.sender_id
@@ -2241,6 +2553,7 @@ async def font_smaller_handler(event):
     await show_font_size_selection(event, meme_source, top_text, bottom_text, new_size)
 
 @bot.on(events.CallbackQuery(pattern=r"font_larger_"))
+@instrumented
 async def font_larger_handler(event):
     """Обработчик для увеличения размера шрифта"""
     user_id = event.sender_id
@@ -2290,6 +2603,7 @@ async def font_larger_handler(event):
     await show_font_size_selection(event, meme_source, top_text, bottom_text, new_size)
 
 @bot.on(events.CallbackQuery(pattern=r"font_confirm"))
+@instrumented
 async def font_confirm_handler(event):
     """Обработчик подтверждения размера шрифта и завершения создания мема"""
     user_id = event.sender_id
@@ -2334,9 +2648,11 @@ async def font_confirm_handler(event):
         logger.error(f"Не удалось удалить сообщение: {e}")
     
     # Отправляем готовый мем с кнопками для дальнейших действий
-    await bot.send_file(
+    # (он уже загружен при выборе размера шрифта)
+    await send_photo(
         user_id,
-        file=str(meme_path),
+        meme_path,
+        meme_path,
         caption=f"✅ Мем создан! Размер шрифта: {font_size_percent}%",
         buttons=[
             [Button.inline("📷 Создать еще мем", data="create_meme")],
@@ -2345,9 +2661,6 @@ async def font_confirm_handler(event):
             [Button.inline("📋 Главное меню", data="menu")]
         ]
     )
-    
-    # Обновляем список изображений
-    user_state['images'] = await load_images()
 
 if __name__ == "__main__":
     # Запускаем асинхронную функцию в event loop
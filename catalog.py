@@ -0,0 +1,730 @@
+"""
+Каталог сохраненных мемов в SQLite.
+
+Хранит хеш каждого сохраненного изображения, поэтому проверка на дубликат -
+это запрос по индексу, а не перебор и повторное декодирование всех файлов
+коллекции. Для поиска почти совпадающих изображений хранится перцептивный
+хеш, разбитый на части с отдельными индексами. Кроме хешей каталог хранит
+метаданные мема (источник, размеры, время добавления, распознанный текст),
+поэтому списки и счетчики коллекции строятся запросами по индексу, а не обходом
+директорий. Каталог обновляется при сохранении, перемещении и удалении мемов
+из парсера, бота и run.py.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from itertools import combinations
+from pathlib import Path
+from dotenv import load_dotenv
+from logging_setup import get_logger
+
+logger = get_logger("catalog")
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Путь к файлу каталога
+CATALOG_PATH = Path(os.getenv('CATALOG_PATH', str(Path("memes") / "catalog.db")))
+
+# Сколько последних записей хранит журнал изменений. Журнал обрезает бот, когда
+# прочитал его, но парсер из cron или run.py пишут в каталог и без бота, поэтому
+# более старые записи удаляются при каждой записи в журнал. Значение зашито в
+# триггер схемы (миграция 10).
+CHANGES_JOURNAL_LIMIT = 10000
+
+# Миграции схемы: индекс в списке + 1 = версия схемы (PRAGMA user_version)
+SCHEMA_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS memes (
+        path TEXT PRIMARY KEY,
+        hash TEXT NOT NULL,
+        category TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_memes_hash ON memes(hash);
+    CREATE INDEX IF NOT EXISTS idx_memes_category ON memes(category);
+    """,
+    # Перцептивный хеш (dHash, 64 бита) и его 16-битные части для поиска по расстоянию Хэмминга
+    """
+    ALTER TABLE memes ADD COLUMN phash INTEGER;
+    ALTER TABLE memes ADD COLUMN phash0 INTEGER;
+    ALTER TABLE memes ADD COLUMN phash1 INTEGER;
+    ALTER TABLE memes ADD COLUMN phash2 INTEGER;
+    ALTER TABLE memes ADD COLUMN phash3 INTEGER;
+    CREATE INDEX IF NOT EXISTS idx_memes_phash0 ON memes(phash0);
+    CREATE INDEX IF NOT EXISTS idx_memes_phash1 ON memes(phash1);
+    CREATE INDEX IF NOT EXISTS idx_memes_phash2 ON memes(phash2);
+    CREATE INDEX IF NOT EXISTS idx_memes_phash3 ON memes(phash3);
+    """,
+    # Метаданные мема: источник, размеры, время добавления и распознанный текст
+    """
+    ALTER TABLE memes ADD COLUMN source_channel TEXT;
+    ALTER TABLE memes ADD COLUMN message_id INTEGER;
+    ALTER TABLE memes ADD COLUMN width INTEGER;
+    ALTER TABLE memes ADD COLUMN height INTEGER;
+    ALTER TABLE memes ADD COLUMN bytes INTEGER;
+    ALTER TABLE memes ADD COLUMN ingested_at REAL;
+    ALTER TABLE memes ADD COLUMN ocr_text TEXT;
+    CREATE INDEX IF NOT EXISTS idx_memes_category_ingested ON memes(category, ingested_at);
+    CREATE INDEX IF NOT EXISTS idx_memes_source ON memes(source_channel, message_id);
+    """,
+    # Время последнего просмотра и публикации - для вытеснения по квотам
+    """
+    ALTER TABLE memes ADD COLUMN last_viewed REAL;
+    ALTER TABLE memes ADD COLUMN published_at REAL;
+    """,
+    # Очередь файлов на удаление: очистка коллекции сразу убирает записи из memes,
+    # а файлы удаляются в фоне пакетами (и после перезапуска тоже)
+    """
+    CREATE TABLE IF NOT EXISTS purge_queue (
+        path TEXT PRIMARY KEY
+    );
+    """,
+    # Ссылки на уже загруженные в Telegram фото (повторная отправка без загрузки).
+    # Запись живет, пока есть мем: удаляется и переименовывается вместе с ним
+    """
+    CREATE TABLE IF NOT EXISTS telegram_files (
+        path TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        photo_id INTEGER NOT NULL,
+        access_hash INTEGER NOT NULL,
+        file_reference BLOB NOT NULL,
+        PRIMARY KEY (path, variant)
+    );
+    CREATE TRIGGER IF NOT EXISTS memes_delete_telegram_files AFTER DELETE ON memes
+    BEGIN
+        DELETE FROM telegram_files WHERE path = OLD.path;
+    END;
+    CREATE TRIGGER IF NOT EXISTS memes_rename_telegram_files AFTER UPDATE OF path ON memes
+    BEGIN
+        UPDATE telegram_files SET path = NEW.path WHERE path = OLD.path;
+    END;
+    """,
+    # Журнал изменений коллекции: бот читает его и обновляет списки просмотра,
+    # не перечитывая каталог, даже если мемы добавил парсер в другом процессе
+    """
+    CREATE TABLE IF NOT EXISTS changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        op TEXT NOT NULL,
+        path TEXT NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS memes_journal_insert AFTER INSERT ON memes
+    BEGIN
+        INSERT INTO changes (op, path) VALUES ('add', NEW.path);
+    END;
+    CREATE TRIGGER IF NOT EXISTS memes_journal_delete AFTER DELETE ON memes
+    BEGIN
+        INSERT INTO changes (op, path) VALUES ('remove', OLD.path);
+    END;
+    CREATE TRIGGER IF NOT EXISTS memes_journal_update AFTER UPDATE OF path, category ON memes
+    BEGIN
+        INSERT INTO changes (op, path) SELECT 'remove', OLD.path WHERE OLD.path <> NEW.path;
+        INSERT INTO changes (op, path) VALUES ('add', NEW.path);
+    END;
+    """,
+    # Индекс для постраничного просмотра категории в порядке добавления
+    """
+    CREATE INDEX IF NOT EXISTS idx_memes_browse ON memes(category, COALESCE(ingested_at, 0));
+    """,
+    # Мем, снова сохраненный по пути из очереди на удаление (то же изображение
+    # пришло после очистки коллекции), из очереди убирается - иначе фоновое
+    # удаление стерло бы файл живого мема
+    """
+    DELETE FROM purge_queue WHERE path IN (SELECT path FROM memes);
+    CREATE TRIGGER IF NOT EXISTS memes_unqueue_insert AFTER INSERT ON memes
+    BEGIN
+        DELETE FROM purge_queue WHERE path = NEW.path;
+    END;
+    CREATE TRIGGER IF NOT EXISTS memes_unqueue_rename AFTER UPDATE OF path ON memes
+    BEGIN
+        DELETE FROM purge_queue WHERE path = NEW.path;
+    END;
+    """,
+    # Журнал изменений не растет без бота: хранятся последние CHANGES_JOURNAL_LIMIT записей
+    f"""
+    DELETE FROM changes WHERE id <= (SELECT MAX(id) FROM changes) - {CHANGES_JOURNAL_LIMIT};
+    CREATE TRIGGER IF NOT EXISTS changes_cap AFTER INSERT ON changes
+    BEGIN
+        DELETE FROM changes WHERE id <= NEW.id - {CHANGES_JOURNAL_LIMIT};
+    END;
+    """,
+]
+
+# Порядок вытеснения мемов при превышении квоты категории (первыми удаляются первые)
+EVICTION_ORDER = {
+    # Самые давно добавленные
+    'oldest': "ingested_at, rowid",
+    # Давно не просматривавшиеся (никогда не просмотренные - по времени добавления)
+    'lru': "COALESCE(last_viewed, ingested_at, 0), rowid",
+    # Уже опубликованные (от давно опубликованных), затем самые давно добавленные
+    'published': "published_at IS NULL, published_at, ingested_at, rowid",
+}
+
+# Поля метаданных, которые можно передать в MemeCatalog.add и update_metadata
+METADATA_COLUMNS = ('source_channel', 'message_id', 'width', 'height', 'bytes', 'ingested_at', 'ocr_text')
+
+# Перцептивный хеш делится на PHASH_CHUNKS частей по PHASH_CHUNK_BITS бит (multi-index hashing):
+# если хеши отличаются не более чем на r бит, то хотя бы одна часть отличается
+# не более чем на r // PHASH_CHUNKS бит. Поиск идет по индексам частей, а точное
+# расстояние считается только для найденных кандидатов.
+PHASH_CHUNKS = 4
+PHASH_CHUNK_BITS = 16
+PHASH_CHUNK_MASK = (1 << PHASH_CHUNK_BITS) - 1
+
+# Радиус поиска в одной части: для 3 и больше перебор соседей становится слишком дорогим
+MAX_CHUNK_RADIUS = 2
+
+
+def hamming_distance(first, second):
+    """Расстояние Хэмминга между двумя 64-битными хешами"""
+    return bin(first ^ second).count('1')
+
+
+def _split_phash(phash):
+    """Разбивает 64-битный хеш на PHASH_CHUNKS частей (от старших бит к младшим)"""
+    return [
+        (phash >> (PHASH_CHUNK_BITS * (PHASH_CHUNKS - 1 - i))) & PHASH_CHUNK_MASK
+        for i in range(PHASH_CHUNKS)
+    ]
+
+
+def _to_signed(phash):
+    """SQLite хранит INTEGER как знаковое 64-битное число"""
+    return phash - (1 << 64) if phash >= (1 << 63) else phash
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def _chunk_neighbours(value, radius):
+    """Все значения части, отличающиеся от value не более чем на radius бит"""
+    neighbours = [value]
+    for distance in range(1, radius + 1):
+        for bits in combinations(range(PHASH_CHUNK_BITS), distance):
+            flipped = value
+            for bit in bits:
+                flipped ^= 1 << bit
+            neighbours.append(flipped)
+    return neighbours
+
+
+class MemeCatalog:
+    def __init__(self, db_path):
+        """Открывает (или создает) каталог и применяет миграции схемы"""
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Соединение используется и из потоков-исполнителей бота, поэтому
+        # все обращения сериализуются через блокировку
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+
+        # WAL позволяет боту читать каталог, пока парсер (отдельный процесс) пишет в него
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+        self._migrate()
+
+    def _migrate(self):
+        """Доводит схему каталога до последней версии"""
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, script in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+                self._conn.executescript(script)
+                self._conn.execute(f"PRAGMA user_version = {number}")
+                logger.info(f"Каталог мемов: схема обновлена до версии {number}")
+
+    def add(self, img_hash, path, category, phash=None, metadata=None, replace=True):
+        """
+        Добавляет (или обновляет) запись о сохраненном изображении
+
+        Args:
+            img_hash: хеш содержимого
+            path: путь к файлу
+            category: 'with_text' или 'without_text'
+            phash: перцептивный хеш (если посчитан)
+            metadata: словарь с полями из METADATA_COLUMNS
+            replace: заменить существующую запись; False - оставить ее как есть
+
+        Returns:
+            bool: True если запись добавлена (или заменена)
+        """
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"{verb} INTO memes (path, hash, category) VALUES (?, ?, ?)",
+                (str(path), img_hash, category)
+            )
+            if not cursor.rowcount:
+                return False
+            if phash is not None:
+                self._set_phash(path, phash)
+            if metadata:
+                self._update_metadata(path, metadata)
+        return True
+
+    def update_metadata(self, path, metadata):
+        """Обновляет метаданные изображения (поля из METADATA_COLUMNS)"""
+        with self._lock, self._conn:
+            self._update_metadata(path, metadata)
+
+    def _update_metadata(self, path, metadata):
+        fields = {key: value for key, value in metadata.items() if key in METADATA_COLUMNS}
+        unknown = set(metadata) - set(fields)
+        if unknown:
+            logger.warning(f"Каталог мемов: неизвестные поля метаданных {', '.join(sorted(unknown))}")
+        if not fields:
+            return
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        self._conn.execute(
+            f"UPDATE memes SET {assignments} WHERE path = ?", (*fields.values(), str(path))
+        )
+
+    def set_phash(self, path, phash):
+        """Сохраняет перцептивный хеш изображения"""
+        with self._lock, self._conn:
+            self._set_phash(path, phash)
+
+    def _set_phash(self, path, phash):
+        self._conn.execute(
+            "UPDATE memes SET phash = ?, phash0 = ?, phash1 = ?, phash2 = ?, phash3 = ? WHERE path = ?",
+            (_to_signed(phash), *_split_phash(phash), str(path))
+        )
+
+    def paths_without_phash(self):
+        """Возвращает пути изображений, для которых еще не посчитан перцептивный хеш"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM memes WHERE phash IS NULL").fetchall()
+        return [row[0] for row in rows]
+
+    def paths_without_size(self):
+        """Возвращает пути изображений без сведений о размерах (добавленных до появления метаданных)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM memes WHERE width IS NULL").fetchall()
+        return [row[0] for row in rows]
+
+    def find_by_hash(self, img_hash):
+        """
+        Ищет сохраненное изображение по хешу
+
+        Returns:
+            Path: путь к изображению или None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM memes WHERE hash = ? LIMIT 1", (img_hash,)
+            ).fetchone()
+        return Path(row[0]) if row else None
+
+    def find_similar(self, phash, max_distance):
+        """
+        Ищет изображения, перцептивный хеш которых отличается не более чем на max_distance бит
+
+        Args:
+            phash: 64-битный перцептивный хеш
+            max_distance: максимальное расстояние Хэмминга
+
+        Returns:
+            list: кортежи (путь, расстояние), отсортированные по расстоянию
+        """
+        chunk_radius = max_distance // PHASH_CHUNKS
+        if chunk_radius > MAX_CHUNK_RADIUS:
+            logger.warning(
+                f"Порог расстояния {max_distance} слишком велик для индекса, "
+                f"используется {(MAX_CHUNK_RADIUS + 1) * PHASH_CHUNKS - 1}"
+            )
+            chunk_radius = MAX_CHUNK_RADIUS
+            max_distance = (MAX_CHUNK_RADIUS + 1) * PHASH_CHUNKS - 1
+
+        candidates = {}
+        with self._lock:
+            for i, chunk in enumerate(_split_phash(phash)):
+                values = _chunk_neighbours(chunk, chunk_radius)
+                placeholders = ",".join("?" * len(values))
+                rows = self._conn.execute(
+                    f"SELECT path, phash FROM memes WHERE phash{i} IN ({placeholders})", values
+                ).fetchall()
+                candidates.update(rows)
+
+        matches = []
+        for path, candidate in candidates.items():
+            distance = hamming_distance(phash, _to_unsigned(candidate))
+            if distance <= max_distance:
+                matches.append((Path(path), distance))
+
+        return sorted(matches, key=lambda match: match[1])
+
+    def count_phashes(self):
+        """Возвращает количество изображений с посчитанным перцептивным хешем"""
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM memes WHERE phash IS NOT NULL").fetchone()
+        return row[0]
+
+    def iter_phashes(self, batch_size=10000):
+        """
+        Перебирает перцептивные хеши всех изображений порциями, не загружая каталог целиком
+
+        Yields:
+            list: кортежи (id записи, 64-битный хеш)
+        """
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, phash FROM memes WHERE rowid > ? AND phash IS NOT NULL "
+                    "ORDER BY rowid LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [(row_id, _to_unsigned(phash)) for row_id, phash in rows]
+            last_id = rows[-1][0]
+
+    def paths_by_ids(self, ids):
+        """Возвращает словарь {id записи: путь} для указанных записей"""
+        ids = list(ids)
+        paths = {}
+        with self._lock:
+            # Ограничение SQLite на число параметров запроса
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT rowid, path FROM memes WHERE rowid IN ({placeholders})", chunk
+                ).fetchall()
+                paths.update(rows)
+        return paths
+
+    def set_category(self, paths, category):
+        """
+        Меняет категорию изображений (файлы при этом не перемещаются)
+
+        Returns:
+            int: количество обновленных записей
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "UPDATE memes SET category = ? WHERE path = ?",
+                [(category, str(path)) for path in paths]
+            )
+        return cursor.rowcount
+
+    def move(self, old_path, new_path, category):
+        """Обновляет путь и категорию изображения после перемещения файла"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE memes SET path = ?, category = ? WHERE path = ?",
+                (str(new_path), category, str(old_path))
+            )
+
+    def rename_many(self, renamed):
+        """
+        Обновляет пути нескольких изображений одной транзакцией (категория не меняется)
+
+        Args:
+            renamed: пары (старый путь, новый путь)
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE memes SET path = ? WHERE path = ?",
+                [(str(new_path), str(old_path)) for old_path, new_path in renamed]
+            )
+
+    def remove(self, path):
+        """Удаляет запись об изображении"""
+        self.remove_many([path])
+
+    def remove_many(self, paths):
+        """Удаляет записи о нескольких изображениях одной транзакцией"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM memes WHERE path = ?", [(str(path),) for path in paths]
+            )
+
+    def remove_category(self, category=None):
+        """
+        Удаляет все записи категории (или всего каталога, если категория не указана)
+
+        Returns:
+            int: количество удаленных записей
+        """
+        with self._lock, self._conn:
+            if category:
+                cursor = self._conn.execute("DELETE FROM memes WHERE category = ?", (category,))
+            else:
+                cursor = self._conn.execute("DELETE FROM memes")
+        return cursor.rowcount
+
+    def detach(self, category=None):
+        """
+        Убирает из каталога все записи категории (или всего каталога) одной транзакцией
+        и ставит их файлы в очередь на удаление - логическая очистка без обращения к диску
+
+        Returns:
+            int: количество убранных записей
+        """
+        where, params = ("WHERE category = ?", (category,)) if category else ("", ())
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT OR IGNORE INTO purge_queue (path) SELECT path FROM memes {where}", params)
+            cursor = self._conn.execute(f"DELETE FROM memes {where}", params)
+        return cursor.rowcount
+
+    def purge_batch(self, limit=500):
+        """Возвращает очередную порцию путей из очереди на удаление (кроме путей живых мемов)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM purge_queue WHERE path NOT IN (SELECT path FROM memes) LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def live_paths(self, paths):
+        """Возвращает те из путей, которые есть в каталоге"""
+        paths = [str(path) for path in paths]
+        live = set()
+        with self._lock:
+            # Ограничение SQLite на число параметров запроса
+            for i in range(0, len(paths), 500):
+                chunk = paths[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT path FROM memes WHERE path IN ({placeholders})", chunk
+                ).fetchall()
+                live.update(row[0] for row in rows)
+        return live
+
+    def purge_done(self, paths):
+        """Убирает пути из очереди на удаление"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM purge_queue WHERE path = ?", [(str(path),) for path in paths]
+            )
+
+    def purge_pending(self):
+        """Возвращает количество файлов в очереди на удаление"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM purge_queue").fetchone()[0]
+
+    def purge_paths(self):
+        """Возвращает все пути из очереди на удаление"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM purge_queue").fetchall()
+        return [row[0] for row in rows]
+
+    def get_telegram_file(self, path, variant):
+        """
+        Возвращает ссылку на загруженное в Telegram фото изображения
+
+        Returns:
+            tuple: (photo_id, access_hash, file_reference) или None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT photo_id, access_hash, file_reference FROM telegram_files WHERE path = ? AND variant = ?",
+                (str(path), variant)
+            ).fetchone()
+        return (row[0], row[1], bytes(row[2])) if row else None
+
+    def set_telegram_file(self, path, variant, photo_id, access_hash, file_reference):
+        """Запоминает ссылку на загруженное в Telegram фото изображения"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO telegram_files (path, variant, photo_id, access_hash, file_reference) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (str(path), variant, photo_id, access_hash, file_reference)
+            )
+
+    def forget_telegram_files(self, paths):
+        """Удаляет ссылки на загруженные в Telegram фото изображений"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM telegram_files WHERE path = ?", [(str(path),) for path in paths]
+            )
+
+    def count(self, category=None):
+        """Возвращает количество изображений в категории (или во всем каталоге)"""
+        with self._lock:
+            if category:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) FROM memes WHERE category = ?", (category,)
+                ).fetchone()
+            else:
+                row = self._conn.execute("SELECT COUNT(*) FROM memes").fetchone()
+        return row[0]
+
+    def list_paths(self, category=None):
+        """
+        Возвращает пути изображений категории (или всего каталога) в порядке добавления
+
+        Returns:
+            list: объекты Path
+        """
+        with self._lock:
+            if category:
+                rows = self._conn.execute(
+                    "SELECT path FROM memes WHERE category = ? ORDER BY ingested_at, rowid", (category,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT path FROM memes ORDER BY ingested_at, rowid"
+                ).fetchall()
+        return [Path(row[0]) for row in rows]
+
+    def last_change_id(self):
+        """Возвращает id последней записи журнала изменений (0 - журнал пуст)"""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(id) FROM changes").fetchone()
+        return row[0] or 0
+
+    def first_change_id(self):
+        """Возвращает id самой старой записи журнала изменений (0 - журнал пуст)"""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(id) FROM changes").fetchone()
+        return row[0] or 0
+
+    def count_changes(self, after_id):
+        """Возвращает количество записей журнала изменений после after_id"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM changes WHERE id > ?", (after_id,)).fetchone()[0]
+
+    def changes_since(self, after_id, limit=1000):
+        """
+        Возвращает изменения коллекции после записи журнала after_id
+
+        Returns:
+            list: кортежи (id записи журнала, 'add' или 'remove', путь) в порядке изменений
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, op, path FROM changes WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+            ).fetchall()
+
+    def trim_changes(self, up_to_id):
+        """Удаляет из журнала уже обработанные изменения"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM changes WHERE id <= ?", (up_to_id,))
+
+    def browse(self, category, key=None, backward=False, inclusive=False, limit=50):
+        """
+        Порция изображений категории в порядке добавления (keyset pagination)
+
+        Порядок - по ключу (время добавления или 0, id записи), как в list_paths.
+        Следующая порция запрашивается по ключу последней записи предыдущей,
+        поэтому запрос - поиск по индексу idx_memes_browse, без OFFSET.
+
+        Args:
+            category: категория
+            key: ключ (время добавления, id записи), от которого читать; None - с начала (с конца)
+            backward: читать в обратном порядке, от key к началу
+            inclusive: включить запись с ключом key
+            limit: размер порции
+
+        Returns:
+            list: кортежи (время добавления, id записи, путь) в порядке чтения
+        """
+        sort_value = "COALESCE(ingested_at, 0)"
+        compare = ">" if not backward else "<"
+        order = "ASC" if not backward else "DESC"
+        where, params = "category = ?", [category]
+        if key is not None:
+            where += (
+                f" AND {sort_value} {compare}= ?"
+                f" AND ({sort_value} {compare} ? OR rowid {compare}{'=' if inclusive else ''} ?)"
+            )
+            params += [key[0], key[0], key[1]]
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT {sort_value}, rowid, path FROM memes WHERE {where} "
+                f"ORDER BY {sort_value} {order}, rowid {order} LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+
+    def browse_position(self, category, key):
+        """Номер изображения с ключом key в категории (количество изображений перед ним)"""
+        sort_value = "COALESCE(ingested_at, 0)"
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM memes WHERE category = ? AND {sort_value} <= ? "
+                f"AND ({sort_value} < ? OR rowid < ?)",
+                (category, key[0], key[0], key[1])
+            ).fetchone()[0]
+
+    def get(self, path):
+        """
+        Возвращает запись об изображении
+
+        Returns:
+            dict: hash, category и поля метаданных или None
+        """
+        columns = ('hash', 'category') + METADATA_COLUMNS
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM memes WHERE path = ?", (str(path),)
+            ).fetchone()
+        return dict(zip(columns, row)) if row else None
+
+    def mark_viewed(self, path, timestamp=None):
+        """Запоминает время просмотра изображения"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE memes SET last_viewed = ? WHERE path = ?",
+                (timestamp or time.time(), str(path))
+            )
+
+    def mark_published(self, path, timestamp=None):
+        """Запоминает время публикации изображения в канал"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE memes SET published_at = ? WHERE path = ?",
+                (timestamp or time.time(), str(path))
+            )
+
+    def usage(self, category):
+        """
+        Возвращает занятое категорией место
+
+        Returns:
+            tuple: (количество изображений, суммарный размер файлов в байтах)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM memes WHERE category = ?", (category,)
+            ).fetchone()
+        return row[0], row[1]
+
+    def eviction_candidates(self, category, policy, limit=500, offset=0):
+        """
+        Возвращает изображения категории в порядке вытеснения
+
+        Args:
+            category: категория
+            policy: ключ EVICTION_ORDER ('oldest', 'lru', 'published')
+            limit, offset: порция списка
+
+        Returns:
+            list: кортежи (путь, размер файла в байтах)
+        """
+        order = EVICTION_ORDER[policy]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT path, COALESCE(bytes, 0) FROM memes WHERE category = ? "
+                f"ORDER BY {order} LIMIT ? OFFSET ?",
+                (category, limit, offset)
+            ).fetchall()
+        return rows
+
+    def all_paths(self):
+        """Возвращает пути всех изображений каталога"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM memes").fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        """Закрывает соединение с базой"""
+        with self._lock:
+            self._conn.close()
+
+
+# Создаем синглтон-экземпляр каталога
+catalog = MemeCatalog(CATALOG_PATH)
@@ -6,12 +6,33 @@ import tempfile
 import cv2
 import numpy as np
 import re
+import time
 import string
-from utils import logger
+from utils import as_image_buffer
+from logging_setup import get_logger
+from metrics import ocr_calls, ocr_seconds, classify_seconds
+from profiling import profiled
 import torch
 import platform
 import sys
 
+logger = get_logger("classifier")
+
+# Типичные области подписи мема: (название, начало, конец) в долях высоты.
+# Верхняя и нижняя полосы соответствуют классическому формату из bot.create_meme
+CAPTION_REGIONS = (
+    ("верх", 0.0, 0.25),
+    ("низ", 0.75, 1.0),
+)
+
+# Изображения с соотношением сторон не меньше этого (длинные скриншоты переписок)
+# распознаются по фрагментам вместо уменьшения целиком до 1200px
+TILE_ASPECT_RATIO = 2.0
+# Максимальная длина короткой стороны фрагмента
+TILE_SIZE = 1200
+# Доля перекрытия соседних фрагментов, чтобы не разрезать строки текста
+TILE_OVERLAP = 0.15
+
 class MemeClassifier:
     def __init__(self):
         """Инициализирует классификатор с моделью для распознавания текста"""
@@ -108,33 +129,75 @@ class MemeClassifier:
         
         logger.info("   Дополнительная информация: https://pytorch.org/get-started/locally/")
         
-    def has_text(self, image_path, min_confidence=0.45, min_text_length=3, min_significant_texts=1):
+    def has_text(self, image, min_confidence=0.45, min_text_length=3, min_significant_texts=1,
+                 regions_first=True):
         """
-        Определяет, содержит ли изображение текст
-        
+        Определяет, содержит ли изображение текст (параметры - как у detect_text)
+
+        Returns:
+            bool: True если найден текст, иначе False
+        """
+        has_text, _ = self.detect_text(
+            image, min_confidence, min_text_length, min_significant_texts, regions_first
+        )
+        return has_text
+
+    @profiled("classifier")
+    @classify_seconds.timed
+    def detect_text(self, image, min_confidence=0.45, min_text_length=3, min_significant_texts=1,
+                    regions_first=True):
+        """
+        Определяет, содержит ли изображение текст, и возвращает найденный текст
+
         Args:
-            image_path: путь к изображению
+            image: путь к изображению или ImageBuffer (тогда изображение не декодируется повторно)
             min_confidence: минимальная уверенность для детекции текста (0-1)
             min_text_length: минимальная длина текста для учета
             min_significant_texts: минимальное количество значимых текстов, необходимых для положительной классификации
-            
+            regions_first: сначала проверять полосы подписей (верх/низ), и только если
+                там ничего не найдено - весь кадр во всех вариантах обработки
+
         Returns:
-            bool: True если найден текст, иначе False
+            tuple: (True если найден текст, список распознанных значимых текстов)
         """
         if not self.reader:
             logger.error("OCR модель не инициализирована")
-            return False
-        
+            return False, []
+
         try:
+            image = as_image_buffer(image)
+            image_path = image.path
+
+            # Классические мемы держат подпись в верхней или нижней полосе,
+            # поэтому сначала распознаем только их в исходном разрешении
+            if regions_first:
+                region_texts = list(set(self._detect_caption_regions(
+                    image, min_confidence, min_text_length
+                )))
+                if len(region_texts) >= min_significant_texts and self._evaluate_text_quality(region_texts):
+                    logger.info(f"Изображение {image_path}: содержит текст в полосах подписи (найдено {len(region_texts)} текстов)")
+                    logger.debug(f"Найденный текст: {', '.join(region_texts[:5])}")
+                    return True, region_texts
+
+            # Длинные скриншоты не уменьшаем целиком (текст становится нечитаемым),
+            # а распознаем по перекрывающимся фрагментам до первого уверенного результата
+            if self._needs_tiling(image):
+                tile_texts = self._detect_tiled(
+                    image, min_confidence, min_text_length, min_significant_texts
+                )
+                if len(tile_texts) >= min_significant_texts and self._evaluate_text_quality(tile_texts):
+                    logger.info(f"Изображение {image_path}: содержит текст во фрагментах (найдено {len(tile_texts)} текстов)")
+                    logger.debug(f"Найденный текст: {', '.join(tile_texts[:5])}")
+                    return True, tile_texts
+
             # Создаем несколько вариантов обработанного изображения
-            processed_images = self._preprocess_image_multiple(image_path)
+            processed_images = self._preprocess_image_multiple(image)
             
             # Результаты по всем вариантам обработки
-            all_results = []
             valid_texts_total = []
             
-            # Пути к обработанным изображениям
-            image_paths = [img_path for img_path, _ in processed_images]
+            # Обработанные изображения (массивы numpy)
+            image_paths = [img for img, _ in processed_images]
             method_names = [method_name for _, method_name in processed_images]
             
             # Пакетная обработка изображений, если доступно GPU
@@ -149,24 +212,14 @@ class MemeClassifier:
                     img_path = batch_paths[0]
                     method_name = batch_methods[0]
                     
-                    if not img_path:
+                    if img_path is None:
                         continue
                         
                     # Находим текст на изображении
-                    results = self.reader.readtext(img_path)
-                    
-                    # Фильтруем результаты по уверенности и длине текста
-                    valid_texts = [text for _, text, conf in results 
-                                  if conf >= min_confidence and len(text.strip()) >= min_text_length]
-                    
-                    # Дополнительная фильтрация результатов
-                    significant_texts = self._filter_meaningful_text(valid_texts, min_length=min_text_length)
-                    
-                    if significant_texts:
-                        logger.debug(f"Метод {method_name}: найден текст: {', '.join(significant_texts[:3])}")
-                        valid_texts_total.extend(significant_texts)
-                    
-                    all_results.extend(results)
+                    significant_texts = self._read_significant_texts(
+                        img_path, method_name, min_confidence, min_text_length
+                    )
+                    valid_texts_total.extend(significant_texts)
                 else:
                     # Пакетная обработка нескольких изображений
                     # Выполняем предсказания для всех изображений в пакете
@@ -176,28 +229,14 @@ class MemeClassifier:
                     # но мы можем использовать torch.no_grad() для оптимизации памяти
                     with torch.no_grad():
                         for j, img_path in enumerate(batch_paths):
-                            if not img_path:
+                            if img_path is None:
                                 continue
                             
                             method_name = batch_methods[j]
-                            results = self.reader.readtext(img_path)
-                            
-                            # Фильтруем результаты
-                            valid_texts = [text for _, text, conf in results 
-                                          if conf >= min_confidence and len(text.strip()) >= min_text_length]
-                            
-                            significant_texts = self._filter_meaningful_text(valid_texts, min_length=min_text_length)
-                            
-                            if significant_texts:
-                                logger.debug(f"Метод {method_name}: найден текст: {', '.join(significant_texts[:3])}")
-                                valid_texts_total.extend(significant_texts)
-                            
-                            all_results.extend(results)
-            
-            # Очистка: удаляем временные файлы
-            for img_path, _ in processed_images:
-                if os.path.exists(img_path):
-                    os.unlink(img_path)
+                            significant_texts = self._read_significant_texts(
+                                img_path, method_name, min_confidence, min_text_length
+                            )
+                            valid_texts_total.extend(significant_texts)
             
             # Убираем дубликаты текстов
             unique_texts = list(set(valid_texts_total))
@@ -219,12 +258,196 @@ class MemeClassifier:
                 else:
                     logger.info(f"Изображение {image_path}: без текста")
             
-            return has_text
+            return has_text, unique_texts
             
         except Exception as e:
-            logger.error(f"Ошибка при анализе изображения {image_path}: {e}")
-            return False
+            logger.error(f"Ошибка при анализе изображения {image}: {e}")
+            return False, []
     
+    def _read_significant_texts(self, image, method_name, min_confidence, min_text_length):
+        """
+        Распознает текст на одном варианте изображения и оставляет только значимый
+
+        Args:
+            image: путь к файлу или массив numpy (BGR или оттенки серого)
+            method_name: название варианта обработки (для логов)
+            min_confidence: минимальная уверенность для детекции текста (0-1)
+            min_text_length: минимальная длина текста для учета
+
+        Returns:
+            list: значимые тексты
+        """
+        ocr_calls.inc(method=method_name)
+        with ocr_seconds.time(method=method_name):
+            results = self.reader.readtext(image)
+        return self._significant_texts(results, method_name, min_confidence, min_text_length)
+
+    def _significant_texts(self, results, method_name, min_confidence, min_text_length):
+        """
+        Оставляет значимые тексты из результатов EasyOCR
+
+        Args:
+            results: результаты readtext - список (рамка, текст, уверенность)
+            method_name: название варианта обработки (для логов)
+            min_confidence: минимальная уверенность для детекции текста (0-1)
+            min_text_length: минимальная длина текста для учета
+
+        Returns:
+            list: значимые тексты
+        """
+        # Фильтруем результаты по уверенности и длине текста
+        valid_texts = [text for _, text, conf in results
+                       if conf >= min_confidence and len(text.strip()) >= min_text_length]
+
+        # Дополнительная фильтрация результатов
+        significant_texts = self._filter_meaningful_text(valid_texts, min_length=min_text_length)
+
+        if significant_texts:
+            logger.debug(f"Метод {method_name}: найден текст: {', '.join(significant_texts[:3])}")
+
+        return significant_texts
+
+    def _detect_caption_regions(self, image, min_confidence, min_text_length):
+        """
+        Распознает текст только в типичных областях подписи мема
+
+        Полосы вырезаются из изображения в исходном разрешении (без уменьшения
+        до 1200px), поэтому мелкий текст подписи остается читаемым.
+
+        Args:
+            image: ImageBuffer
+            min_confidence: минимальная уверенность для детекции текста (0-1)
+            min_text_length: минимальная длина текста для учета
+
+        Returns:
+            list: значимые тексты, найденные в полосах подписи
+        """
+        texts = []
+
+        try:
+            pixels = image.bgr()
+        except Exception as e:
+            logger.error(f"Ошибка при чтении полос подписи {image}: {e}")
+            return texts
+
+        height = pixels.shape[0]
+
+        for region_name, start, end in CAPTION_REGIONS:
+            band = pixels[int(height * start):int(height * end)]
+            if band.size == 0:
+                continue
+
+            region_texts = self._read_significant_texts(
+                band, f"полоса ({region_name})", min_confidence, min_text_length
+            )
+            texts.extend(region_texts)
+
+        return texts
+
+    def _needs_tiling(self, image):
+        """
+        Проверяет, нужно ли распознавать изображение по фрагментам
+
+        Args:
+            image: ImageBuffer (размер известен из заголовка, без декодирования)
+
+        Returns:
+            bool: True для длинных изображений, которые нельзя уменьшить без потери текста
+        """
+        long_side, short_side = max(image.size), min(image.size)
+
+        return long_side > 1200 and short_side > 0 and long_side / short_side >= TILE_ASPECT_RATIO
+
+    def _split_into_tiles(self, image):
+        """
+        Разбивает длинное изображение на перекрывающиеся квадратные фрагменты
+
+        Короткая сторона уменьшается максимум до TILE_SIZE, вдоль длинной стороны
+        фрагменты идут с перекрытием TILE_OVERLAP, чтобы строки текста на стыках
+        целиком попадали хотя бы в один фрагмент. Последний фрагмент прижимается
+        к краю, поэтому все фрагменты одного размера (это нужно для пакетного OCR).
+
+        Args:
+            image: массив numpy (BGR)
+
+        Returns:
+            list: фрагменты изображения одинакового размера
+        """
+        height, width = image.shape[:2]
+        short_side = min(height, width)
+
+        if short_side > TILE_SIZE:
+            ratio = TILE_SIZE / short_side
+            image = cv2.resize(image, (int(width * ratio), int(height * ratio)), interpolation=cv2.INTER_AREA)
+            height, width = image.shape[:2]
+            short_side = min(height, width)
+
+        vertical = height >= width
+        long_side = height if vertical else width
+        step = max(1, int(short_side * (1 - TILE_OVERLAP)))
+
+        starts = list(range(0, max(1, long_side - short_side + 1), step))
+        if starts[-1] + short_side < long_side:
+            starts.append(long_side - short_side)
+
+        if vertical:
+            return [image[start:start + short_side] for start in starts]
+        return [image[:, start:start + short_side] for start in starts]
+
+    def _detect_tiled(self, image, min_confidence, min_text_length, min_significant_texts):
+        """
+        Распознает текст на длинном изображении по фрагментам
+
+        Фрагменты обрабатываются пакетами (на GPU - через readtext_batched),
+        распознавание останавливается, как только найденного текста достаточно
+        для положительной классификации.
+
+        Args:
+            image: ImageBuffer
+            min_confidence: минимальная уверенность для детекции текста (0-1)
+            min_text_length: минимальная длина текста для учета
+            min_significant_texts: минимальное количество значимых текстов
+
+        Returns:
+            list: уникальные значимые тексты, найденные во фрагментах
+        """
+        try:
+            tiles = self._split_into_tiles(image.bgr())
+        except Exception as e:
+            logger.error(f"Ошибка при разбиении изображения {image} на фрагменты: {e}")
+            return []
+
+        logger.debug(f"Изображение {image} разбито на {len(tiles)} фрагментов")
+
+        found_texts = set()
+        batch_size = 4 if self.use_gpu else 1
+
+        for i in range(0, len(tiles), batch_size):
+            batch = tiles[i:i + batch_size]
+
+            batch_start = time.perf_counter()
+            with torch.no_grad():
+                if len(batch) > 1:
+                    batch_results = self.reader.readtext_batched(batch)
+                else:
+                    batch_results = [self.reader.readtext(batch[0])]
+            # Время пакета делится поровну между фрагментами
+            ocr_calls.inc(len(batch), method="фрагмент")
+            for _ in batch:
+                ocr_seconds.observe((time.perf_counter() - batch_start) / len(batch), method="фрагмент")
+
+            for j, results in enumerate(batch_results):
+                found_texts.update(self._significant_texts(
+                    results, f"фрагмент {i + j + 1}/{len(tiles)}", min_confidence, min_text_length
+                ))
+
+            texts = list(found_texts)
+            if len(texts) >= min_significant_texts and self._evaluate_text_quality(texts):
+                logger.debug(f"Текст найден после {min(i + batch_size, len(tiles))} из {len(tiles)} фрагментов")
+                return texts
+
+        return list(found_texts)
+
     def _evaluate_text_quality(self, texts):
         """
         Оценивает качество найденных текстов
@@ -286,196 +509,172 @@ class MemeClassifier:
         
         return meaningful_texts
     
-    def _preprocess_image_multiple(self, image_path):
+    def _preprocess_image_multiple(self, image):
         """
         Создает несколько вариантов обработки изображения для улучшения распознавания текста
         
+        Варианты строятся в памяти из уже декодированного ImageBuffer и передаются
+        в EasyOCR массивами numpy - без временных файлов и повторного декодирования.
+        
         Args:
-            image_path: путь к изображению
+            image: ImageBuffer
             
         Returns:
-            list: список кортежей (путь_к_файлу, название_метода)
+            list: список кортежей (массив_numpy, название_метода)
         """
         processed_images = []
         
         try:
-            # Открываем изображение
-            with Image.open(image_path) as img:
-                # Если изображение слишком большое, уменьшаем для ускорения
-                if max(img.size) > 1200:
-                    ratio = 1200 / max(img.size)
-                    new_size = (int(img.size[0] * ratio), int(img.size[1] * ratio))
-                    img = img.resize(new_size, Image.LANCZOS)
-                
-                # Сохраняем во временный файл
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
-                    temp_path = tmp.name
-                
-                img.save(temp_path, 'JPEG')
-                
-                # Читаем оригинальное изображение для OpenCV
-                image = cv2.imread(temp_path)
-                if image is None:
-                    logger.error(f"OpenCV не смог прочитать изображение: {temp_path}")
-                    return [(temp_path, "оригинал")]
-                
-                # Проверяем, можем ли использовать CUDA для OpenCV
-                try:
-                    use_cv_gpu = self.use_gpu and cv2.cuda.getCudaEnabledDeviceCount() > 0
-                except (AttributeError, cv2.error):
-                    # Если cv2.cuda недоступен или возникла ошибка при проверке
-                    use_cv_gpu = False
-                    logger.debug("OpenCV CUDA модули недоступны")
-                
-                # 1. Оригинальное изображение
-                processed_images.append((temp_path, "оригинал"))
-                
-                # 2. Изображение в оттенках серого
-                try:
-                    if use_cv_gpu:
-                        # GPU версия
-                        gpu_img = cv2.cuda_GpuMat()
-                        gpu_img.upload(image)
-                        gpu_gray = cv2.cuda.cvtColor(gpu_img, cv2.COLOR_BGR2GRAY)
-                        gray = gpu_gray.download()
-                    else:
-                        # CPU версия
-                        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                except Exception as e:
-                    # В случае ошибки откатываемся к CPU версии
-                    logger.debug(f"Ошибка GPU обработки (cvtColor): {e}")
-                    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                
-                gray_path = f"{temp_path}_gray.jpg"
-                cv2.imwrite(gray_path, gray)
-                processed_images.append((gray_path, "оттенки серого"))
-                
-                # 3. Применяем адаптивное пороговое значение (бинаризация)
-                # CUDA не имеет прямого эквивалента для adaptiveThreshold, используем CPU
-                thresh = cv2.adaptiveThreshold(
-                    gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                    cv2.THRESH_BINARY, 11, 2
-                )
-                thresh_path = f"{temp_path}_thresh.jpg"
-                cv2.imwrite(thresh_path, thresh)
-                processed_images.append((thresh_path, "бинаризация"))
-                
-                # 4. Улучшаем контраст с помощью CLAHE
-                try:
-                    if use_cv_gpu:
-                        # Проверяем наличие CUDA CLAHE модуля в OpenCV
-                        if hasattr(cv2.cuda, 'createCLAHE'):
-                            gpu_clahe = cv2.cuda.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-                            gpu_gray = cv2.cuda_GpuMat()
-                            gpu_gray.upload(gray)
-                            gpu_clahe_img = gpu_clahe.apply(gpu_gray)
-                            clahe_img = gpu_clahe_img.download()
-                        else:
-                            # Если модуль недоступен, используем CPU
-                            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-                            clahe_img = clahe.apply(gray)
+            original = image.bgr()
+            
+            # Если изображение слишком большое, уменьшаем для ускорения
+            height, width = original.shape[:2]
+            if max(width, height) > 1200:
+                ratio = 1200 / max(width, height)
+                new_size = (int(width * ratio), int(height * ratio))
+                original = cv2.resize(original, new_size, interpolation=cv2.INTER_AREA)
+            
+            # Проверяем, можем ли использовать CUDA для OpenCV
+            try:
+                use_cv_gpu = self.use_gpu and cv2.cuda.getCudaEnabledDeviceCount() > 0
+            except (AttributeError, cv2.error):
+                # Если cv2.cuda недоступен или возникла ошибка при проверке
+                use_cv_gpu = False
+                logger.debug("OpenCV CUDA модули недоступны")
+            
+            # 1. Оригинальное изображение
+            processed_images.append((original, "оригинал"))
+            
+            # 2. Изображение в оттенках серого
+            try:
+                if use_cv_gpu:
+                    # GPU версия
+                    gpu_img = cv2.cuda_GpuMat()
+                    gpu_img.upload(original)
+                    gpu_gray = cv2.cuda.cvtColor(gpu_img, cv2.COLOR_BGR2GRAY)
+                    gray = gpu_gray.download()
+                else:
+                    # CPU версия
+                    gray = cv2.cvtColor(original, cv2.COLOR_BGR2GRAY)
+            except Exception as e:
+                # В случае ошибки откатываемся к CPU версии
+                logger.debug(f"Ошибка GPU обработки (cvtColor): {e}")
+                gray = cv2.cvtColor(original, cv2.COLOR_BGR2GRAY)
+            
+            processed_images.append((gray, "оттенки серого"))
+            
+            # 3. Применяем адаптивное пороговое значение (бинаризация)
+            # CUDA не имеет прямого эквивалента для adaptiveThreshold, используем CPU
+            thresh = cv2.adaptiveThreshold(
+                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                cv2.THRESH_BINARY, 11, 2
+            )
+            processed_images.append((thresh, "бинаризация"))
+            
+            # 4. Улучшаем контраст с помощью CLAHE
+            try:
+                if use_cv_gpu:
+                    # Проверяем наличие CUDA CLAHE модуля в OpenCV
+                    if hasattr(cv2.cuda, 'createCLAHE'):
+                        gpu_clahe = cv2.cuda.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+                        gpu_gray = cv2.cuda_GpuMat()
+                        gpu_gray.upload(gray)
+                        gpu_clahe_img = gpu_clahe.apply(gpu_gray)
+                        clahe_img = gpu_clahe_img.download()
                     else:
+                        # Если модуль недоступен, используем CPU
                         clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
                         clahe_img = clahe.apply(gray)
-                except Exception as e:
-                    # В случае ошибки откатываемся к CPU версии
-                    logger.debug(f"Ошибка GPU обработки (CLAHE): {e}")
+                else:
                     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
                     clahe_img = clahe.apply(gray)
-                
-                clahe_path = f"{temp_path}_clahe.jpg"
-                cv2.imwrite(clahe_path, clahe_img)
-                processed_images.append((clahe_path, "CLAHE"))
-                
-                # Обрабатываем остальные методы с проверкой доступности GPU функций
-                # и безопасным откатом к CPU версии при необходимости
-                
-                # 5. Применяем Canny Edge Detection для выделения границ
-                edges = None
-                try:
-                    if use_cv_gpu and hasattr(cv2.cuda, 'createCannyEdgeDetector'):
-                        gpu_gray = cv2.cuda_GpuMat()
-                        gpu_gray.upload(gray)
-                        gpu_edges = cv2.cuda.createCannyEdgeDetector(100, 200).detect(gpu_gray)
-                        edges = gpu_edges.download()
-                    else:
-                        edges = cv2.Canny(gray, 100, 200)
-                except Exception as e:
-                    logger.debug(f"Ошибка GPU обработки (Canny): {e}")
+            except Exception as e:
+                # В случае ошибки откатываемся к CPU версии
+                logger.debug(f"Ошибка GPU обработки (CLAHE): {e}")
+                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+                clahe_img = clahe.apply(gray)
+            
+            processed_images.append((clahe_img, "CLAHE"))
+            
+            # Обрабатываем остальные методы с проверкой доступности GPU функций
+            # и безопасным откатом к CPU версии при необходимости
+            
+            # 5. Применяем Canny Edge Detection для выделения границ
+            edges = None
+            try:
+                if use_cv_gpu and hasattr(cv2.cuda, 'createCannyEdgeDetector'):
+                    gpu_gray = cv2.cuda_GpuMat()
+                    gpu_gray.upload(gray)
+                    gpu_edges = cv2.cuda.createCannyEdgeDetector(100, 200).detect(gpu_gray)
+                    edges = gpu_edges.download()
+                else:
                     edges = cv2.Canny(gray, 100, 200)
-                
-                edges_path = f"{temp_path}_edges.jpg"
-                cv2.imwrite(edges_path, edges)
-                processed_images.append((edges_path, "границы"))
-                
-                # 6. Используем морфологические операции для улучшения текста
-                kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
-                dilated = None
-                try:
-                    if use_cv_gpu and hasattr(cv2.cuda, 'dilate'):
-                        gpu_thresh = cv2.cuda_GpuMat()
-                        gpu_thresh.upload(thresh)
-                        gpu_dilated = cv2.cuda.dilate(gpu_thresh, kernel)
-                        dilated = gpu_dilated.download()
-                    else:
-                        dilated = cv2.dilate(thresh, kernel, iterations=1)
-                except Exception as e:
-                    logger.debug(f"Ошибка GPU обработки (dilate): {e}")
+            except Exception as e:
+                logger.debug(f"Ошибка GPU обработки (Canny): {e}")
+                edges = cv2.Canny(gray, 100, 200)
+            
+            processed_images.append((edges, "границы"))
+            
+            # 6. Используем морфологические операции для улучшения текста
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
+            dilated = None
+            try:
+                if use_cv_gpu and hasattr(cv2.cuda, 'dilate'):
+                    gpu_thresh = cv2.cuda_GpuMat()
+                    gpu_thresh.upload(thresh)
+                    gpu_dilated = cv2.cuda.dilate(gpu_thresh, kernel)
+                    dilated = gpu_dilated.download()
+                else:
                     dilated = cv2.dilate(thresh, kernel, iterations=1)
-                
-                dilated_path = f"{temp_path}_dilated.jpg"
-                cv2.imwrite(dilated_path, dilated)
-                processed_images.append((dilated_path, "расширение"))
-                
-                # 7. Увеличиваем резкость
-                sharpen = None
-                try:
-                    if use_cv_gpu and hasattr(cv2.cuda, 'createGaussianFilter'):
-                        gpu_gray = cv2.cuda_GpuMat()
-                        gpu_gray.upload(gray)
-                        gpu_blur = cv2.cuda.createGaussianFilter(cv2.CV_8UC1, cv2.CV_8UC1, (5, 5), 3)
-                        gpu_blurred = gpu_blur.apply(gpu_gray)
-                        blur = gpu_blurred.download()
-                        # Sharpen на CPU, т.к. addWeighted не всегда доступен в CUDA
-                        sharpen = cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
-                    else:
-                        blur = cv2.GaussianBlur(gray, (5, 5), 3)
-                        sharpen = cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
-                except Exception as e:
-                    logger.debug(f"Ошибка GPU обработки (sharpen): {e}")
+            except Exception as e:
+                logger.debug(f"Ошибка GPU обработки (dilate): {e}")
+                dilated = cv2.dilate(thresh, kernel, iterations=1)
+            
+            processed_images.append((dilated, "расширение"))
+            
+            # 7. Увеличиваем резкость
+            sharpen = None
+            try:
+                if use_cv_gpu and hasattr(cv2.cuda, 'createGaussianFilter'):
+                    gpu_gray = cv2.cuda_GpuMat()
+                    gpu_gray.upload(gray)
+                    gpu_blur = cv2.cuda.createGaussianFilter(cv2.CV_8UC1, cv2.CV_8UC1, (5, 5), 3)
+                    gpu_blurred = gpu_blur.apply(gpu_gray)
+                    blur = gpu_blurred.download()
+                    # Sharpen на CPU, т.к. addWeighted не всегда доступен в CUDA
+                    sharpen = cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
+                else:
                     blur = cv2.GaussianBlur(gray, (5, 5), 3)
                     sharpen = cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
-                
-                sharpen_path = f"{temp_path}_sharpen.jpg"
-                cv2.imwrite(sharpen_path, sharpen)
-                processed_images.append((sharpen_path, "резкость"))
-                
-                # 8. Инвертированное изображение (для светлого текста на темном фоне)
-                inverted = None
-                try:
-                    if use_cv_gpu and hasattr(cv2.cuda, 'bitwise_not'):
-                        gpu_gray = cv2.cuda_GpuMat()
-                        gpu_gray.upload(gray)
-                        gpu_inverted = cv2.cuda.bitwise_not(gpu_gray)
-                        inverted = gpu_inverted.download()
-                    else:
-                        inverted = cv2.bitwise_not(gray)
-                except Exception as e:
-                    logger.debug(f"Ошибка GPU обработки (invert): {e}")
+            except Exception as e:
+                logger.debug(f"Ошибка GPU обработки (sharpen): {e}")
+                blur = cv2.GaussianBlur(gray, (5, 5), 3)
+                sharpen = cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
+            
+            processed_images.append((sharpen, "резкость"))
+            
+            # 8. Инвертированное изображение (для светлого текста на темном фоне)
+            inverted = None
+            try:
+                if use_cv_gpu and hasattr(cv2.cuda, 'bitwise_not'):
+                    gpu_gray = cv2.cuda_GpuMat()
+                    gpu_gray.upload(gray)
+                    gpu_inverted = cv2.cuda.bitwise_not(gpu_gray)
+                    inverted = gpu_inverted.download()
+                else:
                     inverted = cv2.bitwise_not(gray)
-                
-                inverted_path = f"{temp_path}_inverted.jpg"
-                cv2.imwrite(inverted_path, inverted)
-                processed_images.append((inverted_path, "инверсия"))
-                
-                return processed_images
-                
+            except Exception as e:
+                logger.debug(f"Ошибка GPU обработки (invert): {e}")
+                inverted = cv2.bitwise_not(gray)
+            
+            processed_images.append((inverted, "инверсия"))
+            
+            return processed_images
+            
         except Exception as e:
             logger.error(f"Ошибка при предобработке изображения: {e}")
-            # В случае ошибки возвращаем оригинальный файл, если есть
-            if 'temp_path' in locals() and os.path.exists(temp_path):
-                return [(temp_path, "оригинал")]
-            return []
+            # В случае ошибки возвращаем то, что успели подготовить (хотя бы оригинал)
+            return processed_images
             
     def _preprocess_image(self, image_path):
         """
@@ -0,0 +1,201 @@
+"""
+Коллекция мемов для просмотра в боте.
+
+Списки мемов не загружаются в память: просмотр идет курсором по индексу
+каталога (категория, время добавления, id записи). Курсор держит в памяти
+только окно из BROWSE_PAGE_SIZE соседних записей, а следующую или предыдущую
+порцию читает из каталога постранично (keyset pagination: "записи после
+такого-то ключа" - поиск по индексу, без OFFSET). Поэтому память бота не
+растет вместе с коллекцией, а запуск не требует чтения всего каталога.
+
+Количество мемов в категории и номер текущего мема считаются запросами к
+каталогу и кешируются до следующего изменения коллекции.
+
+Курсор помнит ключ текущего мема, а не номер в списке, поэтому не сбивается,
+когда в коллекции что-то добавляется или удаляется: после удаления текущего
+мема курсор указывает на следующий за ним.
+
+Изменения, сделанные другими процессами (парсер, run.py), приходят через
+журнал изменений каталога: триггеры записывают в таблицу changes каждое
+добавление, удаление и перенос мема, а sync_changes() по новым записям
+журнала сбрасывает закешированные окна и счетчики. Журнал хранит только
+последние записи (catalog.CHANGES_JOURNAL_LIMIT): если нужные коллекции записи
+уже удалены, она перечитывается целиком через reload(). Файлы хранятся по хешу
+содержимого, а категория есть только в каталоге, поэтому следить за
+директориями бессмысленно - источник истины каталог.
+
+Коллекция используется из цикла событий бота и не защищена блокировкой.
+"""
+
+import os
+from itertools import zip_longest
+from pathlib import Path
+from dotenv import load_dotenv
+from catalog import catalog
+from logging_setup import get_logger
+
+logger = get_logger("collection")
+
+# Загружаем переменные окружения
+load_dotenv()
+
+CATEGORIES = ('with_text', 'without_text')
+
+# Сколько записей каталога курсор читает за раз (и держит в памяти)
+BROWSE_PAGE_SIZE = int(os.getenv('BROWSE_PAGE_SIZE', 50))
+
+
+class MemeCollection:
+    def __init__(self, categories=CATEGORIES):
+        self.categories = tuple(categories)
+        # Версия коллекции меняется при каждом изменении: по ней курсоры
+        # понимают, что их окно и номер текущего мема устарели
+        self.version = 0
+        self._counts = {}
+        # Последняя примененная запись журнала изменений каталога
+        self.last_change_id = 0
+
+    def reload(self):
+        """Сбрасывает все закешированное (при запуске и после полной сверки каталога с диском)"""
+        self.last_change_id = catalog.last_change_id()
+        catalog.trim_changes(self.last_change_id)
+        self.invalidate()
+
+        for category in self.categories:
+            logger.info(f"Изображений категории {category}: {self.count(category)}")
+
+    def invalidate(self):
+        """Отмечает, что коллекция изменилась (окна курсоров и счетчики перечитаются)"""
+        self.version += 1
+        self._counts = {}
+
+    def sync_changes(self):
+        """
+        Проверяет журнал изменений каталога
+
+        Returns:
+            int: количество новых записей журнала (0 - коллекция не менялась)
+        """
+        change_id = catalog.last_change_id()
+        if change_id <= self.last_change_id:
+            return 0
+        if catalog.first_change_id() > self.last_change_id + 1:
+            # Часть новых записей уже вытеснена из журнала - перечитываем коллекцию целиком
+            # (id журнала идут подряд, поэтому количество изменений известно и так)
+            changed = change_id - self.last_change_id
+            logger.info(f"Журнал изменений каталога обрезан ({changed} изменений), коллекция перечитывается")
+            self.reload()
+            return changed
+        changed = catalog.count_changes(self.last_change_id)
+        self.last_change_id = change_id
+        catalog.trim_changes(change_id)
+        self.invalidate()
+        return changed
+
+    def count(self, category):
+        """Количество мемов в категории"""
+        if category not in self._counts:
+            self._counts[category] = catalog.count(category)
+        return self._counts[category]
+
+    def cursor(self, category):
+        """Курсор просмотра категории, стоящий на первом меме"""
+        return Cursor(self, category)
+
+
+class Cursor:
+    """Текущая позиция просмотра в категории, устойчивая к изменениям коллекции"""
+
+    def __init__(self, collection, category, page_size=BROWSE_PAGE_SIZE):
+        self.collection = collection
+        self.category = category
+        self.page_size = page_size
+        # Ключ текущего мема (None - первый мем категории)
+        self._key = None
+        # Окно соседних записей [(ключ, путь)] по возрастанию ключа
+        self._window = []
+        self._version = None
+        # Номер текущего мема (None - еще не посчитан)
+        self._index = None
+
+    def _page(self, key=None, backward=False, inclusive=False, limit=None):
+        """Порция записей после ключа (или перед ним) по возрастанию ключа"""
+        rows = catalog.browse(self.category, key, backward, inclusive, limit or self.page_size)
+        page = [((sort_value, row_id), Path(path)) for sort_value, row_id, path in rows]
+        return page[::-1] if backward else page
+
+    def _refresh(self):
+        """Читает окно, начиная с текущего мема (если он удален - со следующего)"""
+        self._version = self.collection.version
+        self._index = None
+        self._window = self._page(self._key, inclusive=True)
+        if not self._window and self._key is not None:
+            # Текущий мем был последним - переходим к первому
+            self._window = self._page()
+        self._key = self._window[0][0] if self._window else None
+
+    def _position(self):
+        """Позиция текущего мема в окне"""
+        if self._version != self.collection.version:
+            self._refresh()
+        for position, (key, _) in enumerate(self._window):
+            if key == self._key:
+                return position
+        self._refresh()
+        return 0
+
+    def current(self):
+        """Текущий мем или None, если категория пуста"""
+        position = self._position()
+        return self._window[position][1] if self._window else None
+
+    def index(self):
+        """Номер текущего мема в категории"""
+        self._position()
+        if self._index is None:
+            self._index = catalog.browse_position(self.category, self._key) if self._key else 0
+        return self._index
+
+    def total(self):
+        return self.collection.count(self.category)
+
+    def step(self, offset):
+        """Сдвигает курсор на мем вперед (1) или назад (-1), по кругу; возвращает новый текущий мем"""
+        position = self._position() + offset
+        if not self._window:
+            return None
+
+        if not 0 <= position < len(self._window):
+            # Следующая порция в нужную сторону, а за краем категории - с другого конца
+            backward = offset < 0
+            self._window = self._page(self._key, backward) or self._page(backward=backward)
+            position = len(self._window) - 1 if backward else 0
+
+        self._key = self._window[position][0]
+        if self._index is not None:
+            self._index = (self._index + offset) % max(self.total(), 1)
+        return self._window[position][1]
+
+    def neighbours(self, distance):
+        """Мемы на расстоянии до distance в обе стороны: сначала следующий, затем предыдущий и т.д."""
+        current = self.current()
+        if current is None:
+            return []
+        # Список закольцован, как и листание
+        following = self._page(self._key, limit=distance)
+        if len(following) < distance:
+            following += self._page(limit=distance - len(following))
+        preceding = self._page(self._key, backward=True, limit=distance)[::-1]
+        if len(preceding) < distance:
+            preceding += self._page(backward=True, limit=distance - len(preceding))[::-1]
+
+        neighbours = []
+        for pair in zip_longest(following, preceding):
+            for entry in pair:
+                if entry is not None and entry[1] != current and entry[1] not in neighbours:
+                    neighbours.append(entry[1])
+        return neighbours
+
+
+# Создаем синглтон-экземпляр коллекции
+collection = MemeCollection()
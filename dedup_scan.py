@@ -0,0 +1,276 @@
+"""
+Поиск кластеров почти одинаковых мемов по всей коллекции.
+
+Перцептивные хеши всех мемов выгружаются из каталога в отображаемые в память
+массивы numpy (memes/hashes/phash.npy и ids.npy). Сравнивать "все со всеми"
+слишком долго (миллион хешей - около часа), поэтому кандидаты отбираются так же,
+как в catalog.find_similar (multi-index hashing): хеши на расстоянии не больше r
+бит совпадают хотя бы в одной 16-битной части с точностью до r // 4 бит. Для
+каждой части хеши сортируются по ее значению, и XOR с подсчетом единичных бит
+считается только для пар из подходящих корзин. Для порогов, при которых части
+не помогают (12 и больше), остается перебор блоками "все со всеми". Найденные
+пары объединяются в кластеры, отчет записывается в JSON.
+
+Запуск: python dedup_scan.py --threshold 6
+"""
+
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from itertools import combinations
+from utils import MEMES_DIR
+from catalog import catalog, PHASH_CHUNKS, PHASH_CHUNK_BITS, PHASH_CHUNK_MASK, MAX_CHUNK_RADIUS
+from hashing import popcount64
+from logging_setup import get_logger
+
+logger = get_logger("dedup_scan")
+
+# Директория с отображаемыми в память массивами хешей
+HASH_MATRIX_DIR = MEMES_DIR / "hashes"
+# Отчет о найденных кластерах
+CLUSTERS_REPORT_PATH = MEMES_DIR / "duplicate_clusters.json"
+# Порог расстояния по умолчанию: отчет проверяет человек, поэтому он шире, чем
+# DUPLICATE_MAX_DISTANCE, по которому парсер отбрасывает мемы без проверки
+DEFAULT_THRESHOLD = 6
+# Размер блока сравнения: блок XOR 2048x2048 uint64 занимает 32 МБ (столько же
+# пар-кандидатов проверяется за раз при поиске по частям хеша)
+DEFAULT_BLOCK_SIZE = 2048
+
+
+def export_hash_matrix(directory=HASH_MATRIX_DIR):
+    """
+    Выгружает перцептивные хеши из каталога в отображаемые в память массивы
+
+    Хеши читаются из каталога порциями и сразу пишутся в файл,
+    вся коллекция в памяти не собирается.
+
+    Returns:
+        tuple: (хеши uint64, id записей каталога) - массивы numpy в режиме memmap
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    capacity = catalog.count_phashes()
+    hashes = np.lib.format.open_memmap(directory / "phash.npy", mode='w+', dtype=np.uint64, shape=(capacity,))
+    ids = np.lib.format.open_memmap(directory / "ids.npy", mode='w+', dtype=np.int64, shape=(capacity,))
+
+    written = 0
+    for rows in catalog.iter_phashes():
+        # Записи, добавленные после подсчета, попадут в следующую выгрузку
+        rows = rows[:capacity - written]
+        if not rows:
+            break
+        ids[written:written + len(rows)] = [row_id for row_id, _ in rows]
+        hashes[written:written + len(rows)] = [phash for _, phash in rows]
+        written += len(rows)
+
+    hashes.flush()
+    ids.flush()
+    with open(directory / "meta.json", "w", encoding="utf-8") as meta:
+        json.dump({"count": written, "exported_at": time.time()}, meta)
+
+    logger.info(f"Выгружено {written} перцептивных хешей в {directory}")
+    return load_hash_matrix(directory)
+
+
+def load_hash_matrix(directory=HASH_MATRIX_DIR):
+    """Открывает ранее выгруженные массивы хешей без чтения их в память"""
+    directory = Path(directory)
+    with open(directory / "meta.json", encoding="utf-8") as meta:
+        count = json.load(meta)["count"]
+    hashes = np.load(directory / "phash.npy", mmap_mode='r')[:count]
+    ids = np.load(directory / "ids.npy", mmap_mode='r')[:count]
+    return hashes, ids
+
+
+def find_similar_pairs(hashes, threshold, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Находит все пары хешей на расстоянии Хэмминга не больше threshold
+
+    Yields:
+        tuple: (индекс, индекс, расстояние) - индексы в массиве hashes, первый меньше второго
+    """
+    if threshold // PHASH_CHUNKS > MAX_CHUNK_RADIUS:
+        yield from _block_pairs(hashes, threshold, block_size)
+    else:
+        yield from _chunk_pairs(hashes, threshold, block_size * block_size)
+
+
+def _chunk_masks(radius):
+    """Маски XOR, меняющие в части хеша не более radius бит (включая нулевую)"""
+    return [
+        sum(1 << bit for bit in bits)
+        for distance in range(radius + 1)
+        for bits in combinations(range(PHASH_CHUNK_BITS), distance)
+    ]
+
+
+def _batches(counts, limit):
+    """Делит элементы на отрезки, в каждом из которых не больше limit кандидатов"""
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        base = ends[start - 1] if start else 0
+        end = max(int(np.searchsorted(ends, base + limit, side='right')), start + 1)
+        yield start, end
+        start = end
+
+
+def _chunk_pairs(hashes, threshold, batch_limit):
+    """
+    Поиск пар по частям хеша: для каждой части и маски XOR элементу подбираются
+    хеши, у которых эта часть равна его части XOR маска (бинарный поиск по
+    отсортированной части). Пара, найденная по нескольким частям, выдается
+    только для первой из них.
+    """
+    hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+    radius = threshold // PHASH_CHUNKS
+    masks = _chunk_masks(radius)
+    shifts = [PHASH_CHUNK_BITS * (PHASH_CHUNKS - 1 - i) for i in range(PHASH_CHUNKS)]
+    chunks = [((hashes >> np.uint64(shift)) & np.uint64(PHASH_CHUNK_MASK)).astype(np.int64) for shift in shifts]
+
+    for part, chunk in enumerate(chunks):
+        order = np.argsort(chunk, kind='stable')
+        sorted_chunk = chunk[order]
+
+        for mask in masks:
+            targets = chunk ^ mask
+            low = np.searchsorted(sorted_chunk, targets, side='left')
+            counts = np.searchsorted(sorted_chunk, targets, side='right') - low
+
+            for start, end in _batches(counts, batch_limit):
+                batch_counts = counts[start:end]
+                total = int(batch_counts.sum())
+                if not total:
+                    continue
+                # Все пары (элемент, хеш из его корзины) отрезка
+                first = np.repeat(np.arange(start, end), batch_counts)
+                offsets = np.arange(total) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+                second = order[np.repeat(low[start:end], batch_counts) + offsets]
+
+                keep = first < second
+                first, second = first[keep], second[keep]
+                distances = popcount64(hashes[first] ^ hashes[second])
+                keep = distances <= threshold
+                # Пара уже выдана по одной из предыдущих частей
+                for earlier in chunks[:part]:
+                    keep &= popcount64((earlier[first] ^ earlier[second]).astype(np.uint64)) > radius
+
+                for index in np.nonzero(keep)[0]:
+                    yield int(first[index]), int(second[index]), int(distances[index])
+
+
+def _block_pairs(hashes, threshold, block_size):
+    """
+    Перебор "все со всеми": для каждой пары блоков (i <= j) считается матрица
+    XOR и число единичных бит в ней
+    """
+    total = len(hashes)
+    for start_i in range(0, total, block_size):
+        block_i = np.asarray(hashes[start_i:start_i + block_size])
+
+        for start_j in range(start_i, total, block_size):
+            block_j = np.asarray(hashes[start_j:start_j + block_size])
+            distances = popcount64(block_i[:, np.newaxis] ^ block_j[np.newaxis, :])
+
+            rows, cols = np.nonzero(distances <= threshold)
+            for row, col in zip(rows, cols):
+                first, second = start_i + row, start_j + col
+                if first < second:
+                    yield int(first), int(second), int(distances[row, col])
+
+
+def _find_root(parents, index):
+    # Поиск корня с сокращением путей (union-find)
+    root = index
+    while parents[root] != root:
+        root = parents[root]
+    while parents[index] != root:
+        parents[index], index = root, parents[index]
+    return root
+
+
+def build_clusters(hashes, threshold, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Объединяет похожие хеши в кластеры (связные компоненты графа пар)
+
+    Returns:
+        list: кластеры - списки индексов в массиве hashes, от больших к меньшим
+    """
+    parents = {}
+    pairs = 0
+
+    for first, second, _ in find_similar_pairs(hashes, threshold, block_size):
+        pairs += 1
+        parents.setdefault(first, first)
+        parents.setdefault(second, second)
+        root_first, root_second = _find_root(parents, first), _find_root(parents, second)
+        if root_first != root_second:
+            parents[max(root_first, root_second)] = min(root_first, root_second)
+
+    clusters = {}
+    for index in parents:
+        clusters.setdefault(_find_root(parents, index), []).append(index)
+
+    logger.info(f"Найдено пар похожих мемов: {pairs}, кластеров: {len(clusters)}")
+    return sorted((sorted(members) for members in clusters.values()), key=len, reverse=True)
+
+
+def write_clusters_report(clusters, hashes, ids, threshold, output_path=CLUSTERS_REPORT_PATH):
+    """Записывает отчет о кластерах в JSON: пути мемов и расстояние до первого мема кластера"""
+    paths = catalog.paths_by_ids(int(ids[index]) for members in clusters for index in members)
+
+    report = {
+        "threshold": threshold,
+        "scanned": int(len(hashes)),
+        "clusters": [],
+    }
+    for members in clusters:
+        first_hash = int(hashes[members[0]])
+        report["clusters"].append({
+            "size": len(members),
+            "memes": [
+                {
+                    "path": paths.get(int(ids[index])),
+                    "distance": bin(first_hash ^ int(hashes[index])).count('1'),
+                }
+                for index in members
+            ],
+        })
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
+
+    logger.info(f"Отчет о кластерах сохранен: {output_path}")
+    return report
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Поиск кластеров похожих мемов во всей коллекции')
+    arg_parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                            help='Максимальное расстояние Хэмминга между хешами (из 64 бит)')
+    arg_parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                            help='Размер блока сравнения (ограничивает потребление памяти)')
+    arg_parser.add_argument('--no-export', action='store_true',
+                            help='Использовать ранее выгруженные массивы хешей без обращения к каталогу')
+    arg_parser.add_argument('--output', default=str(CLUSTERS_REPORT_PATH), help='Путь к JSON-отчету')
+    args = arg_parser.parse_args()
+
+    start = time.perf_counter()
+    hashes, ids = load_hash_matrix() if args.no_export else export_hash_matrix()
+    clusters = build_clusters(hashes, args.threshold, args.block_size)
+    write_clusters_report(clusters, hashes, ids, args.threshold, args.output)
+
+    duplicates = sum(len(members) - 1 for members in clusters)
+    print(f"Проверено мемов: {len(hashes)}")
+    print(f"Кластеров похожих мемов: {len(clusters)} (лишних копий: {duplicates})")
+    print(f"Время: {time.perf_counter() - start:.1f} с")
+    print(f"Отчет: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
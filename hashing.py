@@ -0,0 +1,269 @@
+"""
+Векторизованные хеши изображений на numpy.
+
+Перцептивные хеши считаются по уменьшенной копии изображения (для JPEG - через
+draft(), без полного декодирования) и могут вычисляться сразу для пакета изображений:
+функции принимают массив формы (N, высота, ширина) и возвращают массив uint64.
+
+legacy_hash - точный хеш, по которому названы файлы и записи каталога, поэтому
+пиксели для него готовятся так же, как в прежней реализации: полное декодирование,
+уменьшение в исходном режиме изображения и только затем перевод в оттенки серого.
+
+- average_hash (aHash) - пиксель ярче среднего
+- difference_hash (dHash) - пиксель ярче соседа справа
+- perceptual_hash (pHash) - коэффициент DCT больше медианы низких частот
+- legacy_hash - MD5 бинаризованного изображения 64x64 (имена файлов в коллекции)
+
+Сравнение со старой реализацией: python hashing.py --benchmark [файлы...]
+"""
+
+import hashlib
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+# Сторона хеша: 8x8 = 64 бита
+HASH_SIZE = 8
+# Размер изображения для pHash (DCT считается по 32x32)
+PHASH_IMAGE_SIZE = 32
+# Размер изображения для legacy_hash
+LEGACY_HASH_SIZE = 64
+
+# Размеры уменьшенных копий (ширина, высота) для каждого вида хеша
+HASH_INPUT_SIZES = {
+    'ahash': (HASH_SIZE, HASH_SIZE),
+    'dhash': (HASH_SIZE + 1, HASH_SIZE),
+    'phash': (PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE),
+    'legacy': (LEGACY_HASH_SIZE, LEGACY_HASH_SIZE),
+}
+
+
+def load_pixels(image, size):
+    """
+    Загружает изображение в оттенках серого, уменьшенное до size
+
+    Args:
+        image: путь к файлу или объект с методом reduced() (utils.ImageBuffer)
+        size: (ширина, высота)
+
+    Returns:
+        np.ndarray: массив uint8 формы (высота, ширина)
+    """
+    draft_size = max(LEGACY_HASH_SIZE, *size)
+    if hasattr(image, 'reduced'):
+        reduced = image.reduced(draft_size)
+    else:
+        with Image.open(image) as img:
+            img.draft('L', (draft_size, draft_size))
+            reduced = img.convert('L')
+    return np.asarray(reduced.resize(size, Image.LANCZOS), dtype=np.uint8)
+
+
+def load_legacy_pixels(image):
+    """
+    Загружает пиксели 64x64 для legacy_hash так же, как прежний utils.get_image_hash
+
+    draft() и перевод в оттенки серого до уменьшения меняют результат, поэтому здесь
+    изображение декодируется полностью. Для RGB-изображений из ImageBuffer используется
+    уже декодированная копия, которую переиспользуют классификация и сохранение.
+
+    Args:
+        image: путь к файлу или utils.ImageBuffer
+
+    Returns:
+        np.ndarray: массив uint8 формы (64, 64)
+    """
+    size = HASH_INPUT_SIZES['legacy']
+    if getattr(image, 'mode', None) == 'RGB':
+        return np.asarray(image.image.resize(size, Image.LANCZOS).convert('L'), dtype=np.uint8)
+    with Image.open(getattr(image, 'path', image)) as img:
+        return np.asarray(img.resize(size, Image.LANCZOS).convert('L'), dtype=np.uint8)
+
+
+def pack_bits(bits):
+    """
+    Упаковывает биты в 64-битные целые (первый бит - старший)
+
+    Args:
+        bits: булев массив формы (N, 64)
+
+    Returns:
+        np.ndarray: массив uint64 формы (N,)
+    """
+    packed = np.packbits(bits.reshape(len(bits), -1), axis=1)
+    return packed.view('>u8').ravel().astype(np.uint64)
+
+
+# Количество единичных бит для каждого значения байта (для numpy без bitwise_count)
+_POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount64(values):
+    """
+    Количество единичных бит в каждом элементе массива uint64
+
+    Используется для расстояния Хэмминга: popcount64(a ^ b)
+    """
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(*values.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def _as_batch(pixels):
+    pixels = np.asarray(pixels, dtype=np.float32)
+    return pixels[np.newaxis] if pixels.ndim == 2 else pixels
+
+
+def average_hash(pixels):
+    """aHash для пакета изображений 8x8: массив (N, 8, 8) -> uint64 (N,)"""
+    pixels = _as_batch(pixels)
+    means = pixels.mean(axis=(1, 2), keepdims=True)
+    return pack_bits(pixels > means)
+
+
+def difference_hash(pixels):
+    """dHash для пакета изображений 9x8: массив (N, 8, 9) -> uint64 (N,)"""
+    pixels = _as_batch(pixels)
+    return pack_bits(pixels[:, :, :-1] > pixels[:, :, 1:])
+
+
+def _dct_matrix(size):
+    """Матрица DCT-II (ортонормированная)"""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[np.newaxis, :] + 1) * n[:, np.newaxis] / (2 * size))
+    matrix[0] *= 1 / np.sqrt(2)
+    return (matrix * np.sqrt(2 / size)).astype(np.float32)
+
+
+_DCT = _dct_matrix(PHASH_IMAGE_SIZE)
+
+
+def perceptual_hash(pixels):
+    """pHash для пакета изображений 32x32: массив (N, 32, 32) -> uint64 (N,)"""
+    pixels = _as_batch(pixels)
+    # Двумерное DCT для всего пакета: D @ X @ D.T
+    dct = _DCT @ pixels @ _DCT.T
+    low = dct[:, :HASH_SIZE, :HASH_SIZE]
+    medians = np.median(low.reshape(len(low), -1), axis=1)[:, np.newaxis, np.newaxis]
+    return pack_bits(low > medians)
+
+
+def legacy_hash(pixels):
+    """
+    MD5 бинаризованного изображения 64x64 без построения строки в цикле Python
+
+    Для одних и тех же пикселей результат совпадает с прежней реализацией
+    utils.get_image_hash; пиксели нужно готовить через load_legacy_pixels.
+
+    Args:
+        pixels: массив (64, 64) или пакет (N, 64, 64)
+
+    Returns:
+        list: hex-строки MD5
+    """
+    pixels = _as_batch(pixels)
+    means = pixels.mean(axis=(1, 2), keepdims=True)
+    bits = np.where(pixels > means, ord('1'), ord('0')).astype(np.uint8)
+    return [hashlib.md5(row.tobytes()).hexdigest() for row in bits]
+
+
+HASH_FUNCTIONS = {
+    'ahash': average_hash,
+    'dhash': difference_hash,
+    'phash': perceptual_hash,
+    'legacy': legacy_hash,
+}
+
+
+def hash_images(images, kind='dhash'):
+    """
+    Считает хеши для пакета изображений
+
+    Args:
+        images: пути к файлам или ImageBuffer
+        kind: 'ahash', 'dhash', 'phash' или 'legacy'
+
+    Returns:
+        np.ndarray uint64 (для legacy - список hex-строк)
+    """
+    if kind == 'legacy':
+        batch = np.stack([load_legacy_pixels(image) for image in images])
+    else:
+        size = HASH_INPUT_SIZES[kind]
+        batch = np.stack([load_pixels(image, size) for image in images])
+    return HASH_FUNCTIONS[kind](batch)
+
+
+def hash_image(image, kind='dhash'):
+    """Хеш одного изображения: int для aHash/dHash/pHash, hex-строка для legacy"""
+    result = hash_images([image], kind)[0]
+    return result if kind == 'legacy' else int(result)
+
+
+def _python_legacy_hash(image_path):
+    """Прежняя реализация utils.get_image_hash (для сравнения в бенчмарке)"""
+    with Image.open(image_path) as img:
+        img = img.resize((64, 64), Image.LANCZOS).convert('L')
+        pixel_data = list(img.getdata())
+        avg_pixel = sum(pixel_data) / len(pixel_data)
+        bits = "".join(['1' if pixel > avg_pixel else '0' for pixel in pixel_data])
+        return hashlib.md5(bits.encode()).hexdigest()
+
+
+def benchmark(paths, repeat=3):
+    """Сравнивает прежнюю реализацию хеширования с векторизованной"""
+    def measure(func):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    results = {
+        'прежний get_image_hash (полное декодирование, Python)': measure(
+            lambda: [_python_legacy_hash(path) for path in paths]
+        ),
+    }
+    for kind in HASH_FUNCTIONS:
+        results[f"{kind} ({'полное декодирование' if kind == 'legacy' else 'draft'} + numpy, пакет)"] = measure(lambda: hash_images(paths, kind))
+
+    print(f"Изображений: {len(paths)}, лучшее из {repeat} повторов")
+    for name, elapsed in results.items():
+        print(f"  {name:<55} {elapsed * 1000:9.1f} мс  ({elapsed * 1000 / len(paths):.2f} мс/изобр.)")
+
+
+def _synthetic_images(directory, count=50, size=(1280, 960)):
+    """Создает тестовые JPEG для бенчмарка"""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        base = rng.integers(0, 255, size=(size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+        img = Image.fromarray(base).resize(size, Image.BILINEAR)
+        path = f"{directory}/bench_{i}.jpg"
+        img.save(path, "JPEG", quality=85)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    arg_parser = argparse.ArgumentParser(description='Хеши изображений')
+    arg_parser.add_argument('--benchmark', action='store_true', help='Сравнить скорость с прежней реализацией')
+    arg_parser.add_argument('--kind', default='dhash', choices=list(HASH_FUNCTIONS), help='Вид хеша')
+    arg_parser.add_argument('paths', nargs='*', help='Файлы изображений')
+    args = arg_parser.parse_args()
+
+    if args.benchmark:
+        if args.paths:
+            benchmark(args.paths)
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                benchmark(_synthetic_images(tmp_dir))
+    else:
+        for path, value in zip(args.paths, hash_images(args.paths, args.kind)):
+            print(f"{value if args.kind == 'legacy' else format(int(value), '016x')}  {path}")
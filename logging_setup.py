@@ -0,0 +1,141 @@
+"""
+Настройка логирования для всех компонентов.
+
+Записи не пишутся в файл и консоль прямо из вызывающего потока: обработчик
+QueueHandler только кладет запись в очередь, а запись на диск выполняет
+QueueListener в отдельном потоке. Поэтому медленный диск не тормозит цикл
+событий бота и парсера. Файл лога ротируется по размеру или по времени.
+
+Бот запускает парсер отдельным процессом, а ротировать файл может только один
+процесс: на Windows переименование открытого другим процессом файла падает
+с PermissionError, а на Linux процессы затирали бы резервные копии друг друга.
+Поэтому парсер пишет в свой файл PARSER_LOG_FILE, а лаунчер run.py, который
+запускает бота и парсер и сам остается работать, - в RUN_LOG_FILE.
+
+Каждый модуль получает свой логгер (MemeCollector.<модуль>), уровни
+можно задать отдельно для каждого через LOG_LEVELS.
+
+Модуль не зависит от остальных модулей проекта.
+"""
+
+import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Общий префикс логгеров проекта
+LOGGER_NAME = "MemeCollector"
+
+LOG_FILE = os.getenv('LOG_FILE', 'meme_collector.log')
+# Файл лога парсера (python parser.py - и из бота, и отдельно)
+PARSER_LOG_FILE = os.getenv('PARSER_LOG_FILE', 'parser.log')
+# Файл лога лаунчера run.py (бот и парсер, запущенные из него, пишут в свои файлы)
+RUN_LOG_FILE = os.getenv('RUN_LOG_FILE', 'run.log')
+# Уровень по умолчанию
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Уровни отдельных логгеров: "classifier=WARNING,catalog=DEBUG,telethon=ERROR".
+# Короткие имена модулей проекта дополняются префиксом MemeCollector.
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+# Ротация: size (по размеру файла) или time (по времени, LOG_ROTATE_WHEN)
+LOG_ROTATION = os.getenv('LOG_ROTATION', 'size')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', 'midnight')
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Модули проекта (для коротких имен в LOG_LEVELS)
+PROJECT_MODULES = (
+    'bot', 'parser', 'classifier', 'utils', 'catalog', 'hashing',
+    'collection', 'dedup_scan', 'migrate_store', 'loop_monitor', 'run',
+)
+
+_listener = None
+
+
+def _log_file():
+    """Файл лога текущего процесса: у парсера и run.py свои, чтобы каждый файл ротировал один процесс"""
+    script = os.path.splitext(os.path.basename(sys.argv[0] or ''))[0]
+    if script == 'parser':
+        return PARSER_LOG_FILE
+    if script == 'run':
+        return RUN_LOG_FILE
+    return LOG_FILE
+
+
+def _file_handler():
+    log_file = _log_file()
+    if LOG_ROTATION == 'time':
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    return logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+
+
+def _apply_module_levels(spec):
+    """Применяет уровни из строки вида "classifier=WARNING,telethon=ERROR\""""
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        name = name.strip()
+        if name in PROJECT_MODULES:
+            name = f"{LOGGER_NAME}.{name}"
+        try:
+            logging.getLogger(name).setLevel(level.strip().upper())
+        except ValueError:
+            logging.getLogger(LOGGER_NAME).warning(f"Неизвестный уровень логирования в LOG_LEVELS: {item}")
+
+
+def setup_logging():
+    """
+    Настраивает логирование через очередь (повторные вызовы ничего не делают)
+
+    Записи всех логгеров (включая сторонние библиотеки) попадают в очередь,
+    из которой поток QueueListener пишет их в файл с ротацией и в консоль.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [_file_handler(), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # При выходе дописываем оставшиеся в очереди записи
+    atexit.register(stop_logging)
+
+    _apply_module_levels(LOG_LEVELS)
+
+
+def stop_logging():
+    """Останавливает поток записи логов, дописав очередь"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(module=None):
+    """
+    Возвращает логгер модуля проекта (MemeCollector.<модуль>)
+
+    Args:
+        module: имя модуля; без него - общий логгер MemeCollector
+    """
+    setup_logging()
+    return logging.getLogger(f"{LOGGER_NAME}.{module}" if module else LOGGER_NAME)
@@ -0,0 +1,120 @@
+"""
+Контроль задержек цикла событий бота.
+
+Фоновая задача каждые LOOP_LAG_INTERVAL секунд засыпает и измеряет, насколько
+позже запланированного она проснулась - это время, на которое синхронный код
+в обработчиках (рендеринг PIL, работа с файлами, subprocess) задержал все
+остальные задачи. Задержки попадают в метрики: гистограмма
+event_loop_lag_seconds и процентили за последние LOOP_LAG_WINDOW измерений.
+
+Отдельный поток-сторож следит за тем, когда задача последний раз просыпалась.
+Если цикл событий заблокирован дольше LOOP_LAG_THRESHOLD секунд, сторож
+записывает в лог стек потока цикла событий (sys._current_frames) - то место,
+где он завис, прямо во время блокировки.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from dotenv import load_dotenv
+from logging_setup import get_logger
+from metrics import registry
+
+logger = get_logger("loop_monitor")
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Период измерения задержки (секунды)
+LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', 0.1))
+# Блокировка дольше этого порога логируется вместе со стеком (0 - не логировать)
+LOOP_LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', 0.5))
+# По скольким последним измерениям считаются процентили
+LOOP_LAG_WINDOW = int(os.getenv('LOOP_LAG_WINDOW', 600))
+
+# Процентили задержки в метриках
+LAG_QUANTILES = (0.5, 0.9, 0.99)
+
+loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "Задержка цикла событий бота",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+loop_lag_quantile = registry.gauge(
+    "event_loop_lag_quantile_seconds", "Процентили задержки цикла событий за последние измерения", ("quantile",)
+)
+loop_lag_max = registry.gauge(
+    "event_loop_lag_max_seconds", "Наибольшая задержка цикла событий за последние измерения"
+)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval=LOOP_LAG_INTERVAL, threshold=LOOP_LAG_THRESHOLD, window=LOOP_LAG_WINDOW):
+        self.interval = interval
+        self.threshold = threshold
+        self._lags = deque(maxlen=window)
+        self._last_beat = None
+        self._loop_thread_id = None
+        self._task = None
+        self._watchdog = None
+
+        for quantile in LAG_QUANTILES:
+            loop_lag_quantile.set_function(lambda quantile=quantile: self.percentile(quantile), quantile=quantile)
+        loop_lag_max.set_function(lambda: max(self._lags, default=0.0))
+
+    def percentile(self, quantile):
+        """Процентиль задержки (секунды) по последним измерениям"""
+        lags = sorted(self._lags)
+        if not lags:
+            return 0.0
+        return lags[min(len(lags) - 1, int(quantile * len(lags)))]
+
+    def start(self):
+        """Запускает измерение задержки и поток-сторож (вызывать внутри цикла событий)"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._task = asyncio.create_task(self._measure())
+
+        if self.threshold > 0:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+        logger.info(
+            f"Контроль задержек цикла событий: период {self.interval} с, порог {self.threshold or 'выключен'}"
+        )
+
+    async def _measure(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - start - self.interval)
+            self._last_beat = now
+
+            self._lags.append(lag)
+            loop_lag_seconds.observe(lag)
+            if self.threshold and lag >= self.threshold:
+                logger.warning(f"Цикл событий был заблокирован {lag:.2f} с")
+
+    def _watch(self):
+        reported_beat = None
+        while True:
+            time.sleep(self.interval)
+            beat = self._last_beat
+            stalled = time.perf_counter() - beat - self.interval
+            # О каждой блокировке сообщаем один раз, пока она идет
+            if stalled < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "стек недоступен\n"
+            logger.warning(f"Цикл событий заблокирован уже {stalled:.2f} с, стек потока цикла:\n{stack.rstrip()}")
+
+
+# Создаем синглтон-экземпляр монитора
+loop_monitor = LoopLagMonitor()
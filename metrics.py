@@ -0,0 +1,290 @@
+"""
+Метрики работы парсера и бота в формате Prometheus.
+
+Реестр метрик живет в памяти процесса: счетчики (Counter), гистограммы
+времени (Histogram) и текущие значения (Gauge). start_metrics_server()
+поднимает в фоновом потоке HTTP-сервер, который отдает все метрики текстом
+по адресу http://127.0.0.1:<порт>/metrics.
+
+Из модулей проекта использует только profiling (команда /profile).
+"""
+
+import os
+import time
+import bisect
+import threading
+import functools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from dotenv import load_dotenv
+from profiling import handler_profiler
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Порты HTTP-сервера метрик (0 - сервер не запускается)
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+PARSER_METRICS_PORT = int(os.getenv('PARSER_METRICS_PORT', 0))
+# Адрес, на котором слушает сервер метрик (по умолчанию только локально)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+
+# Границы корзин гистограмм времени (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_PREFIX = "memecollector_"
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = _PREFIX + name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.label_names}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    kind = "counter"
+
+    def __init__(self, name, description, labels=()):
+        super().__init__(f"{name}_total", description, labels)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Текущее значение (глубина очереди и т.п.)"""
+    kind = "gauge"
+
+    def __init__(self, name, description, labels=()):
+        super().__init__(name, description, labels)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        """Значение вычисляется функцией при каждом чтении метрик"""
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                values[key] = function()
+            except Exception:
+                continue
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """Распределение значений (обычно времени выполнения в секундах) по корзинам"""
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def time(self, **labels):
+        """Контекстный менеджер: измеряет время выполнения блока"""
+        return _Timer(self, labels)
+
+    def timed(self, function):
+        """Декоратор: измеряет время выполнения функции (для метрик без меток)"""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.time():
+                return function(*args, **kwargs)
+        return wrapper
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, [("le", bound)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, description, labels=()):
+        return self._register(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=()):
+        return self._register(Gauge(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# Создаем синглтон-экземпляр реестра
+registry = MetricsRegistry()
+
+# Метрики, общие для парсера и бота
+memes_processed = registry.counter("memes_processed", "Обработано изображений из каналов")
+memes_saved = registry.counter("memes_saved", "Сохранено новых мемов", ("category",))
+memes_duplicates = registry.counter("memes_duplicates", "Отброшено дубликатов")
+ocr_calls = registry.counter("ocr_calls", "Вызовы распознавания текста", ("method",))
+
+download_seconds = registry.histogram("download_seconds", "Время скачивания изображения из Telegram")
+ocr_seconds = registry.histogram("ocr_seconds", "Время распознавания текста на одном варианте обработки", ("method",))
+classify_seconds = registry.histogram("classify_seconds", "Время классификации одного изображения")
+save_seconds = registry.histogram("save_seconds", "Время сохранения изображения (хеши, дубликаты, запись)")
+handler_seconds = registry.histogram("bot_handler_seconds", "Время выполнения обработчика бота", ("handler",))
+handler_errors = registry.counter("bot_handler_errors", "Исключения в обработчиках бота", ("handler",))
+
+queue_depth = registry.gauge("queue_depth", "Глубина очередей фоновых задач", ("queue",))
+collection_size = registry.gauge("collection_size", "Количество мемов в коллекции", ("category",))
+
+
+def instrumented(handler):
+    """
+    Декоратор асинхронного обработчика бота: время выполнения и исключения
+
+    Через него же профилируются вызовы после команды /profile.
+    """
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await handler_profiler.call(name, handler, *args, **kwargs)
+        except Exception as e:
+            # StopPropagation и подобные служебные исключения Telethon - не ошибки
+            if not type(e).__name__.startswith("Stop"):
+                handler_errors.inc(handler=name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - start, handler=name)
+
+    return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Запросы Prometheus не засоряют лог
+        pass
+
+
+def start_metrics_server(port, host=METRICS_HOST):
+    """
+    Запускает HTTP-сервер метрик в фоновом потоке
+
+    Returns:
+        ThreadingHTTPServer: сервер или None, если порт не задан или занят
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError:
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
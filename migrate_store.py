@@ -0,0 +1,43 @@
+"""
+Перевод хранилища мемов в раскладку по поддиректориям (memes/store/ab/cd/abcd....jpg).
+
+Переносит файлы из прежних директорий категорий (memes/with_text, memes/without_text)
+и из плоского хранилища (memes/store/{hash}.jpg) на месте, в несколько потоков,
+и обновляет пути в каталоге. Повторный запуск безопасен.
+
+Запуск: python migrate_store.py --workers 16
+"""
+
+import time
+import argparse
+from utils import (
+    STORE_MIGRATION_WORKERS, migrate_legacy_layout, migrate_flat_store, sync_catalog
+)
+from catalog import catalog
+from logging_setup import get_logger
+
+logger = get_logger("migrate_store")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Перевод хранилища мемов в раскладку по поддиректориям')
+    arg_parser.add_argument('--workers', type=int, default=STORE_MIGRATION_WORKERS,
+                            help='Количество потоков для переноса файлов')
+    arg_parser.add_argument('--no-sync', action='store_true',
+                            help='Не сверять каталог с хранилищем после переноса')
+    args = arg_parser.parse_args()
+
+    start = time.perf_counter()
+    legacy = migrate_legacy_layout()
+    flat = migrate_flat_store(workers=args.workers)
+    if not args.no_sync:
+        sync_catalog()
+
+    logger.info(f"Миграция хранилища завершена за {time.perf_counter() - start:.1f} с")
+    print(f"Перенесено из директорий категорий: {legacy}")
+    print(f"Перенесено из плоского хранилища: {flat}")
+    print(f"Мемов в каталоге: {catalog.count()}")
+
+
+if __name__ == "__main__":
+    main()
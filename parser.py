@@ -7,10 +7,18 @@ import time
 from tqdm import tqdm
 import re
 from dotenv import load_dotenv
-from utils import logger, save_image
+from utils import save_image, ImageBuffer, sync_catalog, migrate_legacy_layout, enforce_quotas
+from catalog import catalog
 from classifier import classifier
 import argparse
 import sys
+from logging_setup import get_logger
+from metrics import (
+    memes_processed, download_seconds, start_metrics_server, PARSER_METRICS_PORT
+)
+from profiling import profiled, enable_profiling, profiling_enabled, PROFILE_DIR
+
+logger = get_logger("parser")
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -49,6 +57,7 @@ def extract_username(channel_url):
 SOURCE_CHANNELS = [extract_username(channel) for channel in SOURCE_CHANNELS]
 logger.info(f"Парсинг каналов: {', '.join(SOURCE_CHANNELS)}")
 
+@profiled("parser_run")
 async def download_memes(client, channels, limit=30, offset_days=1):
     """
     Скачивает мемы из указанных каналов
@@ -86,6 +95,7 @@ async def download_memes(client, channels, limit=30, offset_days=1):
                     continue
                 
                 total_processed += 1
+                memes_processed.inc()
                 
                 # Создаем временный файл для скачивания
                 with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
@@ -93,13 +103,23 @@ async def download_memes(client, channels, limit=30, offset_days=1):
                 
                 try:
                     # Скачиваем изображение
-                    await client.download_media(message, file=temp_path)
+                    with download_seconds.time():
+                        await client.download_media(message, file=temp_path)
+                    
+                    # Декодируем изображение один раз: буфер переиспользуется
+                    # классификатором, хешированием и сохранением
+                    image = ImageBuffer(temp_path)
                     
                     # Определяем, содержит ли мем текст
-                    has_text = classifier.has_text(temp_path)
+                    has_text, texts = classifier.detect_text(image)
                     
-                    # Сохраняем изображение в соответствующую директорию
-                    if save_image(temp_path, has_text):
+                    # Сохраняем изображение в соответствующую директорию (с метаданными для каталога)
+                    metadata = {
+                        'source_channel': channel_username,
+                        'message_id': message.id,
+                        'ocr_text': "\n".join(texts) if texts else None,
+                    }
+                    if save_image(image, has_text, metadata):
                         total_saved += 1
                         
                 except Exception as e:
@@ -168,6 +188,8 @@ async def main():
     parser.add_argument('--check-gpu', action='store_true', help='Проверить доступность GPU и выйти')
     parser.add_argument('--limit', type=int, default=30, help='Максимальное кол-во сообщений для проверки')
     parser.add_argument('--days', type=int, default=2, help='За сколько дней проверять сообщения')
+    parser.add_argument('--profile', action='store_true',
+                        help='Профилировать запуск (cProfile), профили сохраняются в PROFILE_DIR')
     
     args = parser.parse_args()
     
@@ -176,8 +198,28 @@ async def main():
         check_gpu_status()
         return
     
+    if args.profile:
+        enable_profiling()
+    if profiling_enabled():
+        logger.info(f"Профилирование включено, профили запуска сохраняются в {PROFILE_DIR}")
+    
     logger.info(f"Запуск парсера мемов из Telegram с API_ID={API_ID} и API_HASH={API_HASH[:5]}...")
     
+    # Первый запуск с каталогом: индексируем уже сохраненные мемы один раз,
+    # дальше проверка дубликатов идет только по каталогу
+    if catalog.count() == 0:
+        sync_catalog()
+    else:
+        # Мемы из прежних директорий категорий переносим в хранилище по хешу
+        migrate_legacy_layout()
+    
+    # Метрики парсера (если задан PARSER_METRICS_PORT)
+    if PARSER_METRICS_PORT:
+        if start_metrics_server(PARSER_METRICS_PORT):
+            logger.info(f"Метрики парсера: http://127.0.0.1:{PARSER_METRICS_PORT}/metrics")
+        else:
+            logger.warning(f"Не удалось запустить сервер метрик на порту {PARSER_METRICS_PORT}")
+    
     # Инициализация клиента Telegram
     client = TelegramClient('meme_parser_session', API_ID, API_HASH)
     
@@ -195,6 +237,9 @@ async def main():
         
         logger.info(f"Парсинг завершен. Сохранено {saved_count} новых мемов.")
         
+        # Новые мемы могли превысить квоты категорий
+        enforce_quotas()
+        
     except Exception as e:
         logger.error(f"Произошла ошибка: {e}")
     
@@ -0,0 +1,167 @@
+"""
+Профилирование запусков парсера и обработчиков бота.
+
+Профилирование включается по требованию и в обычной работе ничего не стоит:
+- PROFILE=1 в .env или python parser.py --profile - весь запуск парсера
+  (download_memes) и распознавание текста вне запуска профилируются cProfile;
+- команда бота /profile N - профилируются следующие N вызовов обработчиков.
+
+Для каждого профиля в PROFILE_DIR пишутся два файла: <имя>.prof (для pstats,
+snakeviz и т.п.) и <имя>.txt - функции, отсортированные по суммарному времени.
+
+cProfile в одном потоке может работать только один: вложенные вызовы
+профилируемых функций попадают в уже идущий профиль. Профиль асинхронной
+функции включает и другие задачи цикла событий, выполнявшиеся во время ее await.
+
+Модуль не зависит от остальных модулей проекта.
+"""
+
+import os
+import io
+import time
+import pstats
+import cProfile
+import asyncio
+import threading
+import functools
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Профилирование запусков парсера (можно включить и флагом --profile)
+PROFILE_ENABLED = os.getenv('PROFILE', '0').lower() in ('1', 'true', 'yes')
+# Куда складывать файлы профилей
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', 'profiles'))
+# Сколько функций выводить в текстовый отчет
+PROFILE_TOP = int(os.getenv('PROFILE_TOP', 40))
+
+_enabled = PROFILE_ENABLED
+# Поток, в котором сейчас работает cProfile
+_active = threading.local()
+
+
+def enable_profiling(enabled=True):
+    """Включает (или выключает) профилирование функций с @profiled"""
+    global _enabled
+    _enabled = enabled
+
+
+def profiling_enabled():
+    return _enabled
+
+
+def save_profile(profile, name):
+    """
+    Сохраняет профиль в PROFILE_DIR
+
+    Returns:
+        Path: путь к файлу .prof (рядом лежит текстовый отчет .txt)
+    """
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    base = PROFILE_DIR / f"{name}_{stamp}_{time.perf_counter_ns() % 1000000:06d}"
+
+    prof_path = base.with_suffix(".prof")
+    profile.dump_stats(prof_path)
+
+    report = io.StringIO()
+    stats = pstats.Stats(profile, stream=report)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(PROFILE_TOP)
+    base.with_suffix(".txt").write_text(report.getvalue(), encoding="utf-8")
+    return prof_path
+
+
+class _Capture:
+    """Профиль одного вызова (или пустышка, если cProfile в потоке уже занят)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.profile = None
+        self.path = None
+
+    def __enter__(self):
+        if not getattr(_active, "busy", False):
+            _active.busy = True
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile is not None:
+            self.profile.disable()
+            _active.busy = False
+            self.path = save_profile(self.profile, self.name)
+        return False
+
+
+def profiled(name):
+    """
+    Декоратор: профилирует вызовы функции, если профилирование включено
+
+    Работает и с обычными, и с асинхронными функциями. Вызов внутри уже
+    профилируемой функции отдельного файла не создает.
+    """
+    def decorator(function):
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await function(*args, **kwargs)
+                with _Capture(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Capture(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class HandlerProfiler:
+    """
+    Профилирование следующих N вызовов обработчиков бота (команда /profile)
+
+    Обработчики, начавшиеся, пока профилируется другой, не профилируются
+    и не уменьшают счетчик.
+    """
+
+    def __init__(self):
+        self.remaining = 0
+        self.paths = []
+        self._on_complete = None
+
+    def start(self, count, on_complete=None):
+        """
+        Args:
+            count: сколько следующих вызовов профилировать
+            on_complete: асинхронная функция, получает список файлов профилей
+        """
+        self.remaining = count
+        self.paths = []
+        self._on_complete = on_complete
+
+    async def call(self, name, handler, *args, **kwargs):
+        """Вызывает обработчик, профилируя его, если есть незахваченные вызовы"""
+        if self.remaining <= 0 or getattr(_active, "busy", False):
+            return await handler(*args, **kwargs)
+
+        self.remaining -= 1
+        capture = _Capture(f"handler_{name}")
+        try:
+            with capture:
+                return await handler(*args, **kwargs)
+        finally:
+            self.paths.append(capture.path)
+            if self.remaining == 0 and self._on_complete is not None:
+                on_complete, self._on_complete = self._on_complete, None
+                asyncio.create_task(on_complete(list(self.paths)))
+
+
+# Создаем синглтон-экземпляр профилировщика обработчиков
+handler_profiler = HandlerProfiler()
@@ -8,9 +8,10 @@ import os
 import sys
 import subprocess
 import time
-import glob
 from pathlib import Path
 from dotenv import load_dotenv
+from catalog import catalog
+from utils import purge_files
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -32,10 +33,10 @@ def check_env_file():
 def check_directories():
     """Проверка наличия директорий для хранения мемов"""
     meme_dir = Path("memes")
-    with_text_dir = meme_dir / "with_text"
-    without_text_dir = meme_dir / "without_text"
+    # Файлы хранятся по хешу содержимого, категория - в каталоге
+    store_dir = meme_dir / "store"
     
-    for directory in [meme_dir, with_text_dir, without_text_dir]:
+    for directory in [meme_dir, store_dir]:
         directory.mkdir(parents=True, exist_ok=True)
     
     print("✅ Директории для хранения мемов готовы.")
@@ -65,27 +66,26 @@ def run_bot():
         print("🛑 Бот остановлен пользователем.")
         return True
 
+def print_purge_progress(done, total):
+    """Выводит ход удаления файлов в одну строку"""
+    print(f"\r🧹 Удалено файлов: {done} из {total}", end="", flush=True)
+
 def clear_meme_category(category):
     """Очистка мемов определенной категории
     
     Args:
         category (str): 'with_text' или 'without_text'
     """
-    meme_dir = Path("memes")
     if category == 'with_text':
-        target_dir = meme_dir / "with_text"
         category_name = "с текстом"
     elif category == 'without_text':
-        target_dir = meme_dir / "without_text"
         category_name = "без текста"
     else:
         print("❌ Неизвестная категория")
         return False
     
-    # Проверяем наличие мемов
-    files = glob.glob(str(target_dir / "*.jpg")) + glob.glob(str(target_dir / "*.png"))
-    
-    total_memes = len(files)
+    # Проверяем наличие мемов (по каталогу, без обхода директорий)
+    total_memes = catalog.count(category)
     
     if total_memes == 0:
         print(f"❕ Директория мемов {category_name} уже пуста.")
@@ -102,10 +102,12 @@ def clear_meme_category(category):
     
     # Удаление файлов
     try:
-        for file in files:
-            os.remove(file)
+        # Коллекция очищается сразу (одна транзакция в каталоге), затем удаляются файлы
+        catalog.detach(category)
+        print(f"✅ Из коллекции удалено {total_memes} мемов {category_name}, удаляю файлы...")
+        purge_files(progress=print_purge_progress)
         
-        print(f"✅ Успешно удалено {total_memes} мемов {category_name}.")
+        print(f"\n✅ Успешно удалено {total_memes} мемов {category_name}.")
         return True
     
     except Exception as e:
@@ -124,15 +126,11 @@ def clear_memes():
     
     if choice == '1':
         # Очистка всех мемов
-        meme_dir = Path("memes")
-        with_text_dir = meme_dir / "with_text"
-        without_text_dir = meme_dir / "without_text"
+        # Проверяем наличие мемов (по каталогу, без обхода директорий)
+        with_text_count = catalog.count('with_text')
+        without_text_count = catalog.count('without_text')
         
-        # Проверяем наличие мемов
-        with_text_files = glob.glob(str(with_text_dir / "*.jpg")) + glob.glob(str(with_text_dir / "*.png"))
-        without_text_files = glob.glob(str(without_text_dir / "*.jpg")) + glob.glob(str(without_text_dir / "*.png"))
-        
-        total_memes = len(with_text_files) + len(without_text_files)
+        total_memes = with_text_count + without_text_count
         
         if total_memes == 0:
             print("❕ Директории мемов уже пусты.")
@@ -140,8 +138,8 @@ def clear_memes():
         
         # Запрос подтверждения
         print(f"⚠️ Найдено {total_memes} мемов для удаления:")
-        print(f"  - Мемов с текстом: {len(with_text_files)}")
-        print(f"  - Мемов без текста: {len(without_text_files)}")
+        print(f"  - Мемов с текстом: {with_text_count}")
+        print(f"  - Мемов без текста: {without_text_count}")
         
         confirmation = input("❓ Вы уверены, что хотите удалить ВСЕ мемы? (y/n): ")
         
@@ -151,15 +149,12 @@ def clear_memes():
         
         # Удаление файлов
         try:
-            # Удаление файлов с текстом
-            for file in with_text_files:
-                os.remove(file)
-            
-            # Удаление файлов без текста
-            for file in without_text_files:
-                os.remove(file)
+            # Коллекция очищается сразу (одна транзакция в каталоге), затем удаляются файлы
+            catalog.detach()
+            print(f"✅ Из коллекции удалено {total_memes} мемов, удаляю файлы...")
+            purge_files(progress=print_purge_progress)
             
-            print(f"✅ Успешно удалено {total_memes} мемов.")
+            print(f"\n✅ Успешно удалено {total_memes} мемов.")
             return True
         
         except Exception as e:
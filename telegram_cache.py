@@ -0,0 +1,82 @@
+"""
+Кеш ссылок на фото, уже загруженные в Telegram.
+
+После первой отправки файла Telegram возвращает фото (id, access_hash,
+file_reference), которое можно отправить повторно в любой чат без загрузки
+байтов. Ссылки хранятся в каталоге (таблица telegram_files) по пути мема в
+хранилище - путь определяется хешем содержимого - и варианту файла:
+'preview' (превью для просмотра) или 'full' (изображение целиком). Последние
+использованные ссылки держатся в памяти (LRU), чтобы не обращаться к базе
+при каждом нажатии кнопки.
+
+Ссылки удаляются при удалении мема (триггер каталога и forget()). Если
+Telegram отклонит устаревшую ссылку, отправляющий код забывает ее и
+загружает файл заново.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from catalog import catalog
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Сколько ссылок держать в памяти
+TELEGRAM_FILE_CACHE_SIZE = int(os.getenv('TELEGRAM_FILE_CACHE_SIZE', 1000))
+
+
+class TelegramFileCache:
+    def __init__(self, max_size=TELEGRAM_FILE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, variant):
+        """
+        Ссылка на загруженное фото
+
+        Returns:
+            tuple: (photo_id, access_hash, file_reference) или None
+        """
+        key = (str(path), variant)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        reference = catalog.get_telegram_file(path, variant)
+        if reference is not None:
+            self._remember(key, reference)
+        return reference
+
+    def put(self, path, variant, photo_id, access_hash, file_reference):
+        """Запоминает ссылку на загруженное фото (в памяти и в каталоге)"""
+        reference = (photo_id, access_hash, bytes(file_reference))
+        self._remember((str(path), variant), reference)
+        catalog.set_telegram_file(path, variant, *reference)
+
+    def forget(self, paths):
+        """Забывает ссылки на фото указанных мемов (все варианты)"""
+        paths = {str(path) for path in paths}
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in paths]:
+                del self._entries[key]
+        catalog.forget_telegram_files(paths)
+
+    def clear(self):
+        """Очищает ссылки в памяти (записи каталога удаляются вместе с мемами)"""
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, reference):
+        with self._lock:
+            self._entries[key] = reference
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+# Создаем синглтон-экземпляр кеша
+telegram_cache = TelegramFileCache()
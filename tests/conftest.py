@@ -0,0 +1,39 @@
+"""
+Общие настройки тестов.
+
+Модули проекта при импорте создают каталог, хранилище мемов и файл лога
+в текущей директории, поэтому тесты работают во временной директории,
+а каждый тест получает свой пустой каталог (фикстура catalog).
+
+Запуск: python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+WORK_DIR = Path(tempfile.mkdtemp(prefix="meme_collector_tests_"))
+
+os.environ['CATALOG_PATH'] = str(WORK_DIR / "memes" / "catalog.db")
+os.environ['LOG_FILE'] = str(WORK_DIR / "meme_collector.log")
+os.chdir(WORK_DIR)
+sys.path.insert(0, str(ROOT))
+
+import catalog as catalog_module  # noqa: E402
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    """Пустой каталог в отдельной базе вместо синглтона во всех модулях проекта"""
+    import collection
+    import telegram_cache
+    import utils
+
+    fresh = catalog_module.MemeCatalog(tmp_path / "catalog.db")
+    for module in (catalog_module, collection, telegram_cache, utils):
+        monkeypatch.setattr(module, 'catalog', fresh)
+    yield fresh
+    fresh.close()
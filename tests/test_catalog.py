@@ -0,0 +1,194 @@
+import random
+import sqlite3
+from pathlib import Path
+from catalog import MemeCatalog, SCHEMA_MIGRATIONS, CHANGES_JOURNAL_LIMIT
+
+
+def _old_catalog(db_path, version):
+    """База каталога со схемой версии version"""
+    conn = sqlite3.connect(str(db_path))
+    for script in SCHEMA_MIGRATIONS[:version]:
+        conn.executescript(script)
+    conn.execute(f"PRAGMA user_version = {version}")
+    return conn
+
+
+def test_migrates_first_schema_to_latest(tmp_path):
+    db_path = tmp_path / "catalog.db"
+    conn = _old_catalog(db_path, 1)
+    conn.executemany(
+        "INSERT INTO memes (path, hash, category) VALUES (?, ?, ?)",
+        [("memes/with_text/a.jpg", "a" * 32, "with_text"), ("memes/without_text/b.jpg", "b" * 32, "without_text")],
+    )
+    conn.commit()
+    conn.close()
+
+    catalog = MemeCatalog(db_path)
+    try:
+        version = catalog._conn.execute("PRAGMA user_version").fetchone()[0]
+        assert version == len(SCHEMA_MIGRATIONS)
+
+        # Записи старой схемы сохранились, новые поля пустые
+        record = catalog.get("memes/with_text/a.jpg")
+        assert record['hash'] == "a" * 32
+        assert record['category'] == "with_text"
+        assert record['ingested_at'] is None
+        assert catalog.find_by_hash("b" * 32) == Path("memes/without_text/b.jpg")
+        assert catalog.paths_without_phash() == ["memes/with_text/a.jpg", "memes/without_text/b.jpg"]
+
+        # Записи без времени добавления тоже видны при постраничном просмотре
+        assert [row[2] for row in catalog.browse("with_text")] == ["memes/with_text/a.jpg"]
+    finally:
+        catalog.close()
+
+
+def test_migration_is_applied_once(tmp_path):
+    db_path = tmp_path / "catalog.db"
+    MemeCatalog(db_path).close()
+
+    catalog = MemeCatalog(db_path)
+    try:
+        catalog.add("c" * 32, "memes/store/cc/cc/c.jpg", "with_text")
+        assert catalog.count() == 1
+    finally:
+        catalog.close()
+
+
+def test_partial_schema_is_migrated(tmp_path):
+    db_path = tmp_path / "catalog.db"
+    conn = _old_catalog(db_path, 5)
+    conn.execute("INSERT INTO memes (path, hash, category) VALUES ('a.jpg', 'h', 'with_text')")
+    conn.commit()
+    conn.close()
+
+    catalog = MemeCatalog(db_path)
+    try:
+        catalog.set_telegram_file("a.jpg", "preview", 1, 2, b"ref")
+        catalog.remove("a.jpg")
+        # Триггеры новых версий работают и для записей, созданных до миграции
+        assert catalog.get_telegram_file("a.jpg", "preview") is None
+        assert [op for _, op, _ in catalog.changes_since(0)] == ["remove"]
+    finally:
+        catalog.close()
+
+
+def _journal(catalog, after_id=0):
+    return [(op, path) for _, op, path in catalog.changes_since(after_id)]
+
+
+def test_journal_records_add_and_remove(catalog):
+    catalog.add("h1", "a.jpg", "with_text")
+    catalog.add("h2", "b.jpg", "without_text")
+    catalog.remove("a.jpg")
+
+    assert _journal(catalog) == [("add", "a.jpg"), ("add", "b.jpg"), ("remove", "a.jpg")]
+    assert catalog.count_changes(0) == 3
+
+
+def test_journal_category_change_is_single_add(catalog):
+    catalog.add("h1", "a.jpg", "with_text")
+    start = catalog.last_change_id()
+
+    catalog.set_category(["a.jpg"], "without_text")
+
+    assert _journal(catalog, start) == [("add", "a.jpg")]
+
+
+def test_journal_rename_removes_old_path_first(catalog):
+    catalog.add("h1", "a.jpg", "with_text")
+    start = catalog.last_change_id()
+
+    catalog.move("a.jpg", "store/a.jpg", "without_text")
+    catalog.rename_many([("store/a.jpg", "store/aa/a.jpg")])
+
+    assert _journal(catalog, start) == [
+        ("remove", "a.jpg"), ("add", "store/a.jpg"),
+        ("remove", "store/a.jpg"), ("add", "store/aa/a.jpg"),
+    ]
+
+
+def test_journal_ignores_metadata_updates(catalog):
+    catalog.add("h1", "a.jpg", "with_text")
+    start = catalog.last_change_id()
+
+    catalog.mark_viewed("a.jpg")
+    catalog.update_metadata("a.jpg", {"ocr_text": "текст"})
+    catalog.set_phash("a.jpg", 12345)
+
+    assert _journal(catalog, start) == []
+
+
+def test_journal_detach_and_trim(catalog):
+    catalog.add("h1", "a.jpg", "with_text")
+    catalog.add("h2", "b.jpg", "without_text")
+    start = catalog.last_change_id()
+
+    catalog.detach("with_text")
+    assert _journal(catalog, start) == [("remove", "a.jpg")]
+
+    catalog.trim_changes(catalog.last_change_id())
+    assert catalog.changes_since(0) == []
+    # id продолжают расти после очистки журнала (AUTOINCREMENT)
+    catalog.add("h3", "c.jpg", "with_text")
+    assert catalog.changes_since(0)[0][0] > start
+
+
+def test_journal_keeps_only_latest_changes(catalog):
+    # Парсер без бота: журнал никто не читает, но он не растет бесконечно
+    paths = [(f"{i}.jpg",) for i in range(CHANGES_JOURNAL_LIMIT + 5)]
+    with catalog._conn:
+        catalog._conn.executemany("INSERT INTO changes (op, path) VALUES ('add', ?)", paths)
+
+    assert catalog.count_changes(0) == CHANGES_JOURNAL_LIMIT
+    assert catalog.first_change_id() == catalog.last_change_id() - CHANGES_JOURNAL_LIMIT + 1
+
+
+def _flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_find_similar_finds_everything_within_threshold(catalog):
+    rng = random.Random(0)
+    base = rng.getrandbits(64)
+    catalog.add("base", "base.jpg", "with_text", base)
+    for i in range(200):
+        catalog.add(f"noise{i}", f"noise{i}.jpg", "with_text", rng.getrandbits(64))
+
+    for threshold in (0, 3, 6, 7, 11):
+        for _ in range(50):
+            distance = rng.randint(0, threshold)
+            query = _flip(base, rng.sample(range(64), distance))
+            assert (Path("base.jpg"), distance) in catalog.find_similar(query, threshold)
+
+
+def test_find_similar_recall_when_bits_are_spread_over_chunks(catalog):
+    base = 0x0123456789ABCDEF
+    catalog.add("base", "base.jpg", "with_text", base)
+
+    # Худший случай для поиска по частям: биты распределены по всем четырем частям
+    # поровну, и только одна часть отличается не больше чем на threshold // 4 бит
+    for threshold, per_chunk in ((3, (1, 1, 1, 0)), (7, (2, 2, 2, 1)), (11, (3, 3, 3, 2))):
+        bits = [chunk * 16 + offset for chunk, count in enumerate(per_chunk) for offset in range(count)]
+        query = _flip(base, bits)
+        assert catalog.find_similar(query, threshold) == [(Path("base.jpg"), threshold)]
+        assert catalog.find_similar(query, threshold - 1) == []
+
+
+def test_near_duplicate_needs_matching_caption(catalog, monkeypatch, tmp_path):
+    import utils
+
+    existing = tmp_path / "existing.jpg"
+    existing.write_bytes(b"jpeg")
+    catalog.add("h1", existing, "with_text", 0b1011, {"ocr_text": "Когда  пятница"})
+    monkeypatch.setattr(utils, "DUPLICATE_MAX_DISTANCE", 6)
+
+    assert utils.find_duplicate("h2", 0b1001, "когда пятница") == existing
+    assert utils.find_duplicate("h2", 0b1001, "когда понедельник") is None
+    assert utils.find_duplicate("h2", 0b1001, None) is None
+    # Точное совпадение хеша содержимого - дубликат независимо от текста
+    assert utils.find_duplicate("h1", None, "другой текст") == existing
+
+    monkeypatch.setattr(utils, "DUPLICATE_MAX_DISTANCE", 0)
+    assert utils.find_duplicate("h2", 0b1001, "когда пятница") is None
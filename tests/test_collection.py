@@ -0,0 +1,141 @@
+from pathlib import Path
+import pytest
+from collection import MemeCollection, Cursor
+
+
+@pytest.fixture
+def memes(catalog):
+    """Семь мемов with_text (m0..m6 в порядке добавления) и один without_text"""
+    for i in range(7):
+        catalog.add(f"h{i}", f"m{i}.jpg", "with_text", metadata={"ingested_at": 100 + i})
+    catalog.add("x", "x.jpg", "without_text", metadata={"ingested_at": 1})
+    collection = MemeCollection()
+    collection.reload()
+    return collection
+
+
+def _cursor(collection, category="with_text"):
+    # Маленькая порция, чтобы листание переходило между порциями
+    return Cursor(collection, category, page_size=3)
+
+
+def _names(paths):
+    return [Path(path).stem for path in paths]
+
+
+def test_pages_forward_and_wraps(memes):
+    cursor = _cursor(memes)
+    assert cursor.current() == Path("m0.jpg")
+    assert (cursor.index(), cursor.total()) == (0, 7)
+
+    visited = _names(cursor.step(1) for _ in range(8))
+    assert visited == ["m1", "m2", "m3", "m4", "m5", "m6", "m0", "m1"]
+    assert cursor.index() == 1
+
+
+def test_pages_backward_and_wraps(memes):
+    cursor = _cursor(memes)
+    visited = _names(cursor.step(-1) for _ in range(8))
+    assert visited == ["m6", "m5", "m4", "m3", "m2", "m1", "m0", "m6"]
+    assert cursor.index() == 6
+
+
+def test_index_after_paging_matches_catalog(memes):
+    cursor = _cursor(memes)
+    for _ in range(5):
+        cursor.step(1)
+    cursor._index = None
+    assert cursor.index() == 5
+
+
+def test_deleting_current_meme_moves_to_next(memes, catalog):
+    cursor = _cursor(memes)
+    cursor.step(1)
+    cursor.step(1)
+
+    catalog.remove("m2.jpg")
+    memes.invalidate()
+
+    assert cursor.current() == Path("m3.jpg")
+    assert (cursor.index(), cursor.total()) == (2, 6)
+    assert cursor.step(-1) == Path("m1.jpg")
+
+
+def test_deleting_last_meme_wraps_to_first(memes, catalog):
+    cursor = _cursor(memes)
+    cursor.step(-1)
+
+    catalog.remove("m6.jpg")
+    memes.invalidate()
+
+    assert cursor.current() == Path("m0.jpg")
+    assert cursor.index() == 0
+
+
+def test_moving_current_meme_to_other_category(memes, catalog):
+    cursor = _cursor(memes)
+    cursor.step(1)
+
+    catalog.set_category(["m1.jpg"], "without_text")
+    memes.invalidate()
+
+    assert cursor.current() == Path("m2.jpg")
+    assert memes.count("without_text") == 2
+
+
+def test_new_memes_do_not_shift_current(memes, catalog):
+    cursor = _cursor(memes)
+    cursor.step(1)
+    cursor.step(1)
+
+    catalog.add("early", "early.jpg", "with_text", metadata={"ingested_at": 1})
+    memes.invalidate()
+
+    assert cursor.current() == Path("m2.jpg")
+    assert cursor.index() == 3
+
+
+def test_empty_category(catalog):
+    collection = MemeCollection()
+    collection.reload()
+    cursor = _cursor(collection)
+
+    assert cursor.current() is None
+    assert cursor.step(1) is None
+    assert cursor.neighbours(2) == []
+    assert (cursor.index(), cursor.total()) == (0, 0)
+
+
+def test_neighbours_alternate_and_wrap(memes):
+    cursor = _cursor(memes)
+    assert _names(cursor.neighbours(2)) == ["m1", "m6", "m2", "m5"]
+
+    single = _cursor(memes, "without_text")
+    assert single.neighbours(2) == []
+
+
+def test_sync_changes_sees_other_processes(memes, catalog):
+    cursor = _cursor(memes)
+    assert memes.sync_changes() == 0
+
+    # Запись из другого процесса видна только через журнал каталога
+    catalog.remove("m0.jpg")
+    version = memes.version
+    assert memes.sync_changes() == 1
+    assert memes.version == version + 1
+    assert cursor.current() == Path("m1.jpg")
+    assert memes.sync_changes() == 0
+
+
+def test_sync_changes_reloads_when_journal_was_trimmed(memes, catalog):
+    cursor = _cursor(memes)
+    start = memes.last_change_id
+    catalog.remove("m0.jpg")
+    catalog.remove("m1.jpg")
+    # Первое изменение вытеснено из журнала, пока бот его не прочитал
+    catalog.trim_changes(start + 1)
+
+    assert memes.sync_changes() == 2
+    assert memes.sync_changes() == 0
+    assert cursor.current() == Path("m2.jpg")
+    assert memes.count("with_text") == 5
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from dedup_scan import find_similar_pairs, build_clusters, _block_pairs, _chunk_pairs
+
+
+def _hashes_with_near_duplicates(count=3000, planted=300, max_distance=11, seed=0):
+    rng = np.random.default_rng(seed)
+    hashes = rng.integers(0, 2 ** 64, size=count, dtype=np.uint64)
+    for _ in range(planted):
+        value = int(hashes[rng.integers(count)])
+        for bit in rng.choice(64, size=int(rng.integers(0, max_distance + 1)), replace=False):
+            value ^= 1 << int(bit)
+        hashes[rng.integers(count)] = value
+    return hashes
+
+
+@pytest.mark.parametrize("threshold", [0, 3, 6, 7, 11])
+def test_chunk_search_matches_full_scan(threshold):
+    hashes = _hashes_with_near_duplicates()
+
+    expected = sorted(_block_pairs(hashes, threshold, 512))
+    found = sorted(_chunk_pairs(hashes, threshold, 1000))
+
+    assert found == expected
+    assert len(set(found)) == len(found)
+
+
+def test_large_threshold_falls_back_to_full_scan():
+    hashes = _hashes_with_near_duplicates(count=500)
+    assert sorted(find_similar_pairs(hashes, 14)) == sorted(_block_pairs(hashes, 14, 128))
+
+
+def test_identical_hashes_in_one_bucket():
+    # Много одинаковых хешей (однотонные картинки): все пары, порции ограничены
+    hashes = np.array([7] * 40 + [2 ** 64 - 256], dtype=np.uint64)
+    pairs = list(_chunk_pairs(hashes, 6, 50))
+    assert len(pairs) == 40 * 39 // 2
+    assert all(first < second and distance == 0 for first, second, distance in pairs)
+
+
+def test_build_clusters_joins_chains():
+    hashes = np.array([0b0, 0b1, 0b11, 2 ** 63 - 1, 2 ** 40 + 2 ** 20 + 2 ** 5], dtype=np.uint64)
+    assert build_clusters(hashes, 1) == [[0, 1, 2]]
@@ -0,0 +1,91 @@
+import hashlib
+import numpy as np
+import pytest
+from PIL import Image
+import utils
+from hashing import (
+    legacy_hash, difference_hash, average_hash, hash_image, hash_images, pack_bits, popcount64,
+    _python_legacy_hash,
+)
+
+
+def _reference_legacy_hash(pixels):
+    """Прежняя реализация utils.get_image_hash по готовым пикселям 64x64"""
+    pixel_data = [int(value) for value in np.asarray(pixels).ravel()]
+    avg_pixel = sum(pixel_data) / len(pixel_data)
+    bits = "".join(['1' if pixel > avg_pixel else '0' for pixel in pixel_data])
+    return hashlib.md5(bits.encode()).hexdigest()
+
+
+def test_legacy_hash_matches_python_implementation():
+    rng = np.random.default_rng(0)
+    batch = rng.integers(0, 256, size=(20, 64, 64), dtype=np.uint8)
+    # Изображения, где много пикселей равны среднему
+    batch[0] = 128
+    batch[1, :32] = 0
+    batch[1, 32:] = 255
+
+    assert legacy_hash(batch) == [_reference_legacy_hash(pixels) for pixels in batch]
+    assert legacy_hash(batch[5]) == [_reference_legacy_hash(batch[5])]
+
+
+@pytest.mark.parametrize("name, mode, size", [
+    ("rgb.jpg", 'RGB', (1280, 960)),
+    ("gray.jpg", 'L', (400, 300)),
+    ("rgba.png", 'RGBA', (400, 300)),
+    ("palette.png", 'P', (400, 300)),
+    ("small.png", 'L', (64, 64)),
+])
+def test_legacy_hash_of_file_matches_old_get_image_hash(tmp_path, name, mode, size):
+    # Имена файлов и записи каталога посчитаны прежней реализацией - хеш не должен меняться
+    rng = np.random.default_rng(1)
+    base = rng.integers(0, 256, size=(size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+    path = tmp_path / name
+    Image.fromarray(base).resize(size, Image.BILINEAR).convert(mode).save(path)
+
+    expected = _python_legacy_hash(path)
+    assert hash_image(path, 'legacy') == expected
+    assert utils.get_image_hash(path) == expected
+
+    # Буфер, уже декодированный для классификации, дает тот же хеш
+    buffer = utils.ImageBuffer(path)
+    buffer.image
+    assert utils.get_image_hash(buffer) == expected
+
+
+def _reference_bits(bits):
+    return int("".join('1' if bit else '0' for bit in np.asarray(bits).ravel()), 2)
+
+
+def test_difference_and_average_hash_bit_order():
+    rng = np.random.default_rng(2)
+    pixels = rng.integers(0, 256, size=(8, 8, 9)).astype(np.float32)
+
+    expected = [_reference_bits(image[:, :-1] > image[:, 1:]) for image in pixels]
+    assert [int(value) for value in difference_hash(pixels)] == expected
+
+    expected = [_reference_bits(image[:, :8] > image[:, :8].mean()) for image in pixels]
+    assert [int(value) for value in average_hash(pixels[:, :, :8])] == expected
+
+
+def test_pack_bits_and_popcount():
+    bits = np.zeros((2, 64), dtype=bool)
+    bits[0, 0] = True
+    bits[1, 63] = True
+    assert [int(value) for value in pack_bits(bits)] == [1 << 63, 1]
+
+    values = np.array([0, 1, 2 ** 64 - 1, 0xF0F0], dtype=np.uint64)
+    assert [int(count) for count in popcount64(values)] == [0, 1, 64, 8]
+
+
+@pytest.mark.parametrize("kind", ['ahash', 'dhash', 'phash', 'legacy'])
+def test_batch_matches_single_image(tmp_path, kind):
+    rng = np.random.default_rng(3)
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"{i}.jpg"
+        Image.fromarray(rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+
+    batch = hash_images(paths, kind)
+    assert [value if kind == 'legacy' else int(value) for value in batch] == [hash_image(path, kind) for path in paths]
@@ -0,0 +1,55 @@
+import utils
+
+
+def _meme(catalog, tmp_path, name, category="with_text"):
+    path = tmp_path / f"{name}.jpg"
+    path.write_bytes(b"jpeg")
+    catalog.add(name, path, category)
+    return path
+
+
+def test_purge_removes_detached_files(catalog, tmp_path):
+    first = _meme(catalog, tmp_path, "a")
+    second = _meme(catalog, tmp_path, "b", "without_text")
+
+    assert catalog.detach("with_text") == 1
+    assert utils.purge_files() == 1
+
+    assert not first.exists() and second.exists()
+    assert catalog.purge_pending() == 0
+
+
+def test_readded_meme_survives_purge(catalog, tmp_path):
+    path = _meme(catalog, tmp_path, "a")
+    catalog.detach()
+
+    # То же изображение пришло снова: тот же хеш, тот же путь в хранилище
+    catalog.add("a", path, "with_text")
+    utils.purge_files()
+
+    assert path.exists()
+    assert catalog.get(path) is not None
+    assert catalog.purge_pending() == 0
+
+
+def test_purge_skips_paths_readded_after_batch_was_read(catalog, tmp_path, monkeypatch):
+    path = _meme(catalog, tmp_path, "a")
+    catalog.detach()
+    batch = catalog.purge_batch()
+
+    catalog.add("a", path, "with_text")
+    monkeypatch.setattr(catalog, "purge_batch", lambda limit=500: batch)
+    utils.purge_batch()
+
+    assert path.exists()
+
+
+def test_sync_keeps_readded_meme(catalog, tmp_path, monkeypatch):
+    path = _meme(catalog, tmp_path, "a")
+    catalog.detach()
+    catalog.add("a", path, "with_text")
+    monkeypatch.setattr(utils, "_iter_store_files", lambda: iter([path]))
+
+    utils.sync_catalog()
+
+    assert catalog.get(path)['category'] == "with_text"
@@ -0,0 +1,70 @@
+import pytest
+import utils
+
+
+def _add(catalog, name, category="with_text", ingested_at=0, size=100, viewed=None, published=None, path=None):
+    catalog.add(name, path or f"{name}.jpg", category, metadata={"ingested_at": ingested_at, "bytes": size})
+    if viewed is not None:
+        catalog.mark_viewed(path or f"{name}.jpg", viewed)
+    if published is not None:
+        catalog.mark_published(path or f"{name}.jpg", published)
+
+
+@pytest.fixture
+def memes(catalog):
+    _add(catalog, "new", ingested_at=30, viewed=100)
+    _add(catalog, "old", ingested_at=10, viewed=300)
+    _add(catalog, "middle", ingested_at=20, published=50)
+    _add(catalog, "unseen", ingested_at=25)
+    _add(catalog, "published", ingested_at=40, published=20)
+    _add(catalog, "other", category="without_text", ingested_at=1)
+    return catalog
+
+
+@pytest.mark.parametrize("policy, expected", [
+    ("oldest", ["old", "middle", "unseen", "new", "published"]),
+    # Никогда не просмотренные - по времени добавления
+    ("lru", ["middle", "unseen", "published", "new", "old"]),
+    # Сначала опубликованные, от давно опубликованных
+    ("published", ["published", "middle", "old", "unseen", "new"]),
+])
+def test_eviction_order(memes, policy, expected):
+    candidates = memes.eviction_candidates("with_text", policy)
+    assert [path[:-len(".jpg")] for path, _ in candidates] == expected
+
+
+def test_eviction_candidates_are_paged(memes):
+    first = memes.eviction_candidates("with_text", "oldest", limit=2)
+    rest = memes.eviction_candidates("with_text", "oldest", limit=2, offset=2)
+    assert [path for path, _ in first + rest] == ["old.jpg", "middle.jpg", "unseen.jpg", "new.jpg"]
+
+
+def test_enforce_quotas_by_count(memes, monkeypatch, tmp_path):
+    for name in ("new", "old", "middle", "unseen", "published"):
+        memes.move(f"{name}.jpg", tmp_path / f"{name}.jpg", "with_text")
+        (tmp_path / f"{name}.jpg").write_bytes(b"jpeg")
+    monkeypatch.setattr(utils, "CATEGORY_QUOTAS", {"with_text": (3, 0), "without_text": (0, 0)})
+
+    assert utils.enforce_quotas("oldest") == 2
+
+    assert memes.count("with_text") == 3
+    assert memes.get(tmp_path / "old.jpg") is None and memes.get(tmp_path / "middle.jpg") is None
+    assert not (tmp_path / "old.jpg").exists() and (tmp_path / "unseen.jpg").exists()
+    # Другие категории квота не трогает
+    assert memes.count("without_text") == 1
+
+
+def test_enforce_quotas_by_size(catalog, monkeypatch):
+    for i in range(5):
+        _add(catalog, f"m{i}", ingested_at=i, size=400)
+    monkeypatch.setattr(utils, "CATEGORY_QUOTAS", {"with_text": (0, 1000), "without_text": (0, 0)})
+
+    assert utils.enforce_quotas("oldest") == 3
+    assert catalog.usage("with_text") == (2, 800)
+    assert [path for path, _ in catalog.eviction_candidates("with_text", "oldest")] == ["m3.jpg", "m4.jpg"]
+
+
+def test_unknown_policy_evicts_nothing(memes, monkeypatch):
+    monkeypatch.setattr(utils, "CATEGORY_QUOTAS", {"with_text": (1, 0), "without_text": (0, 0)})
+    assert utils.enforce_quotas("random") == 0
+    assert memes.count("with_text") == 5
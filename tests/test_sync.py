@@ -0,0 +1,50 @@
+from PIL import Image
+import utils
+
+
+def _file(tmp_path, name):
+    path = tmp_path / f"{name}.png"
+    Image.new("RGB", (32, 32), (len(name) * 40 % 256, 0, 0)).save(path)
+    return path
+
+
+def test_sync_indexes_unknown_files_and_drops_missing(catalog, tmp_path, monkeypatch):
+    unknown = _file(tmp_path, "unknown")
+    catalog.add("gone", tmp_path / "gone.png", "with_text")
+    monkeypatch.setattr(utils, "_iter_store_files", lambda: iter([unknown]))
+
+    utils.sync_catalog()
+
+    assert catalog.get(unknown)['category'] == "without_text"
+    assert catalog.get(tmp_path / "gone.png") is None
+
+
+def test_sync_keeps_meme_saved_during_disk_walk(catalog, tmp_path, monkeypatch):
+    saved = _file(tmp_path, "saved")
+
+    def walk():
+        # Парсер сохраняет мем, пока sync_catalog обходит диск
+        catalog.add("saved", saved, "with_text", metadata={"source_channel": "@memes", "ocr_text": "текст"})
+        yield saved
+
+    monkeypatch.setattr(utils, "_iter_store_files", walk)
+    utils.sync_catalog()
+
+    record = catalog.get(saved)
+    assert record['category'] == "with_text"
+    assert record['source_channel'] == "@memes" and record['ocr_text'] == "текст"
+
+
+def test_sync_keeps_row_whose_file_appeared_during_walk(catalog, tmp_path, monkeypatch):
+    moved = tmp_path / "moved.png"
+    catalog.add("moved", moved, "with_text")
+
+    def walk():
+        # Файл появился на диске уже после того, как обход прошел его директорию
+        yield from ()
+        _file(tmp_path, "moved")
+
+    monkeypatch.setattr(utils, "_iter_store_files", walk)
+    utils.sync_catalog()
+
+    assert catalog.get(moved) is not None
@@ -1,85 +1,839 @@
 import os
-import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import io
 import hashlib
+import shutil
 from pathlib import Path
 from dotenv import load_dotenv
-from PIL import Image
-
-# Настройка логгирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("meme_collector.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger("MemeCollector")
+import numpy as np
+from PIL import Image, features
+from catalog import catalog, EVICTION_ORDER
+from telegram_cache import telegram_cache
+from hashing import hash_image
+from logging_setup import get_logger
+from metrics import save_seconds, memes_saved, memes_duplicates
+
+# Логирование настраивается в logging_setup (очередь + ротация файла)
+logger = get_logger("utils")
 
 # Загружаем переменные окружения
 load_dotenv()
 
 # Константы
 MEMES_DIR = Path("memes")
+# Хранилище по хешу содержимого: путь файла не зависит от категории,
+# категория - это поле записи в каталоге. Файлы разложены по двум уровням
+# поддиректорий по первым символам хеша (ab/cd/abcd....jpg), чтобы ни в одной
+# директории не было сотен тысяч файлов
+STORE_DIR = MEMES_DIR / "store"
+# Количество потоков для перевода плоского хранилища в раскладку по поддиректориям
+STORE_MIGRATION_WORKERS = int(os.getenv('STORE_MIGRATION_WORKERS', 8))
+CATEGORIES = ('with_text', 'without_text')
+
+# Прежняя раскладка по директориям категорий (переносится в хранилище при синхронизации)
 WITH_TEXT_DIR = MEMES_DIR / "with_text"
 WITHOUT_TEXT_DIR = MEMES_DIR / "without_text"
+CATEGORY_DIRS = {
+    'with_text': WITH_TEXT_DIR,
+    'without_text': WITHOUT_TEXT_DIR,
+}
+
+# Максимальное расстояние Хэмминга между перцептивными хешами (из 64 бит), при котором
+# изображения считаются дубликатами (пережатые, слегка обрезанные, с водяным знаком).
+# По умолчанию 0 - только точные совпадения: dHash 9x8 почти не видит подпись, поэтому
+# мемы на одном шаблоне с разным текстом дают одинаковый хеш. Если поиск включен,
+# почти совпадающий мем считается дубликатом, только если совпадает и распознанный текст
+DUPLICATE_MAX_DISTANCE = int(os.getenv('DUPLICATE_MAX_DISTANCE', 0))
+
+# Квоты категорий: наибольшее количество мемов и суммарный размер (МБ), 0 - без ограничения.
+# Например, QUOTA_WITH_TEXT_COUNT=50000, QUOTA_WITHOUT_TEXT_MB=2048
+CATEGORY_QUOTAS = {
+    category: (
+        int(os.getenv(f'QUOTA_{category.upper()}_COUNT', 0)),
+        int(os.getenv(f'QUOTA_{category.upper()}_MB', 0)) * 1024 * 1024,
+    )
+    for category in CATEGORIES
+}
+# Какие мемы удаляются первыми при превышении квоты: oldest (давно добавленные),
+# lru (давно не просматривавшиеся) или published (уже опубликованные в канал)
+EVICTION_POLICY = os.getenv('EVICTION_POLICY', 'oldest')
+# Как часто бот проверяет квоты (секунды)
+QUOTA_CHECK_INTERVAL = int(os.getenv('QUOTA_CHECK_INTERVAL', 3600))
+
+# Сохранение без перекодирования: JPEG разумного размера (а фото из Telegram
+# почти всегда такие) кладется в хранилище как есть - без повторного сжатия
+# и потери качества. Остальные изображения перекодируются в JPEG
+STORAGE_PASSTHROUGH = os.getenv('STORAGE_PASSTHROUGH', '1') == '1'
+# Наибольшая сторона (px) и размер файла (байт), до которых JPEG сохраняется как есть
+PASSTHROUGH_MAX_SIDE = int(os.getenv('PASSTHROUGH_MAX_SIDE', 2560))
+PASSTHROUGH_MAX_BYTES = int(os.getenv('PASSTHROUGH_MAX_BYTES', 2 * 1024 * 1024))
+# Качество JPEG при перекодировании
+JPEG_QUALITY = 85
+
+# Формат хранения: jpeg (по умолчанию), webp или avif (если поддерживается сборкой Pillow).
+# WebP/AVIF занимают на 30-50% меньше места; для отправки в Telegram из них
+# по требованию делается JPEG, который кешируется в memes/cache/jpeg
+STORAGE_FORMATS = {
+    'jpeg': ('JPEG', '.jpg'),
+    'webp': ('WEBP', '.webp'),
+    'avif': ('AVIF', '.avif'),
+}
+STORAGE_FORMAT = os.getenv('STORAGE_FORMAT', 'jpeg').lower()
+# Качество сжатия для формата хранения (для jpeg - JPEG_QUALITY)
+STORAGE_QUALITY = int(os.getenv('STORAGE_QUALITY', 80))
+# Расширения файлов, которые могут лежать в хранилище
+STORE_EXTENSIONS = tuple(ext for _, ext in STORAGE_FORMATS.values())
+
+# Кеш производных файлов (JPEG для Telegram и т.п.), раскладка - как у хранилища
+CACHE_DIR = MEMES_DIR / "cache"
+JPEG_CACHE_DIR = CACHE_DIR / "jpeg"
+
+# Превью для просмотра в боте: Telegram все равно пережимает фото до 1280px,
+# поэтому при листании отправляется уменьшенная копия ограниченного размера
+PREVIEW_DIR = CACHE_DIR / "preview"
+PREVIEW_MAX_SIDE = 1280
+PREVIEW_MAX_BYTES = int(os.getenv('PREVIEW_MAX_BYTES', 300 * 1024))
+# Качество JPEG превью: следующее пробуется, если файл не уложился в PREVIEW_MAX_BYTES
+PREVIEW_QUALITIES = (82, 72, 60)
+
+# Создаем директорию хранилища, если ее нет
+STORE_DIR.mkdir(parents=True, exist_ok=True)
+
+def _storage_format_supported(storage_format):
+    if storage_format == 'webp':
+        return features.check('webp')
+    if storage_format == 'avif':
+        return '.avif' in Image.registered_extensions()
+    return storage_format == 'jpeg'
+
+if STORAGE_FORMAT not in STORAGE_FORMATS or not _storage_format_supported(STORAGE_FORMAT):
+    logger.warning(f"Формат хранения {STORAGE_FORMAT} не поддерживается, используется jpeg")
+    STORAGE_FORMAT = 'jpeg'
+
+class ImageBuffer:
+    """
+    Изображение, которое декодируется один раз и переиспользуется всеми этапами
+    обработки одного фото: хешированием, классификацией и сохранением.
+
+    Полное декодирование выполняется лениво и только один раз. Там, где достаточно
+    маленькой версии (перцептивные хеши), используется JPEG draft() - декодер сразу
+    выдает изображение в 1/2, 1/4 или 1/8 разрешения, не распаковывая его целиком.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._image = None
+        self._bgr = None
+        self._reduced = {}
+
+        # Image.open читает только заголовок - формат и размер доступны без декодирования
+        with Image.open(self.path) as img:
+            self.format = img.format
+            self.mode = img.mode
+            self.size = img.size
 
-# Создаем директории, если их нет
-WITH_TEXT_DIR.mkdir(parents=True, exist_ok=True)
-WITHOUT_TEXT_DIR.mkdir(parents=True, exist_ok=True)
+    def __str__(self):
+        return str(self.path)
 
-def get_image_hash(image_path):
-    """Генерирует хеш изображения для предотвращения дубликатов"""
+    @property
+    def image(self):
+        """Полностью декодированное изображение в RGB"""
+        if self._image is None:
+            with Image.open(self.path) as img:
+                self._image = img.convert('RGB')
+        return self._image
+
+    def bgr(self):
+        """Изображение в виде массива numpy в порядке каналов BGR (OpenCV, EasyOCR)"""
+        if self._bgr is None:
+            self._bgr = np.ascontiguousarray(np.asarray(self.image)[:, :, ::-1])
+        return self._bgr
+
+    def reduced(self, size, mode='L'):
+        """
+        Возвращает уменьшенную версию изображения не меньше size x size
+
+        Для JPEG используется draft(), поэтому полное декодирование не требуется.
+        Результат не зависит от того, было ли изображение уже декодировано целиком,
+        так что хеши одного и того же файла всегда совпадают.
+        """
+        key = (size, mode)
+        if key not in self._reduced:
+            with Image.open(self.path) as img:
+                img.draft(mode, (size, size))
+                self._reduced[key] = img.convert(mode)
+        return self._reduced[key]
+
+    def close(self):
+        """Освобождает декодированные данные"""
+        self._image = None
+        self._bgr = None
+        self._reduced.clear()
+
+
+def as_image_buffer(image):
+    """Возвращает ImageBuffer для пути к файлу или уже созданного буфера"""
+    if isinstance(image, ImageBuffer):
+        return image
+    return ImageBuffer(image)
+
+def get_image_hash(image):
+    """Генерирует хеш изображения для предотвращения дубликатов
+
+    Args:
+        image: путь к изображению или ImageBuffer
+    """
     try:
-        with Image.open(image_path) as img:
-            # Приводим к общему размеру для сравнения
-            img = img.resize((64, 64), Image.LANCZOS).convert('L')
-            pixel_data = list(img.getdata())
-            avg_pixel = sum(pixel_data) / len(pixel_data)
-            bits = "".join(['1' if pixel > avg_pixel else '0' for pixel in pixel_data])
-            # Хешируем результат
-            return hashlib.md5(bits.encode()).hexdigest()
+        return hash_image(as_image_buffer(image), 'legacy')
     except Exception as e:
-        logger.error(f"Ошибка при генерации хеша изображения {image_path}: {e}")
+        logger.error(f"Ошибка при генерации хеша изображения {image}: {e}")
         return None
 
-def is_duplicate(image_path):
-    """Проверяет, есть ли уже такое изображение в базе"""
-    img_hash = get_image_hash(image_path)
+def get_perceptual_hash(image):
+    """Генерирует перцептивный хеш изображения (dHash) в виде 64-битного целого
+
+    В отличие от get_image_hash, близкие изображения (пережатые, слегка обрезанные,
+    с водяным знаком) дают хеши, отличающиеся всего на несколько бит.
+
+    Args:
+        image: путь к изображению или ImageBuffer
+    """
+    try:
+        return hash_image(as_image_buffer(image), 'dhash')
+    except Exception as e:
+        logger.error(f"Ошибка при генерации перцептивного хеша изображения {image}: {e}")
+        return None
+
+def _normalize_text(text):
+    """Распознанный текст без различий в регистре, пробелах и переносах строк"""
+    return " ".join((text or "").lower().split())
+
+def _same_caption(path, ocr_text):
+    """Совпадает ли распознанный текст сохраненного мема с текстом нового изображения"""
+    record = catalog.get(path)
+    return record is not None and _normalize_text(record['ocr_text']) == _normalize_text(ocr_text)
+
+def find_duplicate(img_hash, phash=None, ocr_text=None):
+    """Ищет сохраненное изображение с таким же хешем (запрос к каталогу по индексу)
+
+    Если передан перцептивный хеш, ищутся и почти совпадающие изображения
+    в пределах DUPLICATE_MAX_DISTANCE бит. Почти совпадающее изображение
+    считается дубликатом, только если у него тот же распознанный текст:
+    мемы на одном шаблоне с разными подписями дубликатами не являются.
+
+    Args:
+        img_hash: хеш содержимого
+        phash: перцептивный хеш
+        ocr_text: распознанный текст нового изображения (None - текста нет)
+
+    Returns:
+        Path: путь к найденному дубликату или None
+    """
+    candidates = []
+    existing_img = catalog.find_by_hash(img_hash) if img_hash else None
+    if existing_img:
+        candidates.append(existing_img)
+    if phash is not None and DUPLICATE_MAX_DISTANCE > 0:
+        candidates.extend(
+            path for path, _ in catalog.find_similar(phash, DUPLICATE_MAX_DISTANCE)
+            if path != existing_img and _same_caption(path, ocr_text)
+        )
+
+    for existing_img in candidates:
+        # Файл мог быть удален в обход бота - убираем устаревшую запись
+        if not existing_img.exists():
+            catalog.remove(existing_img)
+            continue
+        return existing_img
+
+    return None
+
+def file_metadata(path, size=None, ingested_at=None):
+    """
+    Метаданные сохраненного файла для каталога
+
+    Args:
+        path: путь к файлу
+        size: (ширина, высота), если уже известны (иначе читаются из заголовка)
+        ingested_at: время добавления (по умолчанию - текущее)
+    """
+    if size is None:
+        with Image.open(path) as img:
+            size = img.size
+    return {
+        'width': size[0],
+        'height': size[1],
+        'bytes': os.path.getsize(path),
+        'ingested_at': ingested_at if ingested_at is not None else time.time(),
+    }
+
+def _temp_path(path):
+    """
+    Временный файл рядом с path для записи с последующим os.replace
+
+    Имя уникально для процесса и потока: один и тот же файл могут одновременно
+    создавать потоки-исполнители бота (предзагрузка, фоновые превью) и парсер.
+    """
+    return Path(path).with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+
+def _preview_not_needed(path, size):
+    """JPEG, который уже укладывается в ограничения превью, отправляется как есть"""
+    return (
+        Path(path).suffix == ".jpg"
+        and max(size) <= PREVIEW_MAX_SIDE
+        and os.path.getsize(path) <= PREVIEW_MAX_BYTES
+    )
+
+def make_preview(path, image=None):
+    """
+    Создает превью изображения хранилища для просмотра в боте
+
+    Args:
+        path: путь к изображению в хранилище
+        image: уже декодированное изображение PIL (чтобы не декодировать повторно)
+
+    Returns:
+        Path: путь к превью (или к самому изображению, если превью не нужно)
+    """
+    path = Path(path)
+    preview = derived_paths(path)[1]
+    if preview.exists():
+        return preview
+
+    if image is None:
+        with Image.open(path) as img:
+            if _preview_not_needed(path, img.size):
+                return path
+            img.draft('RGB', (PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE))
+            image = img.convert('RGB')
+    elif _preview_not_needed(path, image.size):
+        return path
+
+    img = image.copy()
+    img.thumbnail((PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE), Image.LANCZOS)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    buffer = io.BytesIO()
+    for quality in PREVIEW_QUALITIES:
+        buffer.seek(0)
+        buffer.truncate()
+        img.save(buffer, "JPEG", quality=quality, optimize=True)
+        if buffer.tell() <= PREVIEW_MAX_BYTES:
+            break
+
+    preview.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = _temp_path(preview)
+    tmp_path.write_bytes(buffer.getvalue())
+    os.replace(tmp_path, preview)
+    return preview
+
+def preview_for(path):
+    """Файл для отправки при просмотре: готовое превью или, если его еще нет, созданное сейчас"""
+    preview = derived_paths(path)[1]
+    if preview.exists():
+        return preview
+    try:
+        return make_preview(path)
+    except Exception as e:
+        logger.error(f"Ошибка при создании превью {path}: {e}")
+        return telegram_jpeg(path)
+
+def iter_catalog_paths(page_size=1000):
+    """
+    Перебирает пути всех мемов каталога порциями (catalog.browse), не загружая список целиком
+
+    Yields:
+        str: путь к изображению
+    """
+    for category in CATEGORIES:
+        key = None
+        while True:
+            page = catalog.browse(category, key, limit=page_size)
+            if not page:
+                break
+            for _, _, path in page:
+                yield path
+            key = page[-1][:2]
+
+def generate_missing_previews(paths=None):
+    """
+    Создает превью для изображений, у которых его еще нет (фоновая задача бота)
+
+    Args:
+        paths: пути изображений (по умолчанию - весь каталог, порциями)
+
+    Returns:
+        int: количество созданных превью
+    """
+    created = 0
+    for path in paths if paths is not None else iter_catalog_paths():
+        if derived_paths(path)[1].exists() or not os.path.exists(path):
+            continue
+        try:
+            if make_preview(path) != Path(path):
+                created += 1
+        except Exception as e:
+            logger.error(f"Ошибка при создании превью {path}: {e}")
+    if created:
+        logger.info(f"Создано превью: {created}")
+    return created
+
+def purge_batch(batch_size=500):
+    """
+    Удаляет очередную порцию файлов из очереди на удаление (catalog.detach)
+
+    Returns:
+        int: количество обработанных путей (0 - очередь пуста)
+    """
+    paths = catalog.purge_batch(batch_size)
+    if not paths:
+        return 0
+    # Мем мог быть снова сохранен по тому же пути, пока порция читалась
+    live = catalog.live_paths(paths)
+    for path in paths:
+        if path in live:
+            continue
+        for file_path in [path, *derived_paths(path)]:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Ошибка при удалении файла {file_path}: {e}")
+    catalog.purge_done(paths)
+    return len(paths)
+
+def purge_files(batch_size=500, progress=None):
+    """
+    Удаляет все файлы из очереди на удаление
+
+    Args:
+        batch_size: размер порции
+        progress: функция progress(удалено, всего), вызывается после каждой порции
+
+    Returns:
+        int: количество удаленных файлов
+    """
+    total = catalog.purge_pending()
+    done = 0
+    while True:
+        purged = purge_batch(batch_size)
+        if not purged:
+            break
+        done += purged
+        if progress:
+            progress(done, total)
+    if done:
+        logger.info(f"Удалено файлов из очереди: {done}")
+    return done
+
+def enforce_quotas(policy=None):
+    """
+    Удаляет мемы категорий, превысивших квоту (CATEGORY_QUOTAS), в порядке EVICTION_POLICY
+
+    Returns:
+        int: количество удаленных мемов
+    """
+    policy = policy or EVICTION_POLICY
+    if policy not in EVICTION_ORDER:
+        logger.error(f"Неизвестная политика вытеснения {policy}, доступны: {', '.join(EVICTION_ORDER)}")
+        return 0
+
+    evicted = 0
+    for category, (max_count, max_bytes) in CATEGORY_QUOTAS.items():
+        if not max_count and not max_bytes:
+            continue
+
+        count, total_bytes = catalog.usage(category)
+        victims = []
+        offset = 0
+        while (max_count and count > max_count) or (max_bytes and total_bytes > max_bytes):
+            candidates = catalog.eviction_candidates(category, policy, offset=offset)
+            if not candidates:
+                break
+            offset += len(candidates)
+            for path, size in candidates:
+                if not ((max_count and count > max_count) or (max_bytes and total_bytes > max_bytes)):
+                    break
+                victims.append(path)
+                count -= 1
+                total_bytes -= size
+
+        if victims:
+            remove_meme_files(victims)
+            catalog.remove_many(victims)
+            evicted += len(victims)
+            logger.info(f"Квота категории {category}: удалено {len(victims)} мемов (политика {policy})")
+
+    return evicted
+
+def remove_meme_files(paths):
+    """
+    Удаляет файлы мемов (уже удаленные файлы пропускаются)
+
+    Returns:
+        int: количество удаленных файлов
+    """
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            logger.warning(f"Файл уже удален: {path}")
+        # Производные файлы в кеше больше не нужны
+        for derived in derived_paths(path):
+            if derived.exists():
+                os.remove(derived)
+    # Как и ссылки на загруженные в Telegram фото
+    telegram_cache.forget(paths)
+    return removed
+
+def store_path(name, ext=".jpg", create=False, root=STORE_DIR):
+    """
+    Путь к файлу в хранилище по хешу содержимого - единственное место,
+    где определяется раскладка хранилища (и кеша производных файлов)
+
+    Args:
+        name: хеш содержимого (или другое уникальное имя)
+        ext: расширение файла
+        create: создать поддиректории, если их нет (для записи)
+        root: корень раскладки (хранилище или директория кеша)
+
+    Returns:
+        Path: memes/store/ab/cd/abcd....jpg
+    """
+    path = Path(root) / name[:2] / name[2:4] / f"{name}{ext}"
+    if create:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+def _iter_store_files():
+    """Файлы изображений в раскладке хранилища по поддиректориям"""
+    for path in STORE_DIR.glob("*/*/*"):
+        if path.suffix in STORE_EXTENSIONS:
+            yield path
+
+def derived_paths(path):
+    """Пути производных файлов изображения хранилища в кеше"""
+    path = Path(path)
+    return [
+        store_path(path.stem, ".jpg", root=JPEG_CACHE_DIR),
+        store_path(path.stem, ".jpg", root=PREVIEW_DIR),
+    ]
+
+def telegram_jpeg(path):
+    """
+    Возвращает путь к JPEG-версии изображения для отправки в Telegram
+
+    JPEG из хранилища отдается как есть, для WebP/AVIF JPEG создается
+    при первом обращении и кешируется.
+    """
+    path = Path(path)
+    if path.suffix == ".jpg":
+        return path
+
+    cached = derived_paths(path)[0]
+    if not cached.exists():
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        with Image.open(path) as img:
+            # Запись через временный файл: параллельный запрос не увидит недописанный JPEG
+            tmp_path = _temp_path(cached)
+            img.convert('RGB').save(tmp_path, "JPEG", quality=JPEG_QUALITY)
+            os.replace(tmp_path, cached)
+        logger.debug(f"Создан JPEG для отправки: {cached}")
+    return cached
+
+def _move_to_shard(old_path):
+    new_path = store_path(old_path.stem, old_path.suffix, create=True)
+    os.replace(old_path, new_path)
+    return old_path, new_path
+
+def migrate_flat_store(workers=STORE_MIGRATION_WORKERS, batch_size=1000):
+    """
+    Переводит плоское хранилище (memes/store/{hash}.jpg) в раскладку по поддиректориям
+
+    Файлы переносятся на месте (os.replace в пределах одного диска) в несколько
+    потоков, пути в каталоге обновляются пакетами. Если перенос прервался,
+    sync_catalog сопоставит оставшиеся записи с уже перенесенными файлами.
+
+    Returns:
+        int: количество перенесенных файлов
+    """
+    flat_files = [
+        path for path in STORE_DIR.glob("*")
+        if path.suffix in STORE_EXTENSIONS and path.is_file()
+    ]
+    if not flat_files:
+        return 0
+
+    logger.info(f"Перевожу хранилище в раскладку по поддиректориям: {len(flat_files)} файлов, потоков: {workers}")
+    moved = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in range(0, len(flat_files), batch_size):
+            futures = [executor.submit(_move_to_shard, old_path) for old_path in flat_files[i:i + batch_size]]
+            done = []
+            for future in futures:
+                try:
+                    done.append(future.result())
+                except OSError as e:
+                    logger.error(f"Ошибка при переносе файла в хранилище: {e}")
+            catalog.rename_many(done)
+            moved += len(done)
+
+    logger.info(f"Перенесено в поддиректории хранилища: {moved} файлов")
+    return moved
+
+def index_file(path, category):
+    """
+    Добавляет в каталог файл, уже лежащий в хранилище
+
+    Запись, которую успел создать кто-то другой (например, парсер сохранил мем,
+    пока sync_catalog обходил диск), не перезаписывается: в ней категория,
+    источник и распознанный текст, которых по одному файлу не узнать.
+
+    Returns:
+        bool: True если файл добавлен
+    """
+    if catalog.get(path) is not None:
+        return False
+    image = ImageBuffer(path)
+    img_hash = get_image_hash(image)
     if not img_hash:
         return False
-    
-    # Проверка в обеих директориях
-    for dir_path in [WITH_TEXT_DIR, WITHOUT_TEXT_DIR]:
-        for existing_img in dir_path.glob("*.jpg"):
-            if get_image_hash(existing_img) == img_hash:
-                logger.info(f"Дубликат найден: {image_path} == {existing_img}")
-                return True
-    
+    metadata = file_metadata(path, image.size, ingested_at=os.path.getmtime(path))
+    added = catalog.add(img_hash, path, category, get_perceptual_hash(image), metadata, replace=False)
+    image.close()
+    return added
+
+def migrate_legacy_layout():
+    """
+    Переносит файлы из прежних директорий категорий в хранилище по хешу
+
+    Имя файла уже является хешем содержимого, поэтому файл переносится
+    под тем же именем, а категория остается в каталоге.
+
+    Returns:
+        int: количество перенесенных файлов
+    """
+    moved = 0
+    for category, dir_path in CATEGORY_DIRS.items():
+        if not dir_path.is_dir():
+            continue
+
+        for old_path in dir_path.glob("*.jpg"):
+            stem, ext = os.path.splitext(old_path.name)
+            new_path = store_path(stem, ext, create=True)
+            try:
+                if new_path.exists():
+                    # То же содержимое уже в хранилище
+                    os.remove(old_path)
+                    catalog.remove(old_path)
+                    continue
+                indexed = catalog.get(old_path) is not None
+                os.replace(old_path, new_path)
+                if indexed:
+                    catalog.move(old_path, new_path, category)
+                else:
+                    # Категорию знает только прежняя директория - индексируем сразу
+                    index_file(new_path, category)
+                moved += 1
+            except OSError as e:
+                logger.error(f"Ошибка при переносе {old_path} в хранилище: {e}")
+
+        try:
+            dir_path.rmdir()
+        except OSError:
+            logger.warning(f"Директория {dir_path} не пуста, оставляю ее на месте")
+
+    if moved:
+        logger.info(f"Перенесено в хранилище {STORE_DIR}: {moved} файлов")
+    return moved
+
+def sync_catalog():
+    """
+    Сверяет каталог с файлами на диске: добавляет файлы, которых нет в каталоге,
+    и удаляет записи о файлах, которых больше нет. Хеши считаются только для
+    новых файлов, уже проиндексированные изображения повторно не декодируются.
+
+    Файлы из прежних директорий категорий и плоского хранилища предварительно
+    переносятся в раскладку по поддиректориям.
+    Категорию файла, найденного в хранилище без записи в каталоге, узнать
+    неоткуда, поэтому он добавляется как 'without_text'.
+
+    Может работать одновременно с парсером и обработчиками бота: записи,
+    появившиеся во время обхода диска, не перезаписываются, а запись удаляется,
+    только если файла нет и в момент удаления.
+    """
+    migrate_legacy_layout()
+    migrate_flat_store()
+
+    known_paths = set(catalog.all_paths())
+    # Файлы, ожидающие удаления после очистки коллекции, в каталог не возвращаем
+    disk_paths = {str(image_path) for image_path in _iter_store_files()} - set(catalog.purge_paths())
+
+    # Записи, файл которых уже перенесен в поддиректорию (перенос был прерван)
+    renamed = []
+    for path in known_paths - disk_paths:
+        sharded = str(store_path(Path(path).stem, Path(path).suffix))
+        if sharded in disk_paths and sharded not in known_paths:
+            renamed.append((path, sharded))
+    if renamed:
+        catalog.rename_many(renamed)
+        known_paths = set(catalog.all_paths())
+
+    # Обход диска занимает время, а парсер и бот тем временем сохраняют и переносят
+    # мемы - перед удалением записи проверяем файл еще раз
+    missing = [path for path in known_paths - disk_paths if not os.path.exists(path)]
+    if missing:
+        catalog.remove_many(missing)
+
+    added = 0
+    for path in disk_paths:
+        if path in known_paths:
+            continue
+        if index_file(path, 'without_text'):
+            added += 1
+
+    if added:
+        logger.warning(f"{added} файлов хранилища не было в каталоге, добавлены в категорию 'without_text'")
+
+    # Записи, созданные до появления перцептивных хешей, дополняем один раз
+    for path in catalog.paths_without_phash():
+        phash = get_perceptual_hash(path)
+        if phash is not None:
+            catalog.set_phash(path, phash)
+
+    # Записи, созданные до появления метаданных, дополняем размерами и временем файла
+    for path in catalog.paths_without_size():
+        try:
+            catalog.update_metadata(path, file_metadata(path, ingested_at=os.path.getmtime(path)))
+        except Exception as e:
+            logger.error(f"Ошибка при чтении метаданных {path}: {e}")
+
+    logger.info(f"Каталог синхронизирован: добавлено {added}, удалено {len(missing)}, всего {catalog.count()}")
+
+def is_duplicate(image, ocr_text=None):
+    """Проверяет, есть ли уже такое изображение в базе
+
+    Args:
+        image: путь к изображению или ImageBuffer
+        ocr_text: распознанный на изображении текст (см. find_duplicate)
+    """
+    img_hash = get_image_hash(image)
+    if not img_hash:
+        return False
+
+    existing_img = find_duplicate(img_hash, get_perceptual_hash(image), ocr_text)
+    if existing_img:
+        logger.info(f"Дубликат найден: {image} == {existing_img}")
+        return True
+
     return False
 
-def save_image(image_path, has_text):
-    """Сохраняет изображение в соответствующую директорию"""
-    # Если это дубликат, не сохраняем
-    if is_duplicate(image_path):
+def can_pass_through(image):
+    """Можно ли сохранить исходный файл без перекодирования (ImageBuffer)"""
+    return (
+        STORAGE_PASSTHROUGH
+        and STORAGE_FORMAT == 'jpeg'
+        and image.format == 'JPEG'
+        and max(image.size) <= PASSTHROUGH_MAX_SIDE
+        and os.path.getsize(image.path) <= PASSTHROUGH_MAX_BYTES
+    )
+
+def store_image_file(image, target_path):
+    """
+    Записывает изображение в хранилище: исходные байты, если это возможно,
+    иначе - перекодированное в STORAGE_FORMAT (уменьшенное до PASSTHROUGH_MAX_SIDE)
+
+    Args:
+        image: ImageBuffer временного файла
+        target_path: путь в хранилище
+
+    Returns:
+        tuple: (размер сохраненного изображения, True если файл сохранен без перекодирования)
+    """
+    if can_pass_through(image):
+        # Временный файл может быть на другом диске, поэтому shutil.move, а не os.replace
+        shutil.move(str(image.path), str(target_path))
+        return image.size, True
+
+    img = image.image
+    if max(img.size) > PASSTHROUGH_MAX_SIDE:
+        img = img.copy()
+        img.thumbnail((PASSTHROUGH_MAX_SIDE, PASSTHROUGH_MAX_SIDE), Image.LANCZOS)
+    if STORAGE_FORMAT == 'jpeg':
+        img.save(target_path, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    else:
+        img.save(target_path, STORAGE_FORMATS[STORAGE_FORMAT][0], quality=STORAGE_QUALITY)
+    return img.size, False
+
+@save_seconds.timed
+def save_image(image, has_text, metadata=None):
+    """Сохраняет изображение в хранилище и регистрирует его в каталоге с нужной категорией
+
+    Args:
+        image: путь к временному файлу или ImageBuffer, созданный для него
+        has_text: содержит ли изображение текст
+        metadata: метаданные для каталога (source_channel, message_id, ocr_text)
+    """
+    image = as_image_buffer(image)
+    image_path = image.path
+
+    # Хеши считаются один раз: и для проверки дубликатов, и для имени файла и каталога
+    img_hash = get_image_hash(image)
+    phash = get_perceptual_hash(image)
+
+    # Если это дубликат (точный или почти совпадающий), не сохраняем
+    existing_img = find_duplicate(img_hash, phash, (metadata or {}).get('ocr_text'))
+    if existing_img:
+        logger.info(f"Дубликат найден: {image_path} == {existing_img}")
+        memes_duplicates.inc()
+        image.close()
         os.remove(image_path)  # Удаляем временный файл
         return False
     
-    # Определяем директорию для сохранения
-    target_dir = WITH_TEXT_DIR if has_text else WITHOUT_TEXT_DIR
+    # Категория хранится в каталоге, файл кладется в хранилище по хешу
+    category = 'with_text' if has_text else 'without_text'
     
     # Определяем имя файла на основе хеша
-    img_hash = get_image_hash(image_path) or hashlib.md5(str(image_path).encode()).hexdigest()
-    target_path = target_dir / f"{img_hash}.jpg"
+    img_hash = img_hash or hashlib.md5(str(image_path).encode()).hexdigest()
+    target_path = store_path(
+        img_hash, ".jpg" if can_pass_through(image) else STORAGE_FORMATS[STORAGE_FORMAT][1], create=True
+    )
     
     try:
-        # Оптимизируем изображение перед сохранением
-        with Image.open(image_path) as img:
-            img.save(target_path, "JPEG", quality=85, optimize=True)
+        # Исходный JPEG переносится как есть, остальное перекодируется
+        # из уже декодированного буфера
+        # Превью для просмотра в боте делается из того же декодированного буфера;
+        # он берется до сохранения, пока временный файл еще на месте
+        fits_preview = (
+            can_pass_through(image)
+            and max(image.size) <= PREVIEW_MAX_SIDE
+            and os.path.getsize(image_path) <= PREVIEW_MAX_BYTES
+        )
+        preview_source = None if fits_preview else image.image
+        
+        size, passed_through = store_image_file(image, target_path)
+        if preview_source is not None:
+            try:
+                make_preview(target_path, preview_source)
+            except Exception as e:
+                logger.error(f"Ошибка при создании превью {target_path}: {e}")
+        image.close()
+        catalog.add(img_hash, target_path, category, phash, {
+            **(metadata or {}),
+            **file_metadata(target_path, size),
+        })
         
-        # Удаляем временный файл
-        os.remove(image_path)
-        logger.info(f"Изображение сохранено: {target_path}")
+        # Удаляем временный файл (если он не был перенесен в хранилище)
+        if not passed_through:
+            os.remove(image_path)
+        logger.info(f"Изображение сохранено{' без перекодирования' if passed_through else ''}: {target_path}")
+        memes_saved.inc(category=category)
         return True
     except Exception as e:
         logger.error(f"Ошибка при сохранении изображения: {e}")